@@ -0,0 +1,705 @@
+import math
+import time
+import asyncio
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import pyaudio
+
+# Voice activity gate
+VAD_FRAME = 256               # samples per energy measurement
+VAD_MARGIN_DB = 12.0          # speech must be this far above the noise floor
+VAD_MIN_DB = -50.0            # and never quieter than this, in dBFS
+VAD_HANGOVER = 0.5            # seconds of audio still sent after speech stops
+VAD_PREROLL = 0.25            # seconds of audio sent from before the onset
+VAD_FLOOR_WINDOW = 3.0        # seconds of frame levels the noise floor is estimated from
+VAD_FLOOR_PERCENTILE = 10     # the floor is this percentile of them
+
+# Playback jitter buffer, in seconds of audio
+PLAYBACK_CAPACITY = 20.0      # queued audio beyond this is dropped
+PLAYBACK_PREBUFFER = 0.15     # queued before playback (re)starts
+PLAYBACK_MAX_WRITE = 0.2      # largest coalesced block for a blocking stream write
+PLAYBACK_REFERENCE = 64       # levels of recently played blocks kept as the echo reference
+
+# Microphone handling while the agent is speaking
+DUPLEX_MODES = ("full", "half", "echo")
+DUPLEX_ECHO_TAIL = 0.35       # seconds the device and the room keep echoing after playback
+DUPLEX_COUPLING_DB = -10.0    # initial guess of the echo level relative to what is played
+DUPLEX_MAX_COUPLING_DB = 0.0  # the echo is never assumed louder than the playback itself
+DUPLEX_MARGIN_DB = 6.0        # the mic must exceed the expected echo by this much to pass
+DUPLEX_RISE = 0.5             # how fast the coupling estimate follows louder echo
+DUPLEX_DECAY = 0.02           # and how fast it relaxes towards quieter echo
+DUPLEX_SPEECH_DB = -40.0      # suppressed audio this loud could have started a false turn
+DUPLEX_SILENCE_DB = -55.0     # played audio quieter than this leaves no echo worth handling
+
+# Sample rate conversion between the devices and the API
+RESAMPLE_ZEROS = 16           # sinc zero crossings on each side of the interpolation filter
+RESAMPLE_BETA = 8.0           # Kaiser window shape, roughly 80 dB of stopband attenuation
+RESAMPLE_ROLLOFF = 0.92       # passband edge as a fraction of the lower Nyquist frequency
+
+# Marker put on the uplink queue when the speaker stops talking
+AUDIO_STREAM_END = object()
+
+
+def pcm_level(data):
+    """
+    Returns the RMS level of 16-bit PCM in dBFS.
+    """
+    samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+    if not len(samples):
+        return -200.0
+    rms = np.sqrt(np.mean(np.square(samples)))
+    return float(20 * np.log10(rms / 32768.0 + 1e-10))
+
+
+class VoiceActivityGate:
+    """
+    Energy-based voice activity detection for 16-bit mono PCM chunks.
+
+    Silence is dropped instead of uploaded. A pre-roll buffer keeps word
+    onsets from being clipped, a hangover keeps trailing syllables, and an
+    AUDIO_STREAM_END marker is emitted when a speech segment ends so the
+    server can flush its own VAD.
+    """
+    def __init__(
+        self,
+        sample_rate=16000,
+        frame=VAD_FRAME,
+        margin_db=VAD_MARGIN_DB,
+        min_db=VAD_MIN_DB,
+        hangover=VAD_HANGOVER,
+        preroll=VAD_PREROLL,
+        floor_window=VAD_FLOOR_WINDOW,
+        floor_percentile=VAD_FLOOR_PERCENTILE,
+    ):
+        self.sample_rate = sample_rate
+        self.frame = frame
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.hangover = hangover
+        self.preroll = preroll
+        self.floor_percentile = floor_percentile
+
+        self.noise_floor = -60.0
+        self._recent_levels = deque(maxlen=max(1, int(floor_window * sample_rate / frame)))
+        self.active = False
+        self._silent_for = 0.0
+        self._preroll = deque()
+        self._preroll_duration = 0.0
+
+        self.total_bytes = 0
+        self.sent_bytes = 0
+        self.segments = 0
+
+    def levels(self, chunk):
+        """
+        Returns the level of each VAD_FRAME-sample frame of the chunk in dBFS.
+        """
+        samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        usable = len(samples) // self.frame * self.frame
+        frames = samples[:usable].reshape(-1, self.frame) if usable else samples.reshape(1, -1)
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        return 20 * np.log10(rms / 32768.0 + 1e-10)
+
+    def is_speech(self, chunk):
+        levels = self.levels(chunk)
+        threshold = max(self.min_db, self.noise_floor + self.margin_db)
+        speech = bool((levels > threshold).any())
+
+        # Every frame counts, speech or not: a low percentile of recent levels
+        # sits on the background between words, so the floor follows steady
+        # noise up as well as down
+        self._recent_levels.extend(levels.tolist())
+        self.noise_floor = float(np.percentile(self._recent_levels, self.floor_percentile))
+        return speech
+
+    def process(self, chunk):
+        """
+        Feeds one PCM chunk through the gate and returns what should be sent:
+        a list of PCM chunks, possibly followed by AUDIO_STREAM_END.
+        """
+        self.total_bytes += len(chunk)
+        duration = len(chunk) / 2 / self.sample_rate
+
+        if self.is_speech(chunk):
+            self._silent_for = 0.0
+            if not self.active:
+                self.active = True
+                self.segments += 1
+                out = list(self._preroll) + [chunk]
+                self._preroll.clear()
+                self._preroll_duration = 0.0
+            else:
+                out = [chunk]
+        elif self.active:
+            self._silent_for += duration
+            out = [chunk]
+            if self._silent_for >= self.hangover:
+                self.active = False
+                out.append(AUDIO_STREAM_END)
+        else:
+            self._preroll.append(chunk)
+            self._preroll_duration += duration
+            while self._preroll_duration > self.preroll and len(self._preroll) > 1:
+                dropped = self._preroll.popleft()
+                self._preroll_duration -= len(dropped) / 2 / self.sample_rate
+            return []
+
+        self.sent_bytes += sum(len(item) for item in out if item is not AUDIO_STREAM_END)
+        return out
+
+    def stats(self):
+        return {
+            "segments": self.segments,
+            "sent_bytes": self.sent_bytes,
+            "suppressed": 1 - self.sent_bytes / self.total_bytes if self.total_bytes else 0.0,
+        }
+
+
+def native_format(pya, device_index, input, channels=1, format=pyaudio.paInt16):
+    """
+    Returns the (rate, channels) a device should be opened with: its default
+    sample rate, and the wanted channel count if the device accepts it at
+    that rate, otherwise the device's own channel count.
+    """
+    info = pya.get_device_info_by_index(device_index)
+    rate = int(info["defaultSampleRate"])
+    limit = int(info["maxInputChannels"] if input else info["maxOutputChannels"])
+    for count in dict.fromkeys((channels, limit)):
+        if not 1 <= count <= limit:
+            continue
+        if input:
+            kwargs = {"input_device": device_index, "input_channels": count, "input_format": format}
+        else:
+            kwargs = {"output_device": device_index, "output_channels": count, "output_format": format}
+        try:
+            if pya.is_format_supported(rate, **kwargs):
+                return rate, count
+        except ValueError:
+            # PortAudio reports unsupported formats by raising
+            pass
+    return rate, max(1, limit)
+
+
+class Resampler:
+    """
+    Streaming polyphase resampler and channel mixer for 16-bit PCM.
+
+    Converts by the rational factor up/down with a Kaiser-windowed sinc
+    filter split into `up` phases, so each output sample costs one short dot
+    product. The tail of every input block is kept as filter history, so
+    audio converted chunk by chunk is identical to converting it in one go.
+
+    Input channels are averaged down to mono before filtering and the result
+    is copied out to each output channel.
+    """
+    def __init__(
+        self,
+        in_rate,
+        out_rate,
+        in_channels=1,
+        out_channels=1,
+        zeros=RESAMPLE_ZEROS,
+        beta=RESAMPLE_BETA,
+        rolloff=RESAMPLE_ROLLOFF,
+    ):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        divisor = math.gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+
+        # Prototype low-pass filter at the upsampled rate
+        length = 2 * zeros * max(self.up, self.down) + 1
+        self.taps = -(-length // self.up)
+        cutoff = rolloff * 0.5 / max(self.up, self.down)
+        n = np.arange(self.taps * self.up)
+        center = (length - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * (n - center)) * self.up
+        h[:length] *= np.kaiser(length, beta)
+        h[length:] = 0
+        # phases[p] holds every up-th coefficient from p, reversed to line up
+        # with a sliding window over the input
+        self._phases = h.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32).copy()
+        # Seconds the output lags the input
+        self.delay = center / self.up / in_rate
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the filter history, e.g. after queued audio was discarded.
+        """
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        # Input index of _history[0], and index of the next output sample
+        self._base = -(self.taps - 1)
+        self._next = 0
+
+    def process(self, data):
+        """
+        Converts one block of interleaved PCM and returns what can be
+        produced from it so far.
+        """
+        if not data:
+            return b""
+        samples = np.frombuffer(data, dtype=np.int16)
+        if self.in_channels > 1:
+            samples = samples.reshape(-1, self.in_channels).mean(axis=1, dtype=np.float32)
+        buf = np.concatenate([self._history, samples.astype(np.float32)])
+        if len(buf) < self.taps:
+            # Not a single filter window yet; wait for more input
+            self._history = buf
+            return b""
+
+        # Every output sample whose newest input has arrived
+        available = self._base + len(buf)
+        end = -(-available * self.up // self.down)
+        positions = np.arange(self._next, end, dtype=np.int64) * self.down
+        newest = positions // self.up
+        windows = sliding_window_view(buf, self.taps)[newest - (self.taps - 1) - self._base]
+        out = np.einsum("kt,kt->k", self._phases[positions % self.up], windows)
+
+        keep = end * self.down // self.up - (self.taps - 1)
+        self._history = buf[keep - self._base:].copy()
+        self._base = keep
+        self._next = end
+
+        out = np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+        if self.out_channels > 1:
+            out = np.repeat(out, self.out_channels)
+        return out.tobytes()
+
+
+class DuplexPolicy:
+    """
+    Decides what happens to microphone audio while the agent is speaking,
+    so the speaker's echo is not streamed back and taken for the user.
+
+    Modes:
+      full  - send everything (headphones)
+      half  - drop the microphone while playback is audible
+      echo  - drop chunks the playback can explain: each chunk is compared
+              with the level just played plus an estimated speaker-to-mic
+              coupling, and only audio clearly louder than that (the user
+              talking over the agent) is sent
+
+    Playback counts as audible until DUPLEX_ECHO_TAIL seconds after the last
+    block louder than DUPLEX_SILENCE_DB was handed to the speaker.
+    """
+    def __init__(
+        self,
+        mode="echo",
+        echo_tail=DUPLEX_ECHO_TAIL,
+        coupling_db=DUPLEX_COUPLING_DB,
+        margin_db=DUPLEX_MARGIN_DB,
+        speech_db=DUPLEX_SPEECH_DB,
+    ):
+        if mode not in DUPLEX_MODES:
+            raise ValueError(f"Unknown duplex mode: {mode}")
+        self.mode = mode
+        self.echo_tail = echo_tail
+        self.coupling_db = coupling_db
+        self.margin_db = margin_db
+        self.speech_db = speech_db
+
+        self.playing = False
+        self._burst = False
+
+        self.bytes_while_playing = 0
+        self.avoided_bytes = 0
+        self.passed_while_playing = 0
+        self.false_interruptions = 0
+
+    def process(self, chunk, playback, now=None):
+        """
+        Returns the chunk to send, or None if it was suppressed.
+        """
+        now = time.monotonic() if now is None else now
+        reference = playback.reference_level(now - self.echo_tail) if playback is not None else None
+        self.playing = reference is not None and reference > DUPLEX_SILENCE_DB
+        if not self.playing:
+            self._burst = False
+            return chunk
+
+        self.bytes_while_playing += len(chunk)
+        if self.mode == "full":
+            self.passed_while_playing += 1
+            return chunk
+
+        level = pcm_level(chunk)
+        if self.mode == "echo":
+            coupling = level - reference
+            if coupling > self.coupling_db + self.margin_db:
+                # Louder than the echo can be: the user is talking over the agent
+                self._burst = False
+                self.passed_while_playing += 1
+                return chunk
+            rate = DUPLEX_RISE if coupling > self.coupling_db else DUPLEX_DECAY
+            self.coupling_db = min(
+                DUPLEX_MAX_COUPLING_DB, self.coupling_db + (coupling - self.coupling_db) * rate
+            )
+
+        self.avoided_bytes += len(chunk)
+        # Each loud suppressed burst is a turn the server's VAD could have started
+        if level > self.speech_db:
+            if not self._burst:
+                self.false_interruptions += 1
+            self._burst = True
+        else:
+            self._burst = False
+        return None
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "avoided_bytes": self.avoided_bytes,
+            "false_interruptions_prevented": self.false_interruptions,
+            "passed_while_playing": self.passed_while_playing,
+            "suppressed": self.avoided_bytes / self.bytes_while_playing if self.bytes_while_playing else 0.0,
+            "coupling_db": round(self.coupling_db, 1),
+        }
+
+
+class ByteRing:
+    """
+    Single-producer, single-consumer byte ring buffer.
+
+    The producer only advances the write counter and the consumer only the
+    read counter. Each counter is a plain int that is replaced atomically
+    under the GIL, so an audio callback thread and the event loop can share
+    a ring without a lock.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._written = 0
+        self._read = 0
+
+    def __len__(self):
+        return self._written - self._read
+
+    @property
+    def write_position(self):
+        """Total bytes ever written."""
+        return self._written
+
+    @property
+    def read_position(self):
+        """Total bytes ever read or discarded."""
+        return self._read
+
+    def free(self):
+        return self.capacity - len(self)
+
+    def write(self, data):
+        """
+        Writes as much of data as fits and returns the number of bytes written.
+        """
+        view = memoryview(data).cast("B")
+        n = min(len(view), self.free())
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = view[:first]
+        self._buf[:n - first] = view[first:n]
+        self._written += n
+        return n
+
+    def read(self, n):
+        """
+        Reads up to n bytes.
+        """
+        n = min(n, len(self))
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out = self._buf[start:start + first] + self._buf[:n - first]
+        self._read += n
+        return bytes(out)
+
+    def clear_to(self, position):
+        """
+        Drops everything written before the given write position.
+        Only the consumer may call this.
+        """
+        self._read = max(self._read, min(position, self._written))
+
+
+class CallbackInput:
+    """
+    Microphone stream in PyAudio callback mode.
+
+    PortAudio's own thread pushes each period into a ByteRing and wakes the
+    event loop, so reading the microphone never goes through the shared
+    default executor.
+    """
+    def __init__(self, pya, rate, chunk, channels=1, format=pyaudio.paInt16, device_index=None, buffered_chunks=32):
+        self.pya = pya
+        self.rate = rate
+        self.chunk = chunk
+        self.channels = channels
+        self.format = format
+        self.device_index = device_index
+        self.chunk_bytes = chunk * channels * pyaudio.get_sample_size(format)
+        self.ring = ByteRing(self.chunk_bytes * buffered_chunks)
+
+        self.stream = None
+        self._loop = None
+        self._ready = asyncio.Event()
+
+        self.overruns = 0          # bytes dropped because the ring was full
+        self.device_overflows = 0  # periods PortAudio flagged as overflowed
+
+    def open(self):
+        self._loop = asyncio.get_running_loop()
+        self.stream = self.pya.open(
+            format=self.format,
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=self.chunk,
+            stream_callback=self._callback,
+        )
+        return self.stream
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        written = self.ring.write(in_data)
+        self.overruns += len(in_data) - written
+        if status & pyaudio.paInputOverflow:
+            self.device_overflows += 1
+        self._loop.call_soon_threadsafe(self._ready.set)
+        return None, pyaudio.paContinue
+
+    async def read(self):
+        """
+        Waits for and returns the next chunk of captured audio.
+        """
+        while len(self.ring) < self.chunk_bytes:
+            self._ready.clear()
+            if len(self.ring) >= self.chunk_bytes:
+                break
+            await self._ready.wait()
+        return self.ring.read(self.chunk_bytes)
+
+    def close(self):
+        stream, self.stream = self.stream, None
+        if stream is not None:
+            stream.stop_stream()
+            stream.close()
+
+
+class PlaybackBuffer:
+    """
+    Jitter buffer between the websocket and the speaker.
+
+    Received audio goes into a bounded ByteRing. Playback only starts once
+    PREBUFFER seconds are queued, so bursty delivery does not underrun
+    straight away. After an underrun it waits to prebuffer again. Audio that
+    does not fit is dropped and counted as an overrun instead of growing
+    latency without bound.
+
+    feed() and clear() run on the event loop (the producer). pull() runs on
+    the consumer, which is either the PortAudio callback thread or
+    next_block() on the event loop.
+    """
+    def __init__(
+        self,
+        rate,
+        frame_bytes=2,
+        capacity=PLAYBACK_CAPACITY,
+        prebuffer=PLAYBACK_PREBUFFER,
+        max_write=PLAYBACK_MAX_WRITE,
+    ):
+        self.rate = rate
+        self.frame_bytes = frame_bytes
+        self.bytes_per_second = rate * frame_bytes
+        self.ring = ByteRing(self._bytes(capacity))
+        self.prebuffer_bytes = self._bytes(prebuffer)
+        self.max_write_bytes = self._bytes(max_write)
+
+        self.started = False
+        self._turn_ended = False
+        self._discard_to = 0
+        self._data = asyncio.Event()
+        # Bumped on every interruption so in-flight writes can notice
+        self.generation = 0
+        self._interrupted_at = None
+        self.interrupt_latencies = []
+        # (monotonic time, dBFS) of recently played blocks, for echo estimation
+        self.reference = deque(maxlen=PLAYBACK_REFERENCE)
+
+        self.underruns = 0
+        self.overrun_bytes = 0
+        self.writes = 0
+        self.max_depth = 0
+
+    def _bytes(self, seconds):
+        # Whole frames only, so reads never split a sample
+        return int(seconds * self.rate) * self.frame_bytes
+
+    @property
+    def depth(self):
+        """Seconds of audio waiting to be played."""
+        return len(self.ring) / self.bytes_per_second
+
+    @property
+    def playing(self):
+        return self.started and len(self.ring) > 0
+
+    def reference_level(self, since):
+        """
+        Returns the loudest level played since the given monotonic time, or
+        None if nothing was played.
+        """
+        levels = [level for played_at, level in list(self.reference) if played_at >= since]
+        return max(levels) if levels else None
+
+    def feed(self, data):
+        """
+        Queues received audio; whatever does not fit is dropped.
+        """
+        written = self.ring.write(data)
+        self.overrun_bytes += len(data) - written
+        self.max_depth = max(self.max_depth, len(self.ring))
+        self._turn_ended = False
+        self._data.set()
+
+    def end_turn(self):
+        """
+        Marks the end of a model turn: the tail plays without waiting for
+        the prebuffer, and running dry afterwards is not an underrun.
+        """
+        self._turn_ended = True
+        self._data.set()
+
+    def clear(self):
+        """
+        Discards everything queued so far. Safe to call from the producer side:
+        the consumer applies the discard on its next pull.
+        """
+        self._discard_to = self.ring.write_position
+
+    def interrupt(self):
+        """
+        Drops all queued audio because the user barged in, and starts timing
+        how long the speaker takes to go quiet.
+        """
+        self.clear()
+        self.generation += 1
+        self._interrupted_at = time.monotonic()
+        # Wake an idle blocking writer so the discard is applied right away
+        self._data.set()
+
+    def mark_silent(self):
+        """
+        Records that playback of pre-interruption audio has stopped.
+        """
+        if self._interrupted_at is not None:
+            self.interrupt_latencies.append(time.monotonic() - self._interrupted_at)
+            self._interrupted_at = None
+
+    def play_block(self, stream, block, period_bytes):
+        """
+        Writes a block to a blocking stream one period at a time, so an
+        interruption stops it within a period instead of after the whole block.
+        Runs in a worker thread.
+        """
+        generation = self.generation
+        for offset in range(0, len(block), period_bytes):
+            if self.generation != generation:
+                self.mark_silent()
+                return
+            stream.write(block[offset:offset + period_bytes])
+
+    def pull(self, nbytes, now=None):
+        """
+        Returns up to nbytes of audio to play, or b"" while prebuffering.
+        """
+        if self._discard_to > self.ring.read_position:
+            self.ring.clear_to(self._discard_to)
+            self.started = False
+        if self._interrupted_at is not None and self._discard_to <= self.ring.read_position:
+            self.mark_silent()
+
+        available = len(self.ring)
+        if not self.started:
+            if available < self.prebuffer_bytes and not (self._turn_ended and available):
+                return b""
+            self.started = True
+
+        if available == 0:
+            if not self._turn_ended:
+                self.underruns += 1
+            self.started = False
+            return b""
+
+        self.writes += 1
+        data = self.ring.read(min(nbytes, available))
+        self.reference.append((time.monotonic() if now is None else now, pcm_level(data)))
+        return data
+
+    async def next_block(self):
+        """
+        Waits for the next block to write to a blocking stream. Contiguous
+        audio is coalesced into blocks of up to PLAYBACK_MAX_WRITE seconds.
+        """
+        while not (block := self.pull(self.max_write_bytes)):
+            self._data.clear()
+            await self._data.wait()
+        return block
+
+    def stats(self):
+        latencies = sorted(self.interrupt_latencies)
+        return {
+            "underruns": self.underruns,
+            "overrun_bytes": self.overrun_bytes,
+            "writes": self.writes,
+            "depth_s": self.depth,
+            "max_depth_s": self.max_depth / self.bytes_per_second,
+            "interruptions": len(latencies),
+            "interrupt_to_silence_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        }
+
+
+class CallbackOutput:
+    """
+    Speaker stream in PyAudio callback mode.
+
+    PortAudio's thread pulls each period from a PlaybackBuffer and plays
+    silence while it is prebuffering or has run dry.
+    """
+    def __init__(self, pya, buffer, rate, chunk, channels=1, format=pyaudio.paInt16):
+        self.pya = pya
+        self.buffer = buffer
+        self.rate = rate
+        self.chunk = chunk
+        self.channels = channels
+        self.format = format
+        self.frame_bytes = channels * pyaudio.get_sample_size(format)
+        self.stream = None
+
+    def open(self):
+        self.stream = self.pya.open(
+            format=self.format,
+            channels=self.channels,
+            rate=self.rate,
+            output=True,
+            frames_per_buffer=self.chunk,
+            stream_callback=self._callback,
+        )
+        return self.stream
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        nbytes = frame_count * self.frame_bytes
+        data = self.buffer.pull(nbytes)
+        if len(data) < nbytes:
+            data += bytes(nbytes - len(data))
+        return data, pyaudio.paContinue
+
+    def close(self):
+        stream, self.stream = self.stream, None
+        if stream is not None:
+            stream.stop_stream()
+            stream.close()
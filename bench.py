@@ -0,0 +1,1802 @@
+"""
+Microbenchmarks for the capture, audio and tool pipelines.
+
+Run `python bench.py <name> --help` for the options of each benchmark.
+"""
+import io
+import base64
+import time
+import wave
+import struct
+import asyncio
+import argparse
+import threading
+import statistics
+import tracemalloc
+from collections import deque
+
+import numpy as np
+import PIL.Image
+import PIL.ImageDraw
+
+
+def _measure(fn, iterations):
+    """
+    Runs fn repeatedly and returns latency percentiles (ms) and the peak
+    bytes allocated by a single call.
+    """
+    fn()  # warm up codecs and thread state
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "mean_ms": statistics.fmean(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+        "peak_alloc_kb": peak / 1024,
+    }
+
+
+def _report(title, rows):
+    print(f"\n{title}")
+    for name, stats in rows:
+        cols = "  ".join(f"{key}={value:9.2f}" for key, value in stats.items())
+        print(f"  {name:<18} {cols}")
+
+
+def synthetic_desktop(width, height, seed=0):
+    """
+    Builds a desktop-like RGB image: textured wallpaper, windows, and text.
+    """
+    size = (width, height)
+    wallpaper = PIL.Image.effect_mandelbrot(size, (-2.2, -1.2, 1.0, 1.2), 100)
+    noise = PIL.Image.effect_noise(size, 24)
+    img = PIL.Image.merge("RGB", (wallpaper, noise, PIL.Image.linear_gradient("L").resize(size)))
+    draw = PIL.ImageDraw.Draw(img)
+    step = max(width, height) // 8
+    for i in range(6):
+        x, y = (seed * 37 + i * step) % width, (seed * 53 + i * step // 2) % height
+        draw.rectangle([x, y, x + width // 3, y + height // 3], fill=(230, 230, 230), outline=(0, 90, 200), width=4)
+        for line in range(0, height // 3 - 20, 18):
+            draw.text((x + 10, y + 10 + line), f"window {i} line {line} lorem ipsum dolor sit amet", fill=(20, 20, 20))
+    return img
+
+
+def bench_screen(args):
+    import mss.tools
+    from mss.screenshot import ScreenShot
+    from capture import FrameEncoder, bgra_to_image, pixel_budget
+
+    img = synthetic_desktop(args.width, args.height)
+    bgra = img.tobytes("raw", "BGRX")
+    size = img.size
+
+    def legacy():
+        # The original path: PNG encode, PNG decode, JPEG encode
+        shot = ScreenShot.from_size(bytearray(bgra), *size)
+        png = mss.tools.to_png(shot.rgb, shot.size)
+        decoded = PIL.Image.open(io.BytesIO(png))
+        out = io.BytesIO()
+        decoded.save(out, format="jpeg")
+
+    encoder = FrameEncoder()
+    budget_encoder = FrameEncoder(max_pixels=pixel_budget(args.media_resolution))
+
+    def direct():
+        encoder.encode(bgra_to_image(size, bgra))
+
+    def budget():
+        budget_encoder.encode(bgra_to_image(size, bgra))
+
+    _report(
+        f"screen encode {args.width}x{args.height}, {args.frames} frames",
+        [
+            ("png roundtrip", _measure(legacy, args.frames)),
+            ("direct bgra->jpeg", _measure(direct, args.frames)),
+            ("direct + budget", _measure(budget, args.frames)),
+        ],
+    )
+
+
+def bench_tiles(args):
+    from capture import FrameEncoder, DirtyRegionTracker, MEDIA_RESOLUTION_PIXELS
+
+    base = synthetic_desktop(args.width, args.height)
+    changed = base.copy()
+    # A chat box receiving a new line of text
+    draw = PIL.ImageDraw.Draw(changed)
+    x, y = args.width * 2 // 3, args.height * 3 // 4
+    draw.rectangle([x, y, x + 400, y + 120], fill=(250, 250, 250))
+    draw.text((x + 10, y + 50), "new message arrived", fill=(0, 0, 0))
+
+    # As in AudioLoop: frames are sent at the medium-resolution pixel budget
+    budget = MEDIA_RESOLUTION_PIXELS["MEDIA_RESOLUTION_MEDIUM"]
+    encoder = FrameEncoder(max_pixels=budget)
+    tracker = DirtyRegionTracker(max_pixels=budget)
+    tracker.select(base, now=0.0)
+    region = tracker.select(changed, now=1.0)
+
+    sizes = {}
+
+    def full():
+        sizes["full"] = len(encoder.encode(changed))
+
+    def tiles():
+        tracker.reference = tracker.grey(base)
+        sizes["tiles"] = len(encoder.encode(tracker.select(changed, now=1.0)))
+
+    rows = [("full frame", _measure(full, args.frames)), ("dirty region", _measure(tiles, args.frames))]
+    for name, key in (("full frame", "full"), ("dirty region", "tiles")):
+        dict(rows)[name]["payload_kb"] = sizes[key] / 1024
+    _report(f"tile diff {args.width}x{args.height}, region {tracker.last_region} pasted into {region.size}", rows)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else 0.0
+
+
+async def _with_ticker(work, period=0.02):
+    """
+    Runs work() next to a fixed-period ticker standing in for the audio loop,
+    and returns the wall time of work plus how late the ticks fired.
+    """
+    loop = asyncio.get_running_loop()
+    lateness = []
+    done = asyncio.Event()
+
+    async def ticker():
+        deadline = loop.time()
+        while not done.is_set():
+            deadline += period
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            lateness.append((loop.time() - deadline) * 1000)
+
+    task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await task
+    return elapsed, lateness
+
+
+def bench_pool(args):
+    from capture import FrameEncoder, ProcessFrameEncoder, bgra_to_image, pixel_budget
+
+    img = synthetic_desktop(args.width, args.height)
+    raw = bytearray(img.tobytes("raw", "BGRX"))
+    size = img.size
+    max_pixels = pixel_budget(args.media_resolution)
+    encoder = FrameEncoder(max_pixels=max_pixels)
+    pool = ProcessFrameEncoder(workers=args.workers, max_pixels=max_pixels)
+
+    async def thread_frame():
+        await asyncio.to_thread(lambda: encoder.encode(bgra_to_image(size, raw)))
+
+    async def pool_frame():
+        future = await asyncio.to_thread(pool.submit, size, raw)
+        await asyncio.wrap_future(future)
+
+    async def run(encode_frame):
+        await encode_frame()  # warm up workers
+        elapsed, lateness = await _with_ticker(
+            lambda: asyncio.gather(*(encode_frame() for _ in range(args.frames)))
+        )
+        return {
+            "fps": args.frames / elapsed,
+            "tick_p50_ms": _percentile(lateness, 0.5),
+            "tick_p99_ms": _percentile(lateness, 0.99),
+            "tick_max_ms": max(lateness),
+        }
+
+    try:
+        rows = [("threads", asyncio.run(run(thread_frame))), (f"{args.workers} processes", asyncio.run(run(pool_frame)))]
+    finally:
+        pool.close()
+    _report(f"encode pipeline {args.width}x{args.height}, {args.frames} frames, 20 ms ticker", rows)
+
+
+class FakeVideoCapture:
+    """
+    Stand-in for cv2.VideoCapture that produces frames at a fixed rate into a
+    small backend queue, the way real capture drivers buffer. Each frame is a
+    one-element array holding its capture timestamp.
+    """
+    def __init__(self, device=0, fps=30.0, buffer=4):
+        self.fps = fps
+        self.props = {}
+        self._queue = deque(maxlen=buffer)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def _produce(self):
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            deadline += 1.0 / self.fps
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            with self._cond:
+                self._queue.append(np.array([time.monotonic()]))
+                self._cond.notify()
+
+    def set(self, prop, value):
+        self.props[prop] = value
+        return True
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+    def read(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue)
+            return True, self._queue.popleft()
+
+    def release(self):
+        self._stop.set()
+
+
+def bench_camera(args):
+    from capture import CameraReader
+
+    def sample(cap):
+        ages = []
+        deadline = time.monotonic()
+        for _ in range(args.frames):
+            deadline += args.interval
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            ret, frame = cap.read()
+            ages.append((time.monotonic() - frame[0]) * 1000)
+        cap.release()
+        return {"mean_age_ms": statistics.fmean(ages), "max_age_ms": max(ages)}
+
+    direct = sample(FakeVideoCapture(fps=args.fps, buffer=args.buffer))
+    reader = CameraReader(capture_factory=lambda device: FakeVideoCapture(device, args.fps, args.buffer))
+    reader.start()
+    latest = sample(reader)
+    _report(
+        f"camera frame age, {args.fps:g} fps device, backend buffer {args.buffer}, read every {args.interval:g}s",
+        [("cap.read()", direct), ("CameraReader", latest)],
+    )
+
+
+def read_wav(path):
+    """
+    Reads a 16-bit WAV file and returns (sample_rate, mono int16 samples).
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise SystemExit(f"{path}: only 16-bit PCM WAV files are supported")
+        rate, channels = wav.getframerate(), wav.getnchannels()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return rate, samples
+
+
+def synthetic_speech(rate=16000, seconds=30.0, seed=0, noise_db=None):
+    """
+    Builds talk-spurt-like audio: harmonic bursts with a syllable-rate envelope
+    separated by pauses, over background noise (faint, or noise_db dBFS).
+    Returns the int16 samples and a boolean mask of where the bursts are.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(rate * seconds)
+    t = np.arange(n) / rate
+    signal = rng.normal(0, 30 if noise_db is None else 32768 * 10 ** (noise_db / 20), n)
+    mask = np.zeros(n, dtype=bool)
+
+    pos = int(rate * 1.0)
+    while pos < n:
+        length = int(rate * rng.uniform(0.5, 2.5))
+        end = min(n, pos + length)
+        seg = t[pos:end]
+        pitch = rng.uniform(100, 220)
+        voice = sum(np.sin(2 * np.pi * pitch * k * seg) / k for k in range(1, 6))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * seg) ** 2
+        signal[pos:end] += 3000 * voice * envelope
+        mask[pos:end] = True
+        pos = end + int(rate * rng.uniform(0.8, 3.0))
+    return np.clip(signal, -32768, 32767).astype(np.int16), mask
+
+
+def bench_vad(args):
+    from audio import VoiceActivityGate, AUDIO_STREAM_END
+
+    inputs = []
+    for path in args.wav:
+        rate, samples = read_wav(path)
+        inputs.append((path, rate, samples, None))
+    if not inputs:
+        samples, mask = synthetic_speech(seconds=args.seconds)
+        inputs.append(("synthetic", 16000, samples, mask))
+        # Steady background noise, like a fan, that must not hold the gate open
+        for noise_db in args.noise:
+            samples, mask = synthetic_speech(seconds=args.seconds, noise_db=noise_db)
+            inputs.append((f"noise {noise_db:g} dBFS", 16000, samples, mask))
+
+    rows = []
+    for name, rate, samples, mask in inputs:
+        gate = VoiceActivityGate(sample_rate=rate)
+        chunk = args.chunk
+        kept = np.zeros(len(samples), dtype=bool)
+        ends = 0
+        started = time.perf_counter()
+        pending = []
+        for offset in range(0, len(samples) - chunk + 1, chunk):
+            pending.append(offset)
+            out = gate.process(samples[offset:offset + chunk].tobytes())
+            audio = [item for item in out if item is not AUDIO_STREAM_END]
+            ends += len(out) - len(audio)
+            if audio:
+                # The gate returns the newest chunks it was given, pre-roll first
+                for sent_offset in pending[-len(audio):]:
+                    kept[sent_offset:sent_offset + chunk] = True
+                pending = []
+            else:
+                del pending[:-64]
+        elapsed = time.perf_counter() - started
+
+        stats = gate.stats()
+        row = {
+            "suppressed_pct": stats["suppressed"] * 100,
+            "segments": stats["segments"],
+            "stream_ends": ends,
+            "x_realtime": len(samples) / rate / elapsed,
+        }
+        if mask is not None:
+            row["speech_kept_pct"] = kept[mask].mean() * 100
+        rows.append((name[-18:], row))
+    _report(f"voice activity gate, {args.chunk}-sample chunks", rows)
+
+
+class SimulatedAudioDevice:
+    """
+    Stand-in for pyaudio.PyAudio whose streams run on a real-time clock,
+    in blocking or callback mode like PortAudio.
+
+    Microphones play input_signal (int16 samples, looped) if given, and
+    otherwise silence tagged with each period's sequence number.
+    """
+    def __init__(self, input_signal=None):
+        self.input_signal = input_signal
+        self.streams = []
+
+    def open(self, format, channels, rate, input=False, output=False, frames_per_buffer=1024, stream_callback=None, **kwargs):
+        stream = SimulatedStream(rate, channels, frames_per_buffer, input, stream_callback, self.input_signal)
+        self.streams.append(stream)
+        return stream
+
+    def get_sample_size(self, format):
+        return 2
+
+    def get_default_input_device_info(self):
+        return {"index": 0, "defaultSampleRate": 16000.0, "maxInputChannels": 1, "maxOutputChannels": 0}
+
+    def get_default_output_device_info(self):
+        return {"index": 1, "defaultSampleRate": 24000.0, "maxInputChannels": 0, "maxOutputChannels": 1}
+
+    def get_device_info_by_index(self, index):
+        return self.get_default_output_device_info() if index else self.get_default_input_device_info()
+
+    def is_format_supported(self, rate, **kwargs):
+        return True
+
+
+class SimulatedStream:
+    def __init__(self, rate, channels, frames, is_input, callback, signal=None):
+        self.rate = rate
+        self.channels = channels
+        self.frames = frames
+        self.period = frames / rate
+        self.nbytes = frames * channels * 2
+        self.is_input = is_input
+        self.callback = callback
+        self.signal = signal
+        self.started = time.monotonic()
+
+        self._seq = 0
+        self._play_until = 0.0
+        self.underruns = 0
+        # Time until which the speaker is producing non-silent audio, and
+        # when each stretch of sound began
+        self.sound_until = 0.0
+        self.sound_starts = []
+        self._stop = threading.Event()
+        if callback is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def available_at(self, seq):
+        """Time at which input period seq was complete on the device."""
+        return self.started + (seq + 1) * self.period
+
+    def _payload(self, seq):
+        if self.signal is not None:
+            count = self.frames * self.channels
+            return np.take(self.signal, np.arange(seq * count, (seq + 1) * count), mode="wrap").tobytes()
+        return struct.pack("<q", seq) + bytes(self.nbytes - 8)
+
+    def _sounding(self, start, end):
+        if start > self.sound_until:
+            self.sound_starts.append(start)
+        self.sound_until = end
+
+    def _run(self):
+        seq = 0
+        while not self._stop.is_set():
+            time.sleep(max(0.0, self.available_at(seq) - time.monotonic()))
+            if self.is_input:
+                self.callback(self._payload(seq), self.frames, None, 0)
+            else:
+                data, _ = self.callback(None, self.frames, None, 0)
+                if any(data):
+                    now = time.monotonic()
+                    self._sounding(now, now + self.period)
+            seq += 1
+
+    def read(self, frames, exception_on_overflow=True):
+        seq, self._seq = self._seq, self._seq + 1
+        time.sleep(max(0.0, self.available_at(seq) - time.monotonic()))
+        return self._payload(seq)
+
+    def write(self, data):
+        now = time.monotonic()
+        if self._play_until and now > self._play_until:
+            self.underruns += 1
+        start = max(now, self._play_until)
+        self._play_until = start + len(data) / (2 * self.channels) / self.rate
+        if any(data):
+            self._sounding(start, self._play_until)
+        # A blocking write returns once the data fits in the device buffer
+        time.sleep(max(0.0, self._play_until - self.period - time.monotonic()))
+
+    def stop_stream(self):
+        self._stop.set()
+
+    def close(self):
+        self._stop.set()
+
+
+def bench_audio_io(args):
+    from audio import CallbackInput, CallbackOutput, PlaybackBuffer
+
+    async def run(mode):
+        device = SimulatedAudioDevice()
+        chunk = 1024
+        playback = PlaybackBuffer(rate=24000)
+        if mode == "callback":
+            mic = CallbackInput(device, rate=16000, chunk=chunk)
+            mic_stream = mic.open()
+            speaker_stream = CallbackOutput(device, playback, rate=24000, chunk=chunk).open()
+            read = mic.read
+        else:
+            mic_stream = device.open(format=None, channels=1, rate=16000, input=True, frames_per_buffer=chunk)
+            speaker_stream = device.open(format=None, channels=1, rate=24000, output=True, frames_per_buffer=chunk)
+
+            async def read():
+                return await asyncio.to_thread(mic_stream.read, chunk)
+
+        deadline = time.monotonic() + args.seconds
+        latencies, arrivals = [], []
+
+        async def capture():
+            while time.monotonic() < deadline:
+                data = await read()
+                now = time.monotonic()
+                seq = struct.unpack_from("<q", data)[0]
+                latencies.append((now - mic_stream.available_at(seq)) * 1000)
+                arrivals.append(now)
+
+        async def tool_calls():
+            # Slow tools occupying the shared default executor
+            while time.monotonic() < deadline:
+                await asyncio.to_thread(time.sleep, args.tool_time)
+
+        async def websocket():
+            # Model audio arrives in bursts of ~200 ms
+            while time.monotonic() < deadline:
+                playback.feed(bytes(chunk * 2 * 5))
+                await asyncio.sleep(0.2)
+
+        async def playback_writer():
+            while time.monotonic() < deadline:
+                try:
+                    block = await asyncio.wait_for(playback.next_block(), 0.5)
+                except TimeoutError:
+                    continue
+                await asyncio.to_thread(speaker_stream.write, block)
+
+        tasks = [capture(), websocket()] + [tool_calls() for _ in range(args.tools)]
+        if mode == "blocking":
+            tasks.append(playback_writer())
+        await asyncio.wait_for(asyncio.gather(*tasks), args.seconds + 5)
+        mic_stream.close()
+        speaker_stream.close()
+
+        gaps = np.diff(arrivals) * 1000
+        return {
+            "lat_mean_ms": statistics.fmean(latencies),
+            "lat_p99_ms": _percentile(latencies, 0.99),
+            "jitter_ms": float(np.std(gaps)),
+            "underruns": playback.underruns if mode == "callback" else speaker_stream.underruns,
+        }
+
+    rows = [(mode, asyncio.run(run(mode))) for mode in ("blocking", "callback")]
+    _report(f"audio I/O on a simulated device, {args.tools} concurrent {args.tool_time:g}s tool calls", rows)
+
+
+def scripted_arrivals(seconds, rate=24000, chunk_seconds=0.04, jitter=0.03, stall_every=3.0, stall=0.4, seed=0):
+    """
+    Builds a websocket delivery script as (offset_seconds, nbytes) pairs:
+    real-time audio with jittered arrivals and periodic stalls that are
+    followed by a catch-up burst.
+    """
+    rng = np.random.default_rng(seed)
+    nbytes = int(rate * chunk_seconds) * 2
+    script = []
+    for i in range(int(seconds / chunk_seconds)):
+        due = i * chunk_seconds
+        late = stall if due % stall_every < chunk_seconds * 8 and due > chunk_seconds * 8 else 0.0
+        script.append((max(0.0, due + late + rng.normal(0, jitter)), nbytes))
+    script.sort()
+    return script
+
+
+def bench_playback(args):
+    from audio import PlaybackBuffer
+
+    script = scripted_arrivals(args.seconds, jitter=args.jitter, stall=args.stall)
+
+    async def deliver(sink):
+        started = time.monotonic()
+        for offset, nbytes in script:
+            await asyncio.sleep(max(0.0, started + offset - time.monotonic()))
+            sink(bytes(nbytes))
+
+    async def naive():
+        # The original path: one thread hop and one device write per chunk
+        stream = SimulatedAudioDevice().open(format=None, channels=1, rate=24000, output=True)
+        queue = asyncio.Queue()
+        writes, queued, max_depth = 0, 0, 0
+
+        def sink(data):
+            nonlocal queued, max_depth
+            queue.put_nowait(data)
+            queued += len(data)
+            max_depth = max(max_depth, queued)
+
+        async def writer():
+            nonlocal writes, queued
+            while (data := await queue.get()) is not None:
+                queued -= len(data)
+                await asyncio.to_thread(stream.write, data)
+                writes += 1
+
+        task = asyncio.create_task(writer())
+        await deliver(sink)
+        queue.put_nowait(None)
+        await task
+        return {"underruns": stream.underruns, "writes": writes, "max_depth_s": max_depth / 48000}
+
+    async def jitter_buffer():
+        stream = SimulatedAudioDevice().open(format=None, channels=1, rate=24000, output=True)
+        playback = PlaybackBuffer(rate=24000, prebuffer=args.prebuffer)
+
+        async def writer():
+            while True:
+                await asyncio.to_thread(stream.write, await playback.next_block())
+
+        task = asyncio.create_task(writer())
+        await deliver(playback.feed)
+        playback.end_turn()
+        while playback.depth:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        stats = playback.stats()
+        return {"underruns": stream.underruns, "writes": stats["writes"], "max_depth_s": stats["max_depth_s"]}
+
+    rows = [("per-chunk writes", asyncio.run(naive())), ("jitter buffer", asyncio.run(jitter_buffer()))]
+    _report(
+        f"playback of {args.seconds:g}s scripted delivery, jitter {args.jitter * 1000:g} ms, "
+        f"{args.stall * 1000:g} ms stalls, prebuffer {args.prebuffer * 1000:g} ms",
+        rows,
+    )
+
+
+def bench_bargein(args):
+    import main as agent
+    from audio import PlaybackBuffer
+    from mock_live import ScriptedSession, audio_message, interrupted_message, turn_complete_message
+
+    # The model streams a long answer at 4x real time, and the user talks over it
+    chunk = b"\x01\x00" * 960  # 40 ms at 24 kHz
+    count = int(args.speech / 0.04)
+    script = [(0.01, audio_message(chunk)) for _ in range(count)]
+    script.append((max(0.0, args.at - count * 0.01), interrupted_message()))
+    script.append((0.05, turn_complete_message()))
+    interrupt_index = count
+
+    async def run(mode):
+        device = SimulatedAudioDevice()
+        agent.pya = device
+        loop = agent.AudioLoop(video_mode="none", vad=False, audio_io=mode)
+        loop.session = ScriptedSession(list(script))
+        loop.playback = PlaybackBuffer(rate=agent.RECEIVE_SAMPLE_RATE)
+
+        tasks = [asyncio.create_task(loop.receive_audio()), asyncio.create_task(loop.play_audio())]
+        while len(loop.session.delivered) <= interrupt_index:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.5)
+        for task in tasks:
+            task.cancel()
+        if loop.speaker is not None:
+            loop.speaker.close()
+
+        interrupted_at = loop.session.delivered[interrupt_index]
+        speaker = device.streams[-1]
+        speaker.close()
+        return {
+            "to_silence_ms": loop.playback.interrupt_latencies[0] * 1000,
+            "audible_after_ms": max(0.0, speaker.sound_until - interrupted_at) * 1000,
+        }
+
+    rows = [(mode, asyncio.run(run(mode))) for mode in ("blocking", "callback")]
+    _report(f"barge-in {args.at:g}s into a {args.speech:g}s answer delivered at 4x real time", rows)
+
+
+def bench_duplex(args):
+    from audio import PlaybackBuffer, DuplexPolicy, DUPLEX_MODES
+
+    # The agent talks for the whole run; its echo reaches the mic attenuated
+    # and delayed, and the user talks over it once
+    agent, _ = synthetic_speech(rate=24000, seconds=args.seconds, seed=1)
+    n = int(16000 * args.seconds)
+    echo = np.interp(np.arange(n) * 1.5, np.arange(len(agent)), agent.astype(np.float64))
+    delay = int(16000 * args.delay)
+    echo = np.concatenate([np.zeros(delay), echo[:n - delay]]) * 10 ** (args.coupling / 20)
+    # One talk spurt of the user's, starting at --barge-in
+    spurt, spurt_mask = synthetic_speech(rate=16000, seconds=4.0, seed=2)
+    start = int(16000 * args.barge_in)
+    user = np.random.default_rng(3).normal(0, 30, n)
+    user_mask = np.zeros(n, dtype=bool)
+    length = min(n - start, len(spurt) - 16000)
+    user[start:start + length] = spurt[16000:16000 + length]
+    user_mask[start:start + length] = spurt_mask[16000:16000 + length]
+    mic = echo + user
+    mic = np.clip(mic, -32768, 32767).astype(np.int16)
+
+    chunk, period = 1024, 1024
+    rows = []
+    for mode in DUPLEX_MODES:
+        playback = PlaybackBuffer(rate=24000, prebuffer=0.0)
+        playback.feed(agent.tobytes())
+        playback.end_turn()
+        policy = DuplexPolicy(mode)
+        played = 0
+        user_chunks = user_passed = 0
+        for start in range(0, n - chunk + 1, chunk):
+            now = (start + chunk) / 16000
+            while played / 24000 < now:
+                playback.pull(period * 2, now=played / 24000)
+                played += period
+            sent = policy.process(mic[start:start + chunk].tobytes(), playback, now=now)
+            if user_mask[start:start + chunk].any():
+                user_chunks += 1
+                user_passed += sent is not None
+        stats = policy.stats()
+        del stats["mode"]
+        stats["user_sent"] = user_passed / user_chunks if user_chunks else 0.0
+        rows.append((mode, stats))
+    _report(f"{args.seconds:g}s of agent speech, echo at {args.coupling:g} dB, user talks at {args.barge_in:g}s", rows)
+
+
+def _tone(rate, freq, seconds, amplitude=8000.0, delay=0.0):
+    t = np.arange(int(rate * seconds)) / rate - delay
+    return amplitude * np.sin(2 * np.pi * freq * t)
+
+
+def _db(signal, reference):
+    return 10 * np.log10(np.mean(np.square(signal)) / np.mean(np.square(reference)) + 1e-20)
+
+
+def bench_resample(args):
+    from audio import Resampler
+
+    pairs = [(48000, 16000, 2, 1), (44100, 16000, 1, 1), (24000, 48000, 1, 2), (24000, 44100, 1, 1)]
+    for in_rate, out_rate, in_channels, out_channels in pairs:
+        block = int(in_rate * 0.064)
+
+        def polyphase(samples):
+            resampler = Resampler(in_rate, out_rate, in_channels=in_channels, out_channels=out_channels)
+            interleaved = np.repeat(samples.astype(np.int16), in_channels)
+            step = block * in_channels
+            out = b"".join(
+                resampler.process(interleaved[i:i + step].tobytes()) for i in range(0, len(interleaved), step)
+            )
+            return np.frombuffer(out, dtype=np.int16)[::out_channels].astype(np.float64), resampler.delay
+
+        def linear(samples):
+            # Per-block linear interpolation, the usual quick fix
+            positions = np.arange(int(len(samples) * out_rate / in_rate)) * in_rate / out_rate
+            return np.interp(positions, np.arange(len(samples)), samples), 0.0
+
+        rows = []
+        for name, convert in (("polyphase", polyphase), ("linear", linear)):
+            signal = _tone(in_rate, 1000, args.seconds)
+            start = time.perf_counter()
+            out, delay = convert(signal)
+            elapsed = time.perf_counter() - start
+            # Skip the filter warm-up at both ends
+            keep = slice(len(out) // 10, len(out) * 9 // 10)
+            ideal = _tone(out_rate, 1000, len(out) / out_rate, delay=delay)
+            snr = -_db(out[keep] - ideal[keep], ideal[keep])
+
+            # Content the conversion should have removed: a tone above the
+            # output Nyquist when downsampling, images above the input
+            # Nyquist when upsampling
+            if out_rate < in_rate:
+                stray = _tone(in_rate, out_rate * 0.6, args.seconds)
+                leaked = _db(convert(stray)[0][keep], stray)
+            else:
+                spectrum = np.abs(np.fft.rfft(out[keep] * np.hanning(len(out[keep])))) ** 2
+                freqs = np.fft.rfftfreq(len(out[keep]), 1 / out_rate)
+                leaked = 10 * np.log10(spectrum[freqs > in_rate / 2].sum() / spectrum.sum() + 1e-20)
+            rows.append((name, {"x_realtime": args.seconds / elapsed, "snr_db": snr, "stray_db": leaked}))
+        _report(f"{in_rate} Hz x{in_channels} -> {out_rate} Hz x{out_channels}, 1 kHz tone in 64 ms blocks", rows)
+
+
+class SimulatedLink:
+    """
+    Session stand-in whose sends share one connection of fixed bandwidth.
+    """
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+        self._lock = asyncio.Lock()
+        # Monotonic time each send got onto the wire, per MIME type
+        self.started = {}
+
+    async def _send(self, kind, size):
+        async with self._lock:
+            self.started.setdefault(kind, []).append(time.monotonic())
+            await asyncio.sleep(size / self.bandwidth)
+
+    async def send_realtime_input(self, media=None, audio_stream_end=None):
+        if media:
+            await self._send(media["mime_type"], len(media["data"]))
+        else:
+            await self._send("audio/pcm", 16)
+
+    async def send_client_content(self, **kwargs):
+        await self._send("text", 256)
+
+
+class StubHTTPServer:
+    """
+    Local HTTP server for exercising the network tools offline.
+
+    routes maps a path to a function of (query, headers) returning
+    (status, headers, body). Every response is held back by delay seconds,
+    standing in for a remote API, and every new connection by
+    connect_delay, standing in for the DNS, TCP and TLS round trips to one.
+    Requests, new connections and body bytes are counted.
+    """
+    def __init__(self, routes, delay=0.05, connect_delay=0.0):
+        import http.server
+        import urllib.parse
+
+        stub = self
+        self.routes = routes
+        self.delay = delay
+        self.connect_delay = connect_delay
+        self.requests = 0
+        self.connections = 0
+        self.bytes = 0
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this,
+            # delayed ACKs add 40 ms to every reused connection
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+                time.sleep(stub.connect_delay)
+
+            def do_GET(self):
+                stub.requests += 1
+                url = urllib.parse.urlsplit(self.path)
+                route = stub.routes.get(url.path)
+                time.sleep(stub.delay)
+                if route is None:
+                    status, headers, body = 404, {}, b"not found"
+                else:
+                    status, headers, body = route(dict(urllib.parse.parse_qsl(url.query)), self.headers)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                stub.bytes += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(http.server.ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def bench_uplink(args):
+    from uplink import UplinkScheduler
+
+    audio_period = 0.064
+    audio_chunk = {"data": bytes(2048), "mime_type": "audio/pcm"}
+    frame = {"data": "x" * int(args.frame_kb * 1024), "mime_type": "image/jpeg"}
+
+    async def produce(put_audio, put_video, stats):
+        start = time.monotonic()
+        stats["enqueued"] = []
+
+        async def audio():
+            for seq in range(int(args.seconds / audio_period)):
+                await asyncio.sleep(max(0.0, start + seq * audio_period - time.monotonic()))
+                before = time.monotonic()
+                stats["enqueued"].append(before)
+                await put_audio(audio_chunk)
+                blocked = time.monotonic() - before
+                stats["blocked_ms"] += blocked * 1000
+                # The device ring holds about one period; longer stalls overflow it
+                stats["overflows"] += blocked > audio_period
+
+        async def video():
+            for seq in range(int(args.seconds * args.fps)):
+                await asyncio.sleep(max(0.0, start + seq / args.fps - time.monotonic()))
+                await put_video(frame)
+
+        await asyncio.gather(audio(), video())
+
+    def summary(link, stats):
+        # Audio is sent in order, so the n-th chunk queued is the n-th on the wire
+        enqueued = stats.pop("enqueued")
+        waits = sorted(sent - queued for sent, queued in zip(link.started.get("audio/pcm", []), enqueued))
+        return {
+            **stats,
+            "audio_p50_ms": _percentile(waits, 0.5) * 1000,
+            "audio_p95_ms": _percentile(waits, 0.95) * 1000,
+            "audio_max_ms": waits[-1] * 1000,
+            "video_sent": len(link.started.get("image/jpeg", [])),
+        }
+
+    async def legacy():
+        # The original layout: two queues, two sender tasks, one connection
+        link = SimulatedLink(args.bandwidth * 1024)
+        out_queue = asyncio.Queue(maxsize=5)
+        video_queue = asyncio.Queue(maxsize=2)
+        stats = {"blocked_ms": 0.0, "overflows": 0}
+
+        async def sender(queue):
+            while True:
+                await link.send_realtime_input(media=await queue.get())
+
+        senders = [asyncio.create_task(sender(out_queue)), asyncio.create_task(sender(video_queue))]
+        await produce(out_queue.put, video_queue.put, stats)
+        for task in senders:
+            task.cancel()
+        return {**summary(link, stats), "video_dropped": 0}
+
+    async def scheduled():
+        link = SimulatedLink(args.bandwidth * 1024)
+        uplink = UplinkScheduler()
+        stats = {"blocked_ms": 0.0, "overflows": 0}
+
+        async def put(kind, msg):
+            uplink.put(kind, "send_realtime_input", media=msg)
+
+        sender = asyncio.create_task(uplink.run(link))
+        await produce(lambda msg: put("audio", msg), lambda msg: put("video", msg), stats)
+        sender.cancel()
+        return {**summary(link, stats), "video_dropped": uplink["video"].dropped}
+
+    rows = [("two senders", asyncio.run(legacy())), ("priority uplink", asyncio.run(scheduled()))]
+    _report(
+        f"{args.seconds:g}s of mic audio plus {args.frame_kb:g} KB frames at {args.fps:g} fps over {args.bandwidth:g} KB/s",
+        rows,
+    )
+
+
+def bench_reconnect(args):
+    import main as agent
+    from audio import PlaybackBuffer
+    from mock_live import FakeLiveServer
+
+    async def run():
+        device = SimulatedAudioDevice()
+        agent.pya = device
+        server = FakeLiveServer()
+        loop = agent.AudioLoop(video_mode="none", vad=False, duplex="full", device_format="fixed", connect=server.connect)
+        loop.playback = PlaybackBuffer(rate=agent.RECEIVE_SAMPLE_RATE)
+
+        tasks = [asyncio.create_task(loop.stay_connected()), asyncio.create_task(loop.listen_audio())]
+        for _ in range(args.drops):
+            await asyncio.sleep(args.interval)
+            server.drop(refuse=args.refuse)
+        await asyncio.sleep(args.interval)
+        for task in tasks:
+            task.cancel()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if not isinstance(result, asyncio.CancelledError):
+                raise result
+        loop.mic.close()
+
+        # Every simulated mic period carries its sequence number
+        seqs = [
+            struct.unpack_from("<q", kwargs["media"]["data"])[0]
+            for _, method, kwargs in server.sent
+            if "media" in kwargs
+        ]
+        outages = [connected - dropped for dropped, connected in zip(server.dropped, server.connected[1:])]
+        return {
+            "connects": len(server.connected),
+            "attempts": server.attempts,
+            "resumed": sum(handle is not None for handle in server.handles),
+            "outage_ms": statistics.fmean(outages) * 1000 if outages else 0.0,
+            "chunks": max(seqs) + 1,
+            "missing": max(seqs) + 1 - len(set(seqs)),
+            "duplicates": len(seqs) - len(set(seqs)),
+            "replayed": loop.uplink["audio"].replayed,
+        }
+
+    rows = [("supervisor", asyncio.run(run()))]
+    _report(
+        f"{args.drops} dropped connections every {args.interval:g}s, {args.refuse} refused reconnect(s) each",
+        rows,
+    )
+
+
+def bench_e2e(args):
+    import main as agent
+    from mock_live import FakeLiveServer, load_recording, audio_message, text_message, tool_call_message, turn_complete_message
+
+    # One utterance per cycle, followed by silence
+    cycle = int(16000 * args.cycle)
+    utterance, mask = synthetic_speech(rate=16000, seconds=3.0, seed=2)
+    end = int(np.flatnonzero(np.diff(mask.astype(np.int8)) < 0)[0]) + 1
+    mic = np.random.default_rng(4).normal(0, 30, cycle).astype(np.int16)
+    mic[:end] = utterance[:end]
+    speech_end = end / 16000
+
+    if args.replay:
+        script, turns = load_recording(args.replay)
+    else:
+        chunk = bytes(np.full(960, 2000, dtype=np.int16))  # 40 ms at 24 kHz
+
+        def answer(words):
+            # Streamed faster than real time, like the API does
+            return (
+                [(args.model_delay, text_message(words))]
+                + [(0.01, audio_message(chunk)) for _ in range(int(args.answer / 0.04))]
+                + [(0.0, turn_complete_message())]
+            )
+
+        script = []
+        turns = []
+        for index in range(int(args.seconds / args.cycle) + 1):
+            if index % 2:
+                turns.append([(args.model_delay, tool_call_message((f"call-{index}", "bench_tool", {})))])
+                turns.append(answer("Here is what the tool said."))
+            else:
+                turns.append(answer("Sure."))
+    server = FakeLiveServer(script=lambda index: list(script) if index == 0 else [], turns=lambda index: turns if index == 0 else [])
+
+    def bench_tool(**kwargs):
+        time.sleep(args.tool_time)
+        return "done"
+
+    # Recorded tool calls must not reach the real tools
+    agent.AVAILABLE_FUNCTIONS = {name: bench_tool for name in list(agent.AVAILABLE_FUNCTIONS) + ["bench_tool"]}
+
+    async def run():
+        device = SimulatedAudioDevice(input_signal=mic)
+        agent.pya = device
+        loop = agent.AudioLoop(video_mode="none", text_input=False, connect=server.connect, capture=args.capture)
+        task = asyncio.create_task(loop.run())
+        await asyncio.sleep(args.seconds)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return device, loop
+
+    device, loop = asyncio.run(run())
+    session = server.sessions[0]
+    mic_stream = next(stream for stream in device.streams if stream.is_input)
+    speaker = next(stream for stream in device.streams if not stream.is_input)
+
+    def first_after(times, start):
+        return next((t for t in times if t >= start), None)
+
+    stream_ends = [sent_at for sent_at, method, kwargs in session.sent if kwargs.get("audio_stream_end")]
+    tool_responses = [sent_at for sent_at, method, kwargs in session.sent if method == "send_tool_response"]
+    # Script entries in delivery order, next to when each was delivered
+    delivered = list(zip(session.delivered, [message for turn in [script] + turns for _, message in turn]))
+    audio_delivered = [delivered_at for delivered_at, message in delivered if message.data]
+
+    timings = {
+        "speech_end_to_stream_end": [],
+        "turn_end_to_first_audio": [],
+        "first_audio_to_sound": [],
+        "turn_end_to_sound": [],
+        "tool_round_trip": [],
+    }
+    # The utterance in each cycle ends at the same offset into the mic signal
+    for end in stream_ends:
+        spoken = mic_stream.started + (end - mic_stream.started) // args.cycle * args.cycle + speech_end
+        timings["speech_end_to_stream_end"].append(end - spoken)
+    # User turns only; tool responses are part of the turn they answer
+    for turn_end in sorted(set(session.turn_ends) - set(tool_responses)):
+        audio = first_after(audio_delivered, turn_end)
+        sound = first_after(speaker.sound_starts, audio) if audio else None
+        if sound is not None:
+            timings["turn_end_to_first_audio"].append(audio - turn_end)
+            timings["first_audio_to_sound"].append(sound - audio)
+            timings["turn_end_to_sound"].append(sound - turn_end)
+    for tool_call_at, message in delivered:
+        if message.tool_call:
+            response = first_after(tool_responses, tool_call_at)
+            if response is not None:
+                timings["tool_round_trip"].append(response - tool_call_at)
+
+    rows = [
+        (name, {"count": len(values), "mean_ms": statistics.fmean(values) * 1000, "p95_ms": _percentile(values, 0.95) * 1000})
+        for name, values in timings.items()
+        if values
+    ]
+    source = args.replay or f"scripted turns, {args.model_delay:g}s model delay, {args.tool_time:g}s tool"
+    _report(f"end to end over {args.seconds:g}s ({source})", rows)
+
+
+def bench_tools(args):
+    from dispatch import ToolDispatcher
+    from mock_live import tool_call_message, audio_message
+
+    durations = [float(value) for value in args.durations.split(",")]
+    functions = {}
+    for index, seconds in enumerate(durations):
+        def slow_tool(seconds=seconds):
+            time.sleep(seconds)
+            return "done"
+        functions[f"slow_{index}"] = slow_tool
+    call = tool_call_message(*((f"call-{index}", name, {}) for index, name in enumerate(functions)))
+    chunk = bytes(1920)  # 40 ms at 24 kHz
+    audio_period = 0.04
+
+    async def downlink(started, schedule):
+        # One tool call, then audio still streaming in behind it. A message
+        # is only produced when the loop asks for it, so a blocked loop shows
+        # up as messages read late.
+        yield call
+        for seq in range(int(args.seconds / audio_period)):
+            due = started + seq * audio_period
+            await asyncio.sleep(max(0.0, due - time.monotonic()))
+            schedule.append(due)
+            yield audio_message(chunk)
+
+    async def run(mode):
+        started = time.monotonic()
+        schedule, reads, sends = [], [], []
+
+        def send(responses):
+            sends.append((time.monotonic(), len(responses)))
+
+        dispatcher = ToolDispatcher(functions, send, batch_deadline=args.batch if mode == "batched" else 0.0)
+        async for message in downlink(started, schedule):
+            if message.tool_call:
+                if mode == "sequential":
+                    # The original loop: each call awaited in turn, one response at the end
+                    for function_call in message.tool_call.function_calls:
+                        await asyncio.to_thread(functions[function_call.name])
+                    send(message.tool_call.function_calls)
+                else:
+                    dispatcher.dispatch(message.tool_call.function_calls)
+            else:
+                reads.append(time.monotonic())
+        while sum(count for _, count in sends) < len(durations):
+            await asyncio.sleep(0.01)
+        lags = sorted(read - due for read, due in zip(reads, schedule))
+        return {
+            "first_result_ms": (sends[0][0] - started) * 1000,
+            "all_results_ms": (sends[-1][0] - started) * 1000,
+            "responses": len(sends),
+            "audio_lag_p95_ms": _percentile(lags, 0.95) * 1000,
+            "audio_lag_max_ms": lags[-1] * 1000,
+        }
+
+    rows = [
+        ("sequential", asyncio.run(run("sequential"))),
+        ("concurrent", asyncio.run(run("each"))),
+        (f"batched {args.batch:g}s", asyncio.run(run("batched"))),
+    ]
+    _report(f"one tool call with {len(durations)} slow tools ({args.durations} s) while audio streams in", rows)
+
+
+def bench_executors(args):
+    import os
+    from dispatch import ToolDispatcher
+    from mock_live import tool_call_message
+
+    lock = threading.Lock()
+    hid = {"active": 0, "overlaps": 0}
+
+    def network_tool():
+        time.sleep(args.network_time)
+        return "done"
+
+    def hid_tool():
+        # pyautogui calls must not interleave; count any that do
+        with lock:
+            hid["active"] += 1
+            hid["overlaps"] += hid["active"] > 1
+        time.sleep(args.hid_time)
+        with lock:
+            hid["active"] -= 1
+        return "done"
+
+    functions = {"network": network_tool, "hid": hid_tool}
+    calls = [("network", index) for index in range(args.network)] + [("hid", index) for index in range(args.hid)]
+    message = tool_call_message(*((f"{name}-{index}", name, {}) for name, index in calls))
+
+    async def run(partitioned):
+        hid["overlaps"] = 0
+        loop = asyncio.get_running_loop()
+        hops = []
+        done = asyncio.Event()
+
+        async def audio_hops():
+            # The audio loop's to_thread() reads and writes, on the default executor
+            while not done.is_set():
+                before = loop.time()
+                await asyncio.to_thread(time.sleep, 0)
+                hops.append((loop.time() - before) * 1000)
+                await asyncio.sleep(0.02)
+
+        hopper = asyncio.create_task(audio_hops())
+        started = time.monotonic()
+        if partitioned:
+            finished = asyncio.Event()
+            results = []
+
+            def send(responses):
+                results.extend(responses)
+                if len(results) == len(calls):
+                    finished.set()
+
+            dispatcher = ToolDispatcher(functions, send, batch_deadline=0.0, classes={"network": "io", "hid": "hid"})
+            dispatcher.dispatch(message.tool_call.function_calls)
+            await finished.wait()
+            dispatcher.close()
+        else:
+            await asyncio.gather(*(asyncio.to_thread(functions[call.name]) for call in message.tool_call.function_calls))
+        elapsed = time.monotonic() - started
+        done.set()
+        await hopper
+        hops.sort()
+        return {
+            "all_done_ms": elapsed * 1000,
+            "hid_overlaps": hid["overlaps"],
+            "audio_hop_p95_ms": _percentile(hops, 0.95),
+            "audio_hop_max_ms": hops[-1],
+        }
+
+    rows = [("default executor", asyncio.run(run(False))), ("partitioned", asyncio.run(run(True)))]
+    _report(
+        f"{args.network} network calls ({args.network_time:g}s) and {args.hid} HID calls ({args.hid_time:g}s) at once, "
+        f"default executor of {min(32, (os.cpu_count() or 1) + 4)} threads",
+        rows,
+    )
+
+
+def bench_cache(args):
+    import json
+    import requests
+    from dispatch import ToolDispatcher, ToolCache
+    from mock_live import tool_call_message
+
+    def weather_route(query, headers):
+        body = {"location": {"name": query.get("q", "")}, "current": {"temp_c": 21.0, "condition": {"text": "Sunny"}}}
+        return 200, {"Content-Type": "application/json"}, json.dumps(body).encode()
+
+    server = StubHTTPServer({"/v1/current.json": weather_route}, delay=args.delay)
+
+    def get_weather(city: str) -> dict:
+        data = requests.get(f"{server.url}/v1/current.json", params={"q": city}, timeout=5).json()
+        return {"location": data["location"]["name"], "temperature_c": data["current"]["temp_c"]}
+
+    # The model asking about a handful of cities, spelled a little differently
+    # each time, sometimes twice in one tool call
+    rng = np.random.default_rng(0)
+    cities = ["Istanbul", "Paris", "Tokyo", "New York", "Berlin"]
+    spellings = [str.lower, str.title, lambda city: f" {city} ", str.upper]
+    messages = []
+    for index in range(args.calls):
+        city = spellings[rng.integers(len(spellings))](cities[rng.integers(len(cities))])
+        calls = [(f"call-{index}", "get_weather", {"city": city})]
+        if rng.random() < 0.2:
+            calls.append((f"call-{index}-again", "get_weather", {"city": city}))
+        messages.append(tool_call_message(*calls))
+
+    async def run(cached):
+        server.requests = 0
+        latencies = []
+        dispatched = {}
+        pending = set()
+
+        def send(responses):
+            for response in responses:
+                latencies.append(time.monotonic() - dispatched[response.id])
+                pending.discard(response.id)
+
+        cache = ToolCache({"get_weather": args.ttl}) if cached else None
+        dispatcher = ToolDispatcher({"get_weather": get_weather}, send, batch_deadline=0.0, cache=cache)
+        for message in messages:
+            for call in message.tool_call.function_calls:
+                dispatched[call.id] = time.monotonic()
+                pending.add(call.id)
+            dispatcher.dispatch(message.tool_call.function_calls)
+            await asyncio.sleep(args.interval)
+        while pending:
+            await asyncio.sleep(0.01)
+        dispatcher.close()
+        latencies.sort()
+        row = {
+            "calls": len(latencies),
+            "upstream": server.requests,
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+        }
+        if cache is not None:
+            stats = cache.stats()
+            row.update(hit_rate=stats["hit_rate"], coalesced=stats["coalesced"])
+        return row
+
+    rows = [("no cache", asyncio.run(run(False))), ("ttl cache", asyncio.run(run(True)))]
+    server.close()
+    _report(
+        f"{args.calls} get_weather tool calls every {args.interval:g}s against a local stub ({args.delay:g}s per request)",
+        rows,
+    )
+
+
+def bench_http(args):
+    import json
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+    import tools
+
+    def weather_route(query, headers):
+        body = {
+            "location": {"name": query.get("q", ""), "country": "Nowhere"},
+            "current": {"temp_c": 21.0, "condition": {"text": "Sunny"}, "humidity": 40, "wind_kph": 10.0},
+        }
+        return 200, {"Content-Type": "application/json"}, json.dumps(body).encode()
+
+    server = StubHTTPServer({"/v1/current.json": weather_route}, delay=args.delay, connect_delay=args.connect_delay)
+    tools.WEATHER_API_URL = f"{server.url}/v1/current.json"
+
+    def legacy_weather(city):
+        # What getWeather did before: a bare requests.get, new connection every time
+        response = requests.get(tools.WEATHER_API_URL, params={"key": "stub", "q": city, "aqi": "no"})
+        response.raise_for_status()
+        return response.json()
+
+    def run(call, concurrency):
+        server.connections = 0
+        latencies = []
+
+        def timed(index):
+            started = time.perf_counter()
+            result = call(f"city-{index % 5}")
+            latencies.append(time.perf_counter() - started)
+            assert "error" not in result, result
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed, range(args.calls)))
+        latencies.sort()
+        return {
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "connections": server.connections,
+        }
+
+    rows = [
+        ("requests.get", run(legacy_weather, 1)),
+        ("shared session", run(tools.getWeather, 1)),
+        (f"requests.get x{args.concurrency}", run(legacy_weather, args.concurrency)),
+        (f"shared session x{args.concurrency}", run(tools.getWeather, args.concurrency)),
+    ]
+    stats = tools.http_stats()
+    server.close()
+    _report(
+        f"{args.calls} getWeather calls against a local stub ({args.delay:g}s per request, "
+        f"{args.connect_delay:g}s per new connection), {tools.HTTP_POOL_PER_HOST} connections per host",
+        rows,
+    )
+    print(f"  shared session totals: {stats['requests']} requests over {stats['connections']} connections")
+
+
+def bench_feeds(args):
+    import feedparser
+    import email.utils
+    from datetime import datetime, timedelta, timezone
+    import tools
+    from feeds import FeedStore
+
+    rng = np.random.default_rng(0)
+    now = time.time()
+    keys = ["steam", "ign", "eurogamer", "gamerant"]
+    # Publishers stamp their items in their own time zones
+    zones = {key: timezone(timedelta(hours=hours)) for key, hours in zip(keys, (-8, -5, 0, 9))}
+    # Each feed: (timestamp, guid) items, newest added as the bench goes on
+    items = {
+        key: [(now - rng.uniform(0, 6 * 86400), f"{key}-{index}") for index in range(args.items)]
+        for key in keys
+    }
+
+    def feed_route(key):
+        def route(query, headers):
+            if key == "gamerant":
+                time.sleep(args.slow)
+            entries = sorted(items[key], reverse=True)
+            etag = f'"{key}-{len(entries)}"'
+            if headers.get("If-None-Match") == etag:
+                return 304, {"ETag": etag}, b""
+            body = "".join(
+                f"<item><title>{guid} title</title><link>http://example.com/{guid}</link><guid>{guid}</guid>"
+                f"<pubDate>{email.utils.format_datetime(datetime.fromtimestamp(stamp, zones[key]))}</pubDate><description>{'news ' * 40}</description></item>"
+                for stamp, guid in entries
+            )
+            xml = f'<?xml version="1.0"?><rss version="2.0"><channel><title>{key}</title>{body}</channel></rss>'
+            return 200, {"ETag": etag, "Content-Type": "application/rss+xml"}, xml.encode()
+        return route
+
+    server = StubHTTPServer({f"/{key}": feed_route(key) for key in keys}, delay=args.delay)
+    sources = {key: {"name": key, "url": f"{server.url}/{key}", "type": "rss"} for key in keys}
+
+    def legacy_gaming_news(limit=5):
+        # The original get_gaming_news: every feed downloaded and parsed in turn
+        results = []
+        for src, src_info in sources.items():
+            feed = feedparser.parse(src_info["url"])
+            for entry in feed.entries[:limit]:
+                published = entry.get('published_parsed', entry.get('updated_parsed'))
+                if published:
+                    pub_date = datetime(*published[:6])
+                    if datetime.now() - pub_date > timedelta(days=7):
+                        continue
+                results.append({"title": entry.title, "published": entry.get('published', '')})
+        results.sort(key=lambda x: x.get('published', ''), reverse=True)
+        return {"news": results[:limit*2]}
+
+    def misordered(news):
+        stamps = [email.utils.parsedate_to_datetime(item["published"]).timestamp() for item in news]
+        return sum(a < b for a, b in zip(stamps, stamps[1:]))
+
+    def run(call):
+        server.requests = server.bytes = 0
+        latencies, wrong = [], 0
+        for index in range(args.calls):
+            if index and index % 3 == 0:
+                # New stories on two of the feeds
+                for key in keys[:2]:
+                    items[key].append((time.time(), f"{key}-new-{index}"))
+            started = time.perf_counter()
+            news = call()["news"]
+            latencies.append(time.perf_counter() - started)
+            wrong += misordered(news)
+        return {
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "max_ms": max(latencies) * 1000,
+            "downloaded_kb": server.bytes / 1024,
+            "misordered": wrong,
+        }
+
+    legacy = run(legacy_gaming_news)
+    tools.GAMING_FEEDS = sources
+    tools._gaming_feeds = FeedStore(sources, get=tools.http_get, deadline=args.deadline)
+    store = run(tools.get_gaming_news)
+    store["parsed_entries"] = sum(feed["new_entries"] for feed in tools._gaming_feeds.stats().values())
+    legacy["parsed_entries"] = args.calls * len(keys) * args.items
+    server.close()
+    _report(
+        f"{args.calls} get_gaming_news calls over {len(keys)} feeds of {args.items} items "
+        f"({args.delay:g}s each, one {args.delay + args.slow:g}s), {args.deadline:g}s deadline",
+        [("sequential parse", legacy), ("feed store", store)],
+    )
+
+
+def bench_shell(args):
+    import os
+    import subprocess
+    from shell import ShellPool, platform_shell
+
+    argv = platform_shell()
+    commands = ["echo hello", "date", "echo done"]
+
+    def spawn(command):
+        # What runCommand used to do: a new shell for every call
+        if os.name == "nt":
+            return subprocess.run(["powershell", "-Command", command], capture_output=True)
+        return subprocess.run([argv[0], "-c", command], capture_output=True)
+
+    pool = ShellPool(size=1, argv=argv)
+
+    def run(call):
+        latencies = []
+        for index in range(args.commands):
+            started = time.perf_counter()
+            call(commands[index % len(commands)])
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        return {
+            "p50_ms": _percentile(latencies, 0.5) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "max_ms": latencies[-1] * 1000,
+        }
+
+    rows = [("spawn per call", run(spawn)), ("persistent shell", run(pool.run))]
+    rows[1][1]["spawns"] = pool.stats()["spawns"]
+    pool.close()
+    _report(f"{args.commands} short commands through {argv[0]}", rows)
+
+
+def generate_tree(root, dirs, files_per_dir, depth=4, seed=0):
+    """
+    Builds a directory tree of roughly dirs directories, each holding
+    files_per_dir empty files with assorted names and extensions.
+    """
+    import os
+
+    rng = np.random.default_rng(seed)
+    words = ["report", "photo", "notes", "draft", "invoice", "backup", "song", "video", "data", "summary"]
+    extensions = [".txt", ".pdf", ".jpg", ".py", ".mp3", ".csv", ".docx"]
+    paths = [root]
+    for index in range(dirs):
+        parent = paths[rng.integers(len(paths))] if len(paths) < dirs // depth else paths[-rng.integers(1, len(paths))]
+        path = os.path.join(parent, f"{words[rng.integers(len(words))]}_dir{index}")
+        os.makedirs(path)
+        paths.append(path)
+        for number in range(files_per_dir):
+            name = f"{words[rng.integers(len(words))]}_{index}_{number}{extensions[rng.integers(len(extensions))]}"
+            open(os.path.join(path, name), "wb").close()
+    return paths
+
+
+def bench_files(args):
+    import os
+    import glob
+    import tempfile
+    from fileindex import FileIndex, stream_search
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "tree")
+        paths = generate_tree(root, args.dirs, args.files)
+        index_path = os.path.join(tmp, "index.json.gz")
+        queries = ["invoice_4", "*.pdf", "zzz-no-match"]
+
+        def timed(fn):
+            started = time.perf_counter()
+            result = fn()
+            return (time.perf_counter() - started) * 1000, result
+
+        rows = []
+        for query in queries:
+            pattern = f"**/*{query}*" if "*" not in query else f"**/{query}"
+            legacy_ms, found = timed(lambda: glob.glob(os.path.join(root, pattern), recursive=True)[:20])
+            stream_ms, _ = timed(lambda: stream_search(query, root))
+            rows.append((f"glob {query}", {"ms": legacy_ms, "results": len(found)}))
+            rows.append((f"stream {query}", {"ms": stream_ms, "results": len(found)}))
+
+        build_ms, index = timed(lambda: FileIndex(root, index_path).build())
+        rows.append(("index build", {"ms": build_ms, "dirs": len(index.dirs), "names": len(index._names), "disk_kb": os.path.getsize(index_path) / 1024}))
+        # A few directories change between refreshes
+        for path in paths[1:args.changed + 1]:
+            open(os.path.join(path, "new_invoice_file.txt"), "wb").close()
+        refresh_ms, _ = timed(index.refresh)
+        rows.append(("index refresh", {"ms": refresh_ms, "rescanned": index.scanned, "reused": index.reused}))
+        load_ms, loaded = timed(lambda: FileIndex(root, index_path).load())
+        rows.append(("index load", {"ms": load_ms}))
+        for query in queries + ["new_invoice"]:
+            query_ms, found = timed(lambda: index.search(query, root))
+            rows.append((f"index {query}", {"ms": query_ms, "results": len(found)}))
+        _report(f"{args.dirs} directories x {args.files} files ({args.changed} changed before the refresh)", rows)
+
+
+def bench_read(args):
+    import os
+    import tempfile
+    from pager import FilePager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.log")
+        rng = np.random.default_rng(0)
+        with open(path, "w", encoding="utf-8") as file:
+            for line in range(args.lines):
+                file.write(f"2026-10-18 12:{line % 60:02d}:00 INFO worker-{line % 8} request {line} took {rng.integers(1, 900)} ms\n")
+            # A little non-ASCII so character boundaries matter
+            file.write("done: données traitées ✓\n")
+        size = os.path.getsize(path)
+
+        def timed(fn, repeat=1):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                result = fn()
+            return (time.perf_counter() - started) * 1000 / repeat, result
+
+        def legacy():
+            with open(path, "r", encoding="utf-8") as file:
+                return file.read()
+
+        rows = []
+        legacy_ms, text = timed(legacy, 3)
+        rows.append(("whole file", {"ms": legacy_ms, "chars": len(text)}))
+
+        pager = FilePager()
+        middle = args.lines // 2
+        first_ms, page = timed(lambda: pager.read(path, start_line=middle, line_count=args.page))
+        rows.append(("page, cold index", {"ms": first_ms, "chars": len(page["content"])}))
+        warm_ms, page = timed(lambda: pager.read(path, start_line=middle, line_count=args.page), 200)
+        rows.append(("page, warm index", {"ms": warm_ms, "chars": len(page["content"])}))
+        far_ms, page = timed(lambda: pager.read(path, start_line=args.lines, line_count=args.page))
+        rows.append(("page at the end", {"ms": far_ms, "total_lines": page.get("total_lines", 0)}))
+        tail_ms, page = timed(lambda: pager.read(path, tail_lines=args.page), 200)
+        rows.append(("tail", {"ms": tail_ms, "chars": len(page["content"])}))
+        bytes_ms, page = timed(lambda: pager.read(path, offset=size // 3, length=8192), 200)
+        rows.append(("byte range", {"ms": bytes_ms, "chars": len(page["content"])}))
+        budget_ms, page = timed(lambda: pager.read(path), 200)
+        rows.append(("default page", {"ms": budget_ms, "chars": len(page["content"]), "next_line": page["next"]["start_line"]}))
+
+        binary = os.path.join(tmp, "blob.bin")
+        with open(binary, "wb") as file:
+            file.write(bytes(rng.integers(0, 256, 4 * 1024 * 1024, dtype=np.uint8)))
+        binary_ms, page = timed(lambda: pager.read(binary), 200)
+        rows.append(("binary file", {"ms": binary_ms, "binary": page.get("binary", False)}))
+        _report(f"{args.lines} line log ({size / 1024 / 1024:.1f} MB), {args.page} line pages", rows)
+
+
+def bench_capture(args):
+    import os
+    import tempfile
+    from recorder import SessionRecorder, SessionRecording, summarize
+
+    audio = bytes(2048)
+    frame = bytes(np.random.default_rng(0).integers(0, 256, int(args.frame_kb * 1024), dtype=np.uint8))
+    frame_b64 = base64.b64encode(frame).decode()
+    seconds = args.minutes * 60
+    path = os.path.join(tempfile.mkdtemp(), "session.rec")
+
+    # A session's worth of traffic: 64 ms mic chunks, 40 ms answer chunks, frames
+    recorder = SessionRecorder(path)
+    calls = []
+    for tick in range(int(seconds / 0.064)):
+        for kind, payload in (("uplink_audio", audio), ("downlink_audio", audio)):
+            start = time.perf_counter()
+            recorder.record(kind, payload, {"rate": 16000})
+            calls.append(time.perf_counter() - start)
+        if tick % int(1 / 0.064 / args.fps) == 0:
+            start = time.perf_counter()
+            recorder.record("uplink_video", frame_b64, {"mime_type": "image/jpeg"})
+            calls.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    recorder.close()
+    drain = time.perf_counter() - start
+    size = os.path.getsize(path)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    recording = SessionRecording(path)
+    opened = time.perf_counter() - start
+    start = time.perf_counter()
+    # Records were written faster than real time, so seek by index time
+    middle = recording[recording.index_at(recording[len(recording) - 1].time / 2)]
+    seek = time.perf_counter() - start
+    del middle
+    start = time.perf_counter()
+    summarize(recording)
+    summary = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The same traffic as base64 JSON lines with a little metadata each
+    json_size = sum((len(record.payload) + 2) // 3 * 4 + 60 for record in recording)
+    recording.close()
+    os.remove(path)
+
+    calls.sort()
+    _report(f"{args.minutes:g} minutes of session traffic, {args.frame_kb:g} KB frames at {args.fps:g} fps", [
+        ("write", {
+            "record_us_p50": _percentile(calls, 0.5) * 1e6,
+            "record_us_p99": _percentile(calls, 0.99) * 1e6,
+            "drain_ms": drain * 1000,
+            "file_mb": size / 1e6,
+            "vs_b64_json": size / json_size,
+        }),
+        ("read", {
+            "open_ms": opened * 1000,
+            "seek_ms": seek * 1000,
+            "summary_s": summary,
+            "peak_alloc_mb": peak / 1e6,
+        }),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("screen", help="screen encoder: legacy PNG round trip vs direct BGRA to JPEG")
+    p.add_argument("--width", type=int, default=3840)
+    p.add_argument("--height", type=int, default=2160)
+    p.add_argument("--frames", type=int, default=20)
+    p.add_argument("--media-resolution", default="MEDIA_RESOLUTION_MEDIUM")
+    p.set_defaults(func=bench_screen)
+
+    p = sub.add_parser("tiles", help="full frame vs dirty-region crop after a small change")
+    p.add_argument("--width", type=int, default=3840)
+    p.add_argument("--height", type=int, default=2160)
+    p.add_argument("--frames", type=int, default=20)
+    p.set_defaults(func=bench_tiles)
+
+    p = sub.add_parser("pool", help="thread vs process-pool encoding: throughput and event loop jitter")
+    p.add_argument("--width", type=int, default=3840)
+    p.add_argument("--height", type=int, default=2160)
+    p.add_argument("--frames", type=int, default=40)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--media-resolution", default="MEDIA_RESOLUTION_MEDIUM")
+    p.set_defaults(func=bench_pool)
+
+    p = sub.add_parser("camera", help="age of camera frames: direct cap.read() vs latest-frame reader")
+    p.add_argument("--fps", type=float, default=30.0)
+    p.add_argument("--buffer", type=int, default=4)
+    p.add_argument("--interval", type=float, default=0.5)
+    p.add_argument("--frames", type=int, default=10)
+    p.set_defaults(func=bench_camera)
+
+    p = sub.add_parser("vad", help="voice activity gate on WAV files (or synthetic speech)")
+    p.add_argument("wav", nargs="*", help="16-bit PCM WAV files; synthetic speech when omitted")
+    p.add_argument("--chunk", type=int, default=1024)
+    p.add_argument("--seconds", type=float, default=60.0)
+    p.add_argument("--noise", type=float, nargs="*", default=[-45.0, -40.0], help="background noise levels of extra synthetic runs, in dBFS")
+    p.set_defaults(func=bench_vad)
+
+    p = sub.add_parser("audio-io", help="blocking vs callback audio I/O: capture latency, jitter, underruns")
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--tools", type=int, default=8, help="concurrent slow tool calls on the default executor")
+    p.add_argument("--tool-time", type=float, default=0.3)
+    p.set_defaults(func=bench_audio_io)
+
+    p = sub.add_parser("playback", help="per-chunk playback vs the jitter buffer under scripted bursty delivery")
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--jitter", type=float, default=0.03)
+    p.add_argument("--stall", type=float, default=0.4)
+    p.add_argument("--prebuffer", type=float, default=0.15)
+    p.set_defaults(func=bench_playback)
+
+    p = sub.add_parser("bargein", help="interruption-to-silence latency with a scripted Live session")
+    p.add_argument("--speech", type=float, default=6.0, help="seconds of model audio in the turn")
+    p.add_argument("--at", type=float, default=2.0, help="seconds into the turn the user interrupts")
+    p.set_defaults(func=bench_bargein)
+
+    p = sub.add_parser("resample", help="streaming polyphase resampler: throughput, SNR and stopband leakage")
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.set_defaults(func=bench_resample)
+
+    p = sub.add_parser("uplink", help="independent senders vs the priority uplink on a constrained link")
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--bandwidth", type=float, default=256.0, help="link bandwidth in KB/s")
+    p.add_argument("--frame-kb", type=float, default=120.0)
+    p.add_argument("--fps", type=float, default=2.0)
+    p.set_defaults(func=bench_uplink)
+
+    p = sub.add_parser("reconnect", help="reconnect supervisor against a fake server that drops connections")
+    p.add_argument("--drops", type=int, default=3)
+    p.add_argument("--interval", type=float, default=2.0, help="seconds between drops")
+    p.add_argument("--refuse", type=int, default=1, help="reconnect attempts refused after each drop")
+    p.set_defaults(func=bench_reconnect)
+
+    p = sub.add_parser("e2e", help="end-to-end timings of AudioLoop against a scripted or recorded fake session")
+    p.add_argument("--replay", metavar="PATH", help="server messages recorded with main.py --record")
+    p.add_argument("--seconds", type=float, default=20.0)
+    p.add_argument("--cycle", type=float, default=5.0, help="seconds between the user's utterances")
+    p.add_argument("--model-delay", type=float, default=0.3, help="scripted server think time")
+    p.add_argument("--answer", type=float, default=1.5, help="seconds of audio in each scripted answer")
+    p.add_argument("--tool-time", type=float, default=0.2, help="run time of the stand-in tool")
+    p.add_argument("--capture", metavar="PATH", help="also write a session capture file")
+    p.set_defaults(func=bench_e2e)
+
+    p = sub.add_parser("tools", help="sequential vs concurrent tool dispatch with fake slow tools")
+    p.add_argument("--durations", default="0.3,0.8,1.5", help="comma-separated run time of each tool in seconds")
+    p.add_argument("--batch", type=float, default=0.25, help="batch deadline in seconds")
+    p.add_argument("--seconds", type=float, default=3.0, help="seconds of downlink audio")
+    p.set_defaults(func=bench_tools)
+
+    p = sub.add_parser("executors", help="shared default executor vs per-class tool executors")
+    p.add_argument("--network", type=int, default=16, help="concurrent network tool calls")
+    p.add_argument("--network-time", type=float, default=0.5)
+    p.add_argument("--hid", type=int, default=4, help="concurrent mouse/keyboard tool calls")
+    p.add_argument("--hid-time", type=float, default=0.05)
+    p.set_defaults(func=bench_executors)
+
+    p = sub.add_parser("cache", help="tool result cache and single-flight against a local HTTP stub")
+    p.add_argument("--calls", type=int, default=60)
+    p.add_argument("--interval", type=float, default=0.05, help="seconds between tool calls")
+    p.add_argument("--delay", type=float, default=0.15, help="stub response time in seconds")
+    p.add_argument("--ttl", type=float, default=600.0)
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser("http", help="per-call requests.get vs the shared keep-alive session, against a local HTTP stub")
+    p.add_argument("--calls", type=int, default=100)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--delay", type=float, default=0.01, help="stub response time in seconds")
+    p.add_argument("--connect-delay", type=float, default=0.1, help="simulated connection setup time in seconds")
+    p.set_defaults(func=bench_http)
+
+    p = sub.add_parser("feeds", help="sequential feed parsing vs the incremental feed store, against a local feed server")
+    p.add_argument("--calls", type=int, default=10)
+    p.add_argument("--items", type=int, default=30, help="items per feed")
+    p.add_argument("--delay", type=float, default=0.15, help="server response time in seconds")
+    p.add_argument("--slow", type=float, default=0.5, help="extra response time of one feed")
+    p.add_argument("--deadline", type=float, default=0.4, help="per-feed deadline in seconds")
+    p.set_defaults(func=bench_feeds)
+
+    p = sub.add_parser("shell", help="per-command latency: a new shell per call vs a persistent shell worker")
+    p.add_argument("--commands", type=int, default=200)
+    p.set_defaults(func=bench_shell)
+
+    p = sub.add_parser("files", help="glob vs streaming search vs the file name index on a generated tree")
+    p.add_argument("--dirs", type=int, default=5000)
+    p.add_argument("--files", type=int, default=40, help="files per directory")
+    p.add_argument("--changed", type=int, default=20, help="directories touched before the refresh")
+    p.set_defaults(func=bench_files)
+
+    p = sub.add_parser("read", help="whole-file read vs paged mmap reads with a cached line index")
+    p.add_argument("--lines", type=int, default=2_000_000)
+    p.add_argument("--page", type=int, default=100, help="lines per page")
+    p.set_defaults(func=bench_read)
+
+    p = sub.add_parser("capture", help="session capture file: record() cost, size, and mmap reader speed")
+    p.add_argument("--minutes", type=float, default=10.0)
+    p.add_argument("--frame-kb", type=float, default=60.0)
+    p.add_argument("--fps", type=float, default=1.0)
+    p.set_defaults(func=bench_capture)
+
+    p = sub.add_parser("duplex", help="duplex policies: echo kept off the uplink vs user speech let through")
+    p.add_argument("--seconds", type=float, default=12.0)
+    p.add_argument("--coupling", type=float, default=-12.0, help="echo level relative to playback, in dB")
+    p.add_argument("--delay", type=float, default=0.04, help="speaker-to-mic delay in seconds")
+    p.add_argument("--barge-in", type=float, default=5.5, help="seconds in when the user starts talking")
+    p.set_defaults(func=bench_duplex)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,662 @@
+import io
+import time
+import queue
+import base64
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+
+import cv2
+import mss
+import PIL.Image
+import PIL.ImageChops
+
+JPEG_QUALITY = 80
+
+# Pixels the model actually consumes per frame at each media_resolution.
+# The server downsamples anything larger, so sending more only costs encode
+# time and bandwidth. One 768x768 tile is the medium-resolution budget.
+MEDIA_RESOLUTION_PIXELS = {
+    "MEDIA_RESOLUTION_LOW": 384 * 384,
+    "MEDIA_RESOLUTION_MEDIUM": 768 * 768,
+    "MEDIA_RESOLUTION_HIGH": 1536 * 1536,
+    "MEDIA_RESOLUTION_UNSPECIFIED": 768 * 768,
+}
+
+# Frame deduplication
+DEDUP_GRID = (64, 36)         # size of the downsampled fingerprint
+DEDUP_TOLERANCE = 3           # grey levels a fingerprint cell may drift before it counts as changed
+DEDUP_MIN_CHANGED = 0.002     # fraction of changed cells needed to send a frame; a blinking cursor touches one or two
+KEEPALIVE_INTERVAL = 10.0     # seconds; an unchanged frame is still sent this often
+
+# Dirty-region tiling
+TILE_SIZE = 64                # changed regions are snapped to this grid, in pixels
+TILE_TOLERANCE = 8            # grey levels a pixel may drift before its tile counts as changed
+TILE_DIFF_REDUCE = 4          # changes are searched for on the grey frame shrunk by this factor
+FULL_FRAME_INTERVAL = 15.0    # seconds; a full frame is sent at least this often
+FULL_FRAME_AREA = 0.5         # send the full frame when the changed region covers more than this
+REGION_MAX_PIXELS = 768 * 768  # canvas the changed regions are pasted into
+
+# Camera
+CAMERA_WIDTH = 1280
+CAMERA_HEIGHT = 720
+CAMERA_FPS = 30
+CAMERA_TIMEOUT = 5.0          # seconds without a new frame before the camera counts as gone
+
+# Adaptive frame rate
+IDLE_FPS = 1.0                # rate when nothing on screen moves; bounds how late the first change is seen
+MAX_FPS = 2.0                 # ceiling during motion
+MIN_FPS = 0.2                 # floor when the uplink cannot keep up
+MOTION_THRESHOLD = 0.01       # fraction of changed fingerprint cells that counts as motion
+SEND_BUDGET = 0.8             # share of the frame interval a single upload may take
+
+
+class ScreenGrabber:
+    """
+    Captures the desktop as raw BGRA frames with one persistent mss handle per thread.
+    """
+    def __init__(self, monitor_index=0):
+        self.monitor_index = monitor_index
+
+        # mss handles are bound to the thread that created them, so every
+        # capture thread gets its own grabber
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def _grabber(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = mss.mss()
+            with self._lock:
+                self._handles.append(sct)
+        return sct
+
+    def grab_raw(self):
+        """
+        Grabs the configured monitor and returns its size and raw BGRA buffer.
+        """
+        sct = self._grabber()
+        shot = sct.grab(sct.monitors[self.monitor_index])
+        return shot.size, shot.raw
+
+    def grab(self):
+        """
+        Grabs the configured monitor and returns it as an RGB image.
+        """
+        return bgra_to_image(*self.grab_raw())
+
+    def close(self):
+        with self._lock:
+            handles, self._handles = self._handles, []
+        for sct in handles:
+            sct.close()
+
+
+class CameraReader:
+    """
+    Drains a camera on a background thread into a single-slot latest-frame buffer.
+
+    OpenCV queues frames inside the capture backend, so an occasional
+    cap.read() returns a frame that may be several frames old. The reader
+    keeps reading at the device rate and read() hands out only the newest
+    frame. It mirrors the read()/release() interface of cv2.VideoCapture.
+    """
+    def __init__(
+        self,
+        device=0,
+        width=CAMERA_WIDTH,
+        height=CAMERA_HEIGHT,
+        fps=CAMERA_FPS,
+        timeout=CAMERA_TIMEOUT,
+        capture_factory=cv2.VideoCapture,
+    ):
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.timeout = timeout
+        self.capture_factory = capture_factory
+
+        # (width, height, fps) the device actually agreed to
+        self.negotiated = None
+
+        self._cap = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_at = 0.0
+        self._seq = 0
+        self._taken_seq = 0
+        self._running = False
+
+        self.frames_read = 0
+        self.frames_served = 0
+        self.total_age = 0.0
+
+    def start(self):
+        """
+        Opens the device, negotiates the capture format and starts the reader thread.
+        """
+        cap = self._cap = self.capture_factory(self.device)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+        # Backends that honour it keep just one frame queued
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.negotiated = (
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            cap.get(cv2.CAP_PROP_FPS),
+        )
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="camera-reader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                ret, frame = self._cap.read()
+                if not ret:
+                    break
+                with self._cond:
+                    self._frame = frame
+                    self._frame_at = time.monotonic()
+                    self._seq += 1
+                    self.frames_read += 1
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
+
+    def read(self):
+        """
+        Waits for a frame newer than the last one returned and returns (ret, frame).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > self._taken_seq or not self._running, self.timeout)
+            if self._seq <= self._taken_seq:
+                return False, None
+            self._taken_seq = self._seq
+            self.frames_served += 1
+            self.total_age += time.monotonic() - self._frame_at
+            return True, self._frame
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout)
+        if self._cap is not None:
+            self._cap.release()
+
+    def stats(self):
+        return {
+            "negotiated": self.negotiated,
+            "frames_read": self.frames_read,
+            "frames_served": self.frames_served,
+            "frames_skipped": self.frames_read - self.frames_served,
+            "mean_age_ms": self.total_age / self.frames_served * 1000 if self.frames_served else 0.0,
+        }
+
+
+class FrameEncoder:
+    """
+    Downscales frames to the model's pixel budget and encodes them to base64
+    JPEG through a reused per-thread buffer.
+    """
+    def __init__(self, max_pixels=None, quality=JPEG_QUALITY):
+        self.max_pixels = max_pixels
+        self.quality = quality
+        self._local = threading.local()
+
+    def _buffer(self):
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = io.BytesIO()
+        return buffer
+
+    def encode(self, img):
+        if self.max_pixels:
+            img = fit_pixels(img, self.max_pixels)
+        return encode_image(img, self._buffer(), self.quality)
+
+    def chunk(self, img):
+        """
+        Encodes an image as a realtime media chunk.
+        """
+        return media_chunk(self.encode(img))
+
+
+class ProcessFrameEncoder:
+    """
+    Encodes raw frames in a process pool so JPEG and base64 work does not
+    compete for the GIL with the audio loop and tool calls.
+
+    Frames are copied once into a shared memory slot instead of being pickled,
+    and each worker returns the encoded JPEG together with the dedup
+    fingerprint. Futures are handed out in submission order, so awaiting them
+    FIFO keeps frames in capture order.
+    """
+    def __init__(self, workers=2, max_pixels=None, quality=JPEG_QUALITY, slots=None, grid=DEDUP_GRID):
+        self.workers = workers
+        self.max_pixels = max_pixels
+        self.quality = quality
+        self.grid = grid
+
+        self._executor = None
+        self._slots = [None] * (slots or workers * 2)
+        self._free = queue.Queue()
+        for index in range(len(self._slots)):
+            self._free.put(index)
+        self._closed = False
+
+    @property
+    def depth(self):
+        """Number of shared memory slots, i.e. frames that can be in flight."""
+        return len(self._slots)
+
+    def _slot(self, index, nbytes):
+        slot = self._slots[index]
+        if slot is None or slot.size < nbytes:
+            if slot is not None:
+                slot.close()
+                slot.unlink()
+            slot = self._slots[index] = shared_memory.SharedMemory(create=True, size=nbytes)
+        return slot
+
+    def submit(self, size, raw, rawmode="BGRX"):
+        """
+        Copies a raw frame into a free slot and starts encoding it.
+        Blocks while every slot is in flight.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        view = memoryview(raw).cast("B")
+        index = self._free.get()
+        slot = self._slot(index, view.nbytes)
+        slot.buf[:view.nbytes] = view
+
+        future = self._executor.submit(
+            _encode_shared, slot.name, size, rawmode, view.nbytes, self.max_pixels, self.quality, self.grid
+        )
+        future.add_done_callback(lambda _: self._free.put(index))
+        return future
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        for slot in self._slots:
+            if slot is not None:
+                slot.close()
+                slot.unlink()
+
+
+def _attach_shared(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached segments with the resource tracker,
+        # which then unlinks or double-counts the parent's slot
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _encode_shared(name, size, rawmode, nbytes, max_pixels, quality, grid):
+    """
+    Process pool worker: decodes a raw frame from shared memory and returns
+    its dedup fingerprint and base64 JPEG.
+    """
+    shm = _attach_shared(name)
+    try:
+        with shm.buf[:nbytes] as view:
+            img = PIL.Image.frombytes("RGB", size, view, "raw", rawmode)
+    finally:
+        shm.close()
+
+    fingerprint = img.resize(grid, PIL.Image.BOX).convert("L").tobytes()
+    if max_pixels:
+        img = fit_pixels(img, max_pixels)
+    return fingerprint, encode_image(img, io.BytesIO(), quality)
+
+
+def pixel_budget(media_resolution):
+    """
+    Returns the number of pixels worth sending for a LiveConnectConfig media_resolution.
+    """
+    name = getattr(media_resolution, "value", media_resolution) or "MEDIA_RESOLUTION_UNSPECIFIED"
+    return MEDIA_RESOLUTION_PIXELS.get(name, MEDIA_RESOLUTION_PIXELS["MEDIA_RESOLUTION_UNSPECIFIED"])
+
+
+def fit_pixels(img, max_pixels):
+    """
+    Scales an image down with an area filter so it has at most max_pixels pixels.
+    """
+    width, height = img.size
+    if width * height <= max_pixels:
+        return img
+    scale = (max_pixels / (width * height)) ** 0.5
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    # An integer reduce does most of the averaging far cheaper than a box
+    # resize of the full frame; the box pass then only trims the remainder
+    factor = int(1 / scale)
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != size:
+        img = img.resize(size, PIL.Image.BOX)
+    return img
+
+
+def bgra_to_image(size, bgra):
+    """
+    Wraps a raw BGRA framebuffer as an RGB image without a codec pass.
+    """
+    return PIL.Image.frombuffer("RGB", size, bgra, "raw", "BGRX", 0, 1)
+
+
+def media_chunk(data):
+    return {"mime_type": "image/jpeg", "data": data}
+
+
+def encode_image(img, buffer, quality=JPEG_QUALITY):
+    """
+    Encodes a PIL image as JPEG into a reusable BytesIO and returns base64 text.
+    """
+    buffer.seek(0)
+    buffer.truncate()
+    img.save(buffer, format="jpeg", quality=quality)
+    with buffer.getbuffer() as view:
+        return base64.b64encode(view).decode()
+
+
+class FrameDeduplicator:
+    """
+    Drops frames that look the same as the last frame that was sent.
+
+    Frames are compared by a small greyscale fingerprint, so the check costs a
+    single box downsample and no JPEG encode for suppressed frames.
+    """
+    def __init__(
+        self,
+        grid=DEDUP_GRID,
+        tolerance=DEDUP_TOLERANCE,
+        min_changed=DEDUP_MIN_CHANGED,
+        keepalive_interval=KEEPALIVE_INTERVAL,
+    ):
+        self.grid = grid
+        self.tolerance = tolerance
+        self.min_changed = min_changed
+        self.keepalive_interval = keepalive_interval
+
+        self.last_fingerprint = None
+        self.last_sent_at = None
+        # Fraction of fingerprint cells that changed in the last checked frame
+        self.change_ratio = 1.0
+
+        self.sent = 0
+        self.suppressed = 0
+        self.keepalives = 0
+
+    def fingerprint(self, img):
+        return img.resize(self.grid, PIL.Image.BOX).convert("L")
+
+    def fingerprint_from_bytes(self, data):
+        """
+        Rebuilds a fingerprint computed elsewhere, e.g. by a ProcessFrameEncoder worker.
+        """
+        return PIL.Image.frombytes("L", self.grid, data)
+
+    def compare(self, fingerprint):
+        """
+        Returns the fraction of cells that differ from the last sent fingerprint.
+        """
+        if self.last_fingerprint is None or self.last_fingerprint.size != fingerprint.size:
+            return 1.0
+        histogram = PIL.ImageChops.difference(fingerprint, self.last_fingerprint).histogram()
+        changed = sum(histogram[self.tolerance + 1:])
+        return changed / (fingerprint.width * fingerprint.height)
+
+    def observe(self, img):
+        """
+        Measures how much a frame changed from the previous observed frame,
+        without deciding whether to send it.
+        """
+        return self.observe_fingerprint(self.fingerprint(img))
+
+    def observe_fingerprint(self, fingerprint):
+        self.change_ratio = self.compare(fingerprint)
+        self.last_fingerprint = fingerprint
+        return self.change_ratio
+
+    def should_send(self, img, now=None):
+        """
+        Decides whether a captured frame is worth sending and updates the counters.
+        """
+        return self.should_send_fingerprint(self.fingerprint(img), now)
+
+    def should_send_fingerprint(self, fingerprint, now=None):
+        now = time.monotonic() if now is None else now
+        self.change_ratio = self.compare(fingerprint)
+
+        changed = self.change_ratio > self.min_changed
+        keepalive = self.last_sent_at is not None and now - self.last_sent_at >= self.keepalive_interval
+        if not (changed or keepalive):
+            self.suppressed += 1
+            return False
+
+        if not changed:
+            self.keepalives += 1
+        self.sent += 1
+        self.last_sent_at = now
+        self.last_fingerprint = fingerprint
+        return True
+
+    def stats(self):
+        total = self.sent + self.suppressed
+        return {
+            "sent": self.sent,
+            "suppressed": self.suppressed,
+            "keepalives": self.keepalives,
+            "suppressed_ratio": self.suppressed / total if total else 0.0,
+        }
+
+
+class DirtyRegionTracker:
+    """
+    Updates only the tiles that changed since the last frame sent, with a
+    periodic full frame so the model keeps global context.
+
+    Every frame returned has the full screen's geometry: the last frame sent
+    is kept downscaled to max_pixels, and the changed region is scaled and
+    pasted into it. Positions in any frame therefore map to screen
+    coordinates the same way, and only the region is resized from the
+    full-resolution capture.
+    """
+    def __init__(
+        self,
+        tile_size=TILE_SIZE,
+        tolerance=TILE_TOLERANCE,
+        full_frame_interval=FULL_FRAME_INTERVAL,
+        full_frame_area=FULL_FRAME_AREA,
+        max_pixels=REGION_MAX_PIXELS,
+        reduce=TILE_DIFF_REDUCE,
+    ):
+        self.tile_size = tile_size
+        self.tolerance = tolerance
+        self.full_frame_interval = full_frame_interval
+        self.full_frame_area = full_frame_area
+        self.max_pixels = max_pixels or REGION_MAX_PIXELS
+        self.reduce = reduce
+        self._threshold = [0] * (tolerance + 1) + [255] * (255 - tolerance)
+
+        self.reference = None
+        self.last_full_at = None
+        # (left, top, right, bottom) of the last frame sent, in screen pixels
+        self.last_region = None
+        # The last frame sent, at the resolution frames are sent at
+        self.canvas = None
+
+        self.full_frames = 0
+        self.region_frames = 0
+
+    def grey(self, img):
+        """
+        The reduced greyscale copy of a frame that changes are searched on.
+        """
+        grey = img.convert("L")
+        return grey.reduce(self.reduce) if self.reduce > 1 else grey
+
+    def changed_box(self, grey, size):
+        """
+        Returns the tile-aligned bounding box, in pixels of a frame of the
+        given size, of what differs from the reference frame, or None when
+        nothing changed.
+        """
+        diff = PIL.ImageChops.difference(grey, self.reference)
+        bbox = diff.point(self._threshold).getbbox()
+        if bbox is None:
+            return None
+
+        t = self.tile_size
+        width, height = size
+        left, top, right, bottom = (edge * self.reduce for edge in bbox)
+        return (
+            left // t * t,
+            top // t * t,
+            min(width, -(-right // t) * t),
+            min(height, -(-bottom // t) * t),
+        )
+
+    def select(self, img, now=None):
+        """
+        Returns the frame to send, at most max_pixels: either the whole frame
+        downscaled, or the previous one with the changed region pasted in.
+        """
+        now = time.monotonic() if now is None else now
+        grey = self.grey(img)
+        width, height = img.size
+
+        box = None
+        if (
+            self.reference is not None
+            and self.reference.size == grey.size
+            and now - self.last_full_at < self.full_frame_interval
+        ):
+            box = self.changed_box(grey, img.size)
+            if box is not None:
+                area = (box[2] - box[0]) * (box[3] - box[1])
+                if area > self.full_frame_area * width * height:
+                    box = None
+        self.reference = grey
+
+        if box is None:
+            self.last_full_at = now
+            self.last_region = (0, 0, width, height)
+            self.full_frames += 1
+            self.canvas = fit_pixels(img, self.max_pixels)
+            return self.canvas.copy()
+
+        self.last_region = box
+        self.region_frames += 1
+        scale_x = self.canvas.width / width
+        scale_y = self.canvas.height / height
+        left, top = int(box[0] * scale_x), int(box[1] * scale_y)
+        size = (
+            max(1, round(box[2] * scale_x) - left),
+            max(1, round(box[3] * scale_y) - top),
+        )
+        region = img.crop(box)
+        if region.size != size:
+            region = region.resize(size, PIL.Image.BOX)
+        self.canvas.paste(region, (left, top))
+        return self.canvas.copy()
+
+    def stats(self):
+        return {"full_frames": self.full_frames, "region_frames": self.region_frames}
+
+
+class FrameRateScheduler:
+    """
+    Picks the capture interval from recent screen motion, video queue fill
+    and upload latency.
+
+    The rate jumps to max_fps as soon as the picture moves, decays towards
+    IDLE_FPS while it is still, and is cut whenever the uplink cannot keep up,
+    down to MIN_FPS. Captures that dedup drops cost only a fingerprint, so
+    idling at 1 fps is cheap.
+    """
+    def __init__(
+        self,
+        idle_fps=IDLE_FPS,
+        max_fps=MAX_FPS,
+        min_fps=MIN_FPS,
+        motion_threshold=MOTION_THRESHOLD,
+        send_budget=SEND_BUDGET,
+        decay=0.8,
+        history=120,
+    ):
+        self.idle_fps = idle_fps
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.motion_threshold = motion_threshold
+        self.send_budget = send_budget
+        self.decay = decay
+
+        self.fps = 1.0
+        self.send_latency = 0.0
+        # Recent decisions, newest last, for tuning
+        self.decisions = deque(maxlen=history)
+
+    @property
+    def interval(self):
+        return 1.0 / self.fps
+
+    def record_send(self, seconds):
+        """
+        Folds the duration of one send_realtime_input call into a moving average.
+        """
+        self.send_latency = seconds if not self.send_latency else 0.7 * self.send_latency + 0.3 * seconds
+
+    def update(self, change_ratio, queue_fill, now=None):
+        """
+        Updates the rate from the latest frame and returns the next capture interval.
+        """
+        now = time.monotonic() if now is None else now
+        if queue_fill >= 1.0:
+            fps, reason = self.fps / 2, "backpressure"
+        elif self.send_latency * self.fps > self.send_budget:
+            fps, reason = self.send_budget / self.send_latency, "send latency"
+        elif change_ratio > self.motion_threshold:
+            fps, reason = self.max_fps, "motion"
+            if self.send_latency:
+                fps = min(fps, self.send_budget / self.send_latency)
+        else:
+            fps, reason = self.fps * self.decay, "idle"
+
+        # Only a slow uplink may push the rate below the idle rate
+        floor = self.idle_fps if reason == "idle" else self.min_fps
+        self.fps = min(self.max_fps, max(floor, fps))
+        self.decisions.append({
+            "time": now,
+            "change_ratio": change_ratio,
+            "queue_fill": queue_fill,
+            "send_latency": self.send_latency,
+            "fps": self.fps,
+            "reason": reason,
+        })
+        return self.interval
+
+    def stats(self):
+        last = self.decisions[-1] if self.decisions else None
+        return {"fps": self.fps, "send_latency": self.send_latency, "last_decision": last}
@@ -0,0 +1,379 @@
+"""
+Concurrent execution of the model's function calls.
+"""
+import os
+import json
+import time
+import asyncio
+import inspect
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from google.genai import types
+
+# Once the first result of a tool call is ready, the others that finish
+# within this many seconds go back in the same response; slower ones follow
+# on their own. 0 sends every result as soon as it is ready.
+TOOL_BATCH_DEADLINE = 0.25
+TOOL_HISTORY = 200            # recent durations kept for percentiles
+
+# Execution classes: name -> (workers, queue limit). Each gets its own
+# thread pool, separate from asyncio's default executor that the audio
+# loop's thread hops use. Desktop input and the shared browser are driven
+# one call at a time; network calls run side by side.
+EXECUTION_CLASSES = {
+    "hid": (1, 8),
+    "browser": (1, 8),
+    "io": (8, 32),
+    "cpu": (os.cpu_count() or 2, 16),
+}
+DEFAULT_EXECUTION_CLASS = "io"
+
+# Result cache limits, across all tools
+TOOL_CACHE_ENTRIES = 256
+TOOL_CACHE_BYTES = 4 * 1024 * 1024
+
+
+class ToolExecutor:
+    """
+    Bounded thread pool for one execution class, with queue depth and
+    queueing delay counters. Calls beyond the queue limit are refused
+    rather than left waiting behind a stuck tool.
+    """
+    def __init__(self, name, workers, queue_limit):
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"tool-{name}")
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.active = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.refused = 0
+        self.waits = deque(maxlen=TOOL_HISTORY)
+        self.run_times = deque(maxlen=TOOL_HISTORY)
+
+    def _call(self, submitted, func, kwargs):
+        started = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.waits.append(started - submitted)
+        try:
+            return func(**kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.run_times.append(time.monotonic() - started)
+
+    def _done(self, future):
+        # Cancelled before a worker picked it up
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    async def run(self, func, **kwargs):
+        with self._lock:
+            if self.queued >= self.queue_limit:
+                self.refused += 1
+                raise RuntimeError(f"Too many {self.name} tool calls waiting ({self.queued}); try again later")
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        future = self.pool.submit(self._call, time.monotonic(), func, kwargs)
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self.waits)
+            run_times = sorted(self.run_times)
+
+        def percentile(values, pct):
+            return values[min(len(values) - 1, int(len(values) * pct))] * 1000 if values else 0.0
+
+        return {
+            "workers": self.workers,
+            "completed": self.completed,
+            "refused": self.refused,
+            "queued": self.queued,
+            "active": self.active,
+            "max_queued": self.max_queued,
+            "wait_p50_ms": percentile(waits, 0.5),
+            "wait_p95_ms": percentile(waits, 0.95),
+            "wait_max_ms": waits[-1] * 1000 if waits else 0.0,
+            "run_p50_ms": percentile(run_times, 0.5),
+            "run_p95_ms": percentile(run_times, 0.95),
+        }
+
+
+class ToolCache:
+    """
+    TTL cache of tool results with single-flight coalescing.
+
+    Only tools listed in ttls (name -> seconds) are cached. Arguments are
+    bound to the function's signature with defaults applied, and strings are
+    trimmed and case-folded, so get_weather(city="Paris ") and
+    get_weather(city="paris") share an entry. A call identical to one still
+    running waits for that one instead of going out again. Results that
+    report an error are never stored. Entries are evicted least recently
+    used first once there are more than max_entries or max_bytes of them.
+    """
+    def __init__(self, ttls, max_entries=TOOL_CACHE_ENTRIES, max_bytes=TOOL_CACHE_BYTES):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires, size, result), least recently used first
+        self.entries = OrderedDict()
+        self.bytes = 0
+        # key -> task of the call in flight
+        self.inflight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evicted = 0
+        self.per_tool = {}
+
+    def key(self, name, func, args):
+        try:
+            bound = inspect.signature(func).bind(**args)
+            bound.apply_defaults()
+            args = bound.arguments
+        except (TypeError, ValueError):
+            # Bad arguments fail in the call itself; key them as given
+            pass
+        normalized = {
+            arg: value.strip().casefold() if isinstance(value, str) else value
+            for arg, value in args.items()
+        }
+        return name, json.dumps(normalized, sort_keys=True, default=str)
+
+    def _count(self, name, outcome):
+        counts = self.per_tool.setdefault(name, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+    def _store(self, key, result):
+        if isinstance(result, dict) and "error" in result:
+            return
+        if isinstance(result, str) and result.startswith("Error"):
+            return
+        size = len(json.dumps(result, default=str)) if isinstance(result, dict) else len(str(result))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (time.monotonic() + self.ttls[key[0]], size, result)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, size, _) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evicted += 1
+
+    async def call(self, name, func, args, run):
+        """
+        Returns the result of func(**args), from the cache if possible.
+        run() makes the actual call and returns an awaitable.
+        """
+        if name not in self.ttls:
+            return await run()
+        key = self.key(name, func, args)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self._count(name, "hits")
+                return entry[2]
+            del self.entries[key]
+            self.bytes -= entry[1]
+            self.expired += 1
+        task = self.inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            self.hits += 1
+            self._count(name, "hits")
+        else:
+            self.misses += 1
+            self._count(name, "misses")
+            task = asyncio.ensure_future(run())
+            self.inflight[key] = task
+
+            def finished(task):
+                self.inflight.pop(key, None)
+                if not task.cancelled() and task.exception() is None:
+                    self._store(key, task.result())
+
+            task.add_done_callback(finished)
+        # Shielded so a caller that gets cancelled leaves the call running
+        # for everyone else waiting on it
+        return await asyncio.shield(task)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "per_tool": self.per_tool,
+        }
+
+
+class ToolDispatcher:
+    """
+    Runs function calls as independent tasks so the receive loop never waits
+    on a tool.
+
+    dispatch() returns at once. Every call of a tool_call runs in the thread
+    pool of its function's execution class (classes maps function names to
+    EXECUTION_CLASSES keys; unlisted ones are DEFAULT_EXECUTION_CLASS), and
+    results are handed to send (a plain callable taking a list of
+    FunctionResponse) as they complete, batched within batch_deadline. With
+    a ToolCache, repeated calls are answered from it. Calls the server
+    cancels are abandoned: a thread cannot be interrupted, but its result is
+    never sent.
+    """
+    def __init__(
+        self,
+        functions,
+        send,
+        batch_deadline=TOOL_BATCH_DEADLINE,
+        classes=None,
+        execution_classes=EXECUTION_CLASSES,
+        cache=None,
+    ):
+        self.functions = functions
+        self.cache = cache
+        self.classes = classes or {}
+        self.executors = {
+            name: ToolExecutor(name, workers, queue_limit)
+            for name, (workers, queue_limit) in execution_classes.items()
+        }
+        self.send = send
+        self.batch_deadline = batch_deadline
+        # Running call tasks by function call id
+        self.running = {}
+        self._handlers = set()
+
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.responses = 0
+        self.max_concurrent = 0
+        self.durations = deque(maxlen=TOOL_HISTORY)
+
+    def dispatch(self, function_calls):
+        """
+        Starts every call of one tool_call message without waiting for any.
+        """
+        tasks = []
+        for function_call in function_calls:
+            print(f"\n[Tool Call] {function_call.name}({function_call.args})")
+            task = asyncio.create_task(self._execute(function_call))
+            self.running[function_call.id] = task
+            tasks.append(task)
+        self.calls += len(tasks)
+        self.max_concurrent = max(self.max_concurrent, len(self.running))
+        handler = asyncio.create_task(self._respond(tasks))
+        self._handlers.add(handler)
+        handler.add_done_callback(self._handlers.discard)
+
+    def cancel(self, ids):
+        """
+        Abandons the calls the server no longer wants answered.
+        """
+        for id in ids:
+            task = self.running.pop(id, None)
+            if task is not None:
+                print(f"\n[Tool Call] Cancelled {id}")
+                task.cancel()
+                self.cancelled += 1
+
+    async def _execute(self, function_call):
+        func_name = function_call.name
+        func = self.functions.get(func_name)
+        started = time.monotonic()
+        try:
+            if func is None:
+                # Handle cases where the model hallucinates a non-existent tool
+                print(f"[Tool Error] Unknown function: {func_name}")
+                self.errors += 1
+                return types.FunctionResponse(
+                    id=function_call.id, name=func_name, response={"error": f"Unknown function: {func_name}"}
+                )
+            executor = self.executors[self.classes.get(func_name, DEFAULT_EXECUTION_CLASS)]
+            try:
+                # Run the function in its class's threads to avoid blocking the asyncio loop
+                args = function_call.args or {}
+                if self.cache is not None:
+                    result = await self.cache.call(func_name, func, args, lambda: executor.run(func, **args))
+                else:
+                    result = await executor.run(func, **args)
+            except Exception as e:
+                # Catch any errors during execution and report back to the model
+                print(f"[Tool Error] {e}")
+                self.errors += 1
+                return types.FunctionResponse(id=function_call.id, name=func_name, response={"error": str(e)})
+            print(f"[Tool Result] {result}")
+            return types.FunctionResponse(
+                id=function_call.id,
+                name=func_name,
+                response={"result": json.dumps(result) if isinstance(result, dict) else str(result)},
+            )
+        finally:
+            self.durations.append(time.monotonic() - started)
+            self.running.pop(function_call.id, None)
+
+    async def _respond(self, tasks):
+        """
+        Sends the results of one tool_call as they complete.
+        """
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if pending and self.batch_deadline:
+                finished, pending = await asyncio.wait(pending, timeout=self.batch_deadline)
+                done |= finished
+            responses = [task.result() for task in tasks if task in done and not task.cancelled()]
+            if responses:
+                self.send(responses)
+                self.responses += 1
+
+    def close(self):
+        """
+        Abandons everything still running.
+        """
+        for task in list(self.running.values()) + list(self._handlers):
+            task.cancel()
+        self.running.clear()
+        for executor in self.executors.values():
+            executor.close()
+
+    def stats(self):
+        durations = sorted(self.durations)
+
+        def percentile(pct):
+            return durations[min(len(durations) - 1, int(len(durations) * pct))] * 1000 if durations else 0.0
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "responses_sent": self.responses,
+            "running": len(self.running),
+            "max_concurrent": self.max_concurrent,
+            "duration_p50_ms": percentile(0.5),
+            "duration_p95_ms": percentile(0.95),
+        }
@@ -0,0 +1,151 @@
+"""
+Incremental RSS/Atom feed store: concurrent conditional fetches and a
+deduplicated, timestamped entry cache per feed.
+"""
+import time
+import calendar
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import feedparser
+
+FEED_DEADLINE = 5.0           # seconds a refresh waits for each feed
+FEED_TIMEOUT = 30.0           # seconds a fetch may take in the background
+FEED_MAX_ENTRIES = 200        # newest entries kept per feed
+
+
+def entry_timestamp(entry):
+    """
+    Seconds since the epoch of an entry's published (or updated) date, or
+    None if it has neither. feedparser normalizes both to UTC.
+    """
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    return calendar.timegm(parsed) if parsed else None
+
+
+class Feed:
+    """
+    One source: its validators from the last fetch and the entries seen so
+    far, keyed by GUID.
+    """
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.etag = None
+        self.modified = None
+        self.entries = {}
+        self.pending = None
+
+        self.fetches = 0
+        self.not_modified = 0
+        self.new_entries = 0
+        self.bytes = 0
+        self.errors = 0
+        self.last_error = None
+        self.fetched_at = None
+
+
+class FeedStore:
+    """
+    Keeps feeds up to date with as little work as possible.
+
+    refresh() fetches the requested feeds in parallel, sending the ETag and
+    Last-Modified of the previous response so unchanged feeds cost a 304 and
+    no parsing. Of a changed feed only entries with a GUID not seen before
+    are converted and stored. A feed that misses the deadline is served from
+    what is already stored; its fetch finishes in the background.
+
+    get is a requests-style GET function (url, headers=..., timeout=...).
+    """
+    def __init__(self, sources, get, deadline=FEED_DEADLINE, timeout=FEED_TIMEOUT, max_entries=FEED_MAX_ENTRIES):
+        self.feeds = {key: Feed(source["name"], source["url"]) for key, source in sources.items()}
+        self.get = get
+        self.deadline = deadline
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=len(self.feeds) or 1, thread_name_prefix="feed")
+
+    def _fetch(self, feed):
+        headers = {}
+        if feed.etag:
+            headers["If-None-Match"] = feed.etag
+        if feed.modified:
+            headers["If-Modified-Since"] = feed.modified
+        try:
+            response = self.get(feed.url, headers=headers, timeout=self.timeout)
+            feed.fetches += 1
+            if response.status_code == 304:
+                feed.not_modified += 1
+                feed.fetched_at = time.time()
+                return 0
+            response.raise_for_status()
+            feed.bytes += len(response.content)
+            parsed = feedparser.parse(response.content)
+        except Exception as e:
+            feed.errors += 1
+            feed.last_error = str(e)
+            return 0
+
+        added = {}
+        for entry in parsed.entries:
+            guid = entry.get("id") or entry.get("link") or entry.get("title")
+            if not guid or guid in feed.entries or guid in added:
+                continue
+            added[guid] = {
+                "guid": guid,
+                "title": entry.get("title", ""),
+                "summary": entry.get("summary", "")[:200],
+                "link": entry.get("link", ""),
+                "published": entry.get("published", entry.get("updated", "")),
+                "timestamp": entry_timestamp(entry),
+            }
+        with self._lock:
+            feed.entries.update(added)
+            if len(feed.entries) > self.max_entries:
+                newest = sorted(feed.entries.values(), key=lambda item: item["timestamp"] or 0, reverse=True)
+                feed.entries = {item["guid"]: item for item in newest[:self.max_entries]}
+            feed.etag = response.headers.get("ETag")
+            feed.modified = response.headers.get("Last-Modified")
+            feed.fetched_at = time.time()
+            feed.new_entries += len(added)
+        return len(added)
+
+    def refresh(self, keys):
+        """
+        Fetches the given feeds concurrently, waiting at most the deadline.
+        Returns the keys of feeds still being fetched.
+        """
+        futures = {}
+        for key in keys:
+            feed = self.feeds[key]
+            # A fetch still running from an earlier refresh is waited on, not repeated
+            if feed.pending is None or feed.pending.done():
+                feed.pending = self._pool.submit(self._fetch, feed)
+            futures[feed.pending] = key
+        _, late = wait(futures, timeout=self.deadline)
+        return [futures[future] for future in late]
+
+    def entries(self, key, since=None):
+        """
+        Stored entries of one feed, newest first; undated entries last.
+        """
+        with self._lock:
+            items = list(self.feeds[key].entries.values())
+        if since is not None:
+            items = [item for item in items if item["timestamp"] is None or item["timestamp"] >= since]
+        items.sort(key=lambda item: item["timestamp"] or 0, reverse=True)
+        return items
+
+    def stats(self):
+        return {
+            key: {
+                "fetches": feed.fetches,
+                "not_modified": feed.not_modified,
+                "new_entries": feed.new_entries,
+                "stored": len(feed.entries),
+                "bytes": feed.bytes,
+                "errors": feed.errors,
+            }
+            for key, feed in self.feeds.items()
+        }
@@ -0,0 +1,345 @@
+"""
+File name index for search_files.
+
+Walks a tree once with a pool of os.scandir workers and keeps every name on
+disk, grouped by directory with the directory's mtime. Refreshing only
+re-lists directories whose mtime changed, since adding, removing or renaming
+an entry is exactly what bumps it; unchanged directories cost one stat.
+Queries run over one newline-joined, lower-cased string of all names, so a
+substring or glob search is a C-level scan instead of a tree walk.
+"""
+import os
+import re
+import gzip
+import json
+import time
+import bisect
+import fnmatch
+import hashlib
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+FILE_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gemini-desktop-agent", "file-index")
+FILE_INDEX_WORKERS = 8
+FILE_INDEX_MAX_AGE = 60.0     # seconds before a search triggers a background refresh
+FILE_SEARCH_LIMIT = 20
+
+
+def is_glob(query):
+    return any(char in query for char in "*?[")
+
+
+def index_file(root, index_dir=FILE_INDEX_DIR):
+    """
+    Where the index of root is saved.
+    """
+    digest = hashlib.sha1(root.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    return os.path.join(index_dir, digest + ".json.gz")
+
+
+def _line_pattern(query):
+    """
+    Regex matching whole lines of a newline-joined blob against a glob.
+    Unlike fnmatch.translate, wildcards never match across a newline.
+    """
+    parts = []
+    i = 0
+    while i < len(query):
+        char = query[i]
+        i += 1
+        if char == "*":
+            parts.append("[^\n]*")
+        elif char == "?":
+            parts.append("[^\n]")
+        elif char == "[":
+            # A ] right after [ or [! is part of the set
+            start = i + 1 if query[i:i + 1] in ("!", "^") else i
+            end = query.find("]", start + 1)
+            if end < 0:
+                parts.append(re.escape(char))
+                continue
+            body = query[i:end].replace("\\", "\\\\")
+            if body[0] in "!^":
+                body = "^\n" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(char))
+    return re.compile("(?m)^" + "".join(parts) + "$")
+
+
+def _matcher(query):
+    """
+    Returns a function name -> bool: case-insensitive glob or substring.
+    """
+    query = query.casefold()
+    if is_glob(query):
+        pattern = re.compile(fnmatch.translate(query))
+        return lambda name: pattern.match(name.casefold()) is not None
+    return lambda name: query in name.casefold()
+
+
+def _under(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def stream_search(query, path, limit=FILE_SEARCH_LIMIT):
+    """
+    Searches without an index: walks the tree and stops as soon as limit
+    matches are found. Hidden entries are skipped, as glob does.
+    """
+    matches = _matcher(query)
+    results = []
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if matches(entry.name):
+                        results.append(entry.path)
+                        if len(results) >= limit:
+                            return results
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError:
+            continue
+    return results
+
+
+class FileIndex:
+    """
+    Name index of one directory tree.
+
+    dirs maps each directory, relative to root, to (mtime_ns, files,
+    subdirs). build() walks everything, refresh() walks again reusing the
+    listing of every directory whose mtime is unchanged; both save the
+    index to path.
+    """
+    def __init__(self, root, path=None, workers=FILE_INDEX_WORKERS):
+        self.root = os.path.abspath(root)
+        self.path = path or index_file(self.root)
+        self.workers = workers
+        self.dirs = {}
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._refreshing = None
+
+        self.scanned = 0
+        self.reused = 0
+        self.walk_seconds = 0.0
+        self._names = []
+        self._dir_of = array("I")
+        self._starts = array("Q")
+        self._dir_paths = []
+        self._blob = ""
+
+    def _scan(self, relative, previous):
+        directory = os.path.join(self.root, relative) if relative else self.root
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            if previous is not None and previous[0] == mtime:
+                return relative, previous, True
+            files, subdirs = [], []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError:
+            return relative, None, False
+        return relative, (mtime, files, subdirs), False
+
+    def _walk(self, old):
+        started = time.monotonic()
+        dirs = {}
+        scanned = reused = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="file-index") as pool:
+            pending = {pool.submit(self._scan, "", old.get(""))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative, record, was_reused = future.result()
+                    if record is None:
+                        continue
+                    dirs[relative] = record
+                    reused += was_reused
+                    scanned += not was_reused
+                    for subdir in record[2]:
+                        child = os.path.join(relative, subdir) if relative else subdir
+                        pending.add(pool.submit(self._scan, child, old.get(child)))
+        changed = scanned or len(dirs) != len(old)
+        with self._lock:
+            self.dirs = dirs
+            self.built_at = time.time()
+            self.scanned, self.reused = scanned, reused
+            self.walk_seconds = time.monotonic() - started
+            if changed:
+                self._rebuild_search()
+        if not changed:
+            return
+        try:
+            self.save()
+        except OSError as e:
+            # Still usable from memory
+            print(f"[Files] Could not save the index of {self.root}: {e}")
+
+    def build(self):
+        self._walk({})
+        return self
+
+    def refresh(self):
+        self._walk(self.dirs)
+        return self
+
+    def refresh_in_background(self):
+        """
+        Starts a refresh unless one is already running.
+        """
+        with self._lock:
+            if self._refreshing is not None and self._refreshing.is_alive():
+                return
+            self._refreshing = threading.Thread(target=self.refresh, daemon=True)
+            self._refreshing.start()
+
+    def _rebuild_search(self):
+        names = []
+        dir_of = array("I")
+        dir_paths = []
+        for relative, (_, files, subdirs) in self.dirs.items():
+            dir_paths.append(os.path.join(self.root, relative) if relative else self.root)
+            names.extend(files)
+            names.extend(subdirs)
+            dir_of.extend([len(dir_paths) - 1] * (len(files) + len(subdirs)))
+        # Case folding can change lengths, so offsets are of the folded names
+        folded = [name.casefold() for name in names]
+        starts = array("Q")
+        offset = 0
+        for name in folded:
+            starts.append(offset)
+            offset += len(name) + 1
+        self._names = names
+        self._dir_of = dir_of
+        self._starts = starts
+        self._dir_paths = dir_paths
+        self._blob = "\n".join(folded)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {
+            "root": self.root,
+            "built_at": self.built_at,
+            "dirs": [[relative, mtime, files, subdirs] for relative, (mtime, files, subdirs) in self.dirs.items()],
+        }
+        temporary = self.path + ".tmp"
+        encoded = json.dumps(data, separators=(",", ":")).encode("utf-8", "surrogateescape")
+        with open(temporary, "wb") as file:
+            file.write(gzip.compress(encoded, compresslevel=1))
+        os.replace(temporary, self.path)
+
+    def load(self):
+        """
+        Reads the saved index. Returns False if there is none for this root.
+        """
+        try:
+            with open(self.path, "rb") as file:
+                data = json.loads(gzip.decompress(file.read()).decode("utf-8", "surrogateescape"))
+        except (OSError, ValueError):
+            return False
+        if data.get("root") != self.root:
+            return False
+        with self._lock:
+            self.dirs = {relative: (mtime, files, subdirs) for relative, mtime, files, subdirs in data["dirs"]}
+            self.built_at = data["built_at"]
+            self._rebuild_search()
+        return True
+
+    def _hits(self, query):
+        """
+        Yields indexes into _names whose name matches the query.
+        """
+        blob, starts = self._blob, self._starts
+        query = query.casefold()
+        if is_glob(query):
+            # Each name is one line of the blob
+            for match in _line_pattern(query).finditer(blob):
+                yield bisect.bisect_right(starts, match.start()) - 1
+            return
+        position = blob.find(query)
+        while position >= 0:
+            index = bisect.bisect_right(starts, position) - 1
+            yield index
+            # Continue after this name so it is reported once
+            next_start = starts[index + 1] if index + 1 < len(starts) else len(blob)
+            position = blob.find(query, next_start)
+
+    def search(self, query, path=None, limit=FILE_SEARCH_LIMIT):
+        """
+        Full paths of entries whose name contains query (or matches it, for
+        a glob), case-insensitively, optionally only under path.
+        """
+        if "\n" in query:
+            return []
+        path = os.path.abspath(path) if path else None
+        with self._lock:
+            results = []
+            for index in self._hits(query):
+                directory = self._dir_paths[self._dir_of[index]]
+                if path is not None and not _under(directory, path):
+                    continue
+                results.append(os.path.join(directory, self._names[index]))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def stats(self):
+        return {
+            "dirs": len(self.dirs),
+            "names": len(self._names),
+            "scanned": self.scanned,
+            "reused": self.reused,
+            "walk_ms": self.walk_seconds * 1000,
+        }
+
+
+class FileIndexes:
+    """
+    The indexes search_files has built, by root. A search under a root
+    with an index is answered from it (refreshed in the background once
+    it is older than max_age); anywhere else it streams the tree with early
+    exit and starts building an index for next time.
+    """
+    def __init__(self, max_age=FILE_INDEX_MAX_AGE, index_dir=FILE_INDEX_DIR):
+        self.max_age = max_age
+        self.index_dir = index_dir
+        self.indexes = {}
+        self._lock = threading.Lock()
+
+    def _find(self, path):
+        for root, index in self.indexes.items():
+            if _under(path, root):
+                return index
+        return None
+
+    def search(self, query, path, limit=FILE_SEARCH_LIMIT):
+        path = os.path.abspath(path)
+        with self._lock:
+            index = self._find(path)
+            if index is None:
+                index = FileIndex(path, index_file(path, self.index_dir))
+                self.indexes[path] = index
+                # Loads what an earlier run saved, then catches up with changes
+                # since; with nothing saved the refresh is a full build
+                index.load()
+                index.refresh_in_background()
+        if index is None or index.built_at is None:
+            return stream_search(query, path, limit)
+        if time.time() - index.built_at > self.max_age:
+            index.refresh_in_background()
+        return index.search(query, path, limit)
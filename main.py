@@ -1,22 +1,47 @@
 import os
 import asyncio
-import base64
-import io
 import traceback
 import json
 import sys
+import time
 import ctypes
 
 import cv2
 import pyaudio
 import PIL.Image
-import mss
 
 import argparse
 
 from google import genai
-from google.genai import types
-from tools import AVAILABLE_FUNCTIONS, tools_gemini
+from google.genai import types, errors
+from websockets.exceptions import WebSocketException, ConnectionClosed, InvalidStatus
+from tools import AVAILABLE_FUNCTIONS, TOOL_CLASSES, TOOL_CACHE_TTL, tools_gemini, http_stats
+from capture import (
+    ScreenGrabber,
+    CameraReader,
+    FrameEncoder,
+    FrameDeduplicator,
+    DirtyRegionTracker,
+    FrameRateScheduler,
+    ProcessFrameEncoder,
+    media_chunk,
+    pixel_budget,
+)
+from uplink import UplinkScheduler
+from mock_live import recording_connect
+from recorder import SessionRecorder
+from dispatch import ToolDispatcher, ToolCache, TOOL_BATCH_DEADLINE
+from audio import (
+    VoiceActivityGate,
+    DuplexPolicy,
+    Resampler,
+    native_format,
+    CallbackInput,
+    CallbackOutput,
+    PlaybackBuffer,
+    AUDIO_STREAM_END,
+    DUPLEX_MODES,
+)
 
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
@@ -28,11 +53,24 @@ MODEL = "models/gemini-2.5-flash-native-audio-preview-12-2025"
 
 DEFAULT_MODE = "screen"
 
-# Initialize Gemini Client
-client = genai.Client(
-    http_options={"api_version": "v1beta"},
-    api_key="Your API Key",
-)
+# Reconnect backoff, in seconds. The delay doubles after each failed attempt
+# and starts over once a connection succeeds.
+RECONNECT_INITIAL_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+RECONNECT_MAX_FAILURES = 10   # consecutive failed connects before giving up
+
+# Websocket close codes of connections worth re-establishing: going away,
+# abnormal closure, internal error, service restart, try again later.
+# Policy closes (1007, 1008), e.g. a bad API key, are final.
+TRANSIENT_CLOSE_CODES = (1001, 1006, 1011, 1012, 1013, 1014)
+
+# Initialize Gemini Client. Encoder workers started with spawn (the only
+# way on Windows) run this file again as __mp_main__; they need none of it.
+if __name__ != "__mp_main__":
+    client = genai.Client(
+        http_options={"api_version": "v1beta"},
+        api_key="Your API Key",
+    )
 
 # Load Tools
 tools = tools_gemini
@@ -53,6 +91,8 @@ CONFIG = types.LiveConnectConfig(
         trigger_tokens=32000,
         sliding_window=types.SlidingWindow(target_tokens=32000),
     ),
+    # The server sends handles that let a new connection resume this session
+    session_resumption=types.SessionResumptionConfig(),
     tools=tools,
     system_instruction=types.Content(
         parts=[types.Part.from_text(text="""
@@ -75,30 +115,136 @@ CONFIG = types.LiveConnectConfig(
     ),
 )
 
-# Initialize PyAudio
-pya = pyaudio.PyAudio()
+# Initialize PyAudio (not in encoder workers either)
+if __name__ != "__mp_main__":
+    pya = pyaudio.PyAudio()
+
+
+class ReconnectNow(Exception):
+    """
+    Raised when the server announces it is about to close the connection.
+    """
+
+
+# Connection failures the supervisor looks at; is_transient() decides
+# which of them a reconnect can fix
+CONNECTION_ERRORS = (OSError, WebSocketException, errors.APIError, ReconnectNow)
+
+
+def is_transient(error):
+    """
+    True for connection failures that may go away by reconnecting: network
+    errors, abnormal or server-side closes, 5xx responses and GoAway. Client
+    errors and policy closes are not retried.
+    """
+    if isinstance(error, (ReconnectNow, errors.ServerError)):
+        return True
+    if isinstance(error, errors.ClientError):
+        return False
+    if isinstance(error, errors.APIError):
+        # The SDK reports websocket closes as APIError with the close code
+        return error.code in TRANSIENT_CLOSE_CODES
+    if isinstance(error, ConnectionClosed):
+        return (error.rcvd.code if error.rcvd else 1006) in TRANSIENT_CLOSE_CODES
+    if isinstance(error, InvalidStatus):
+        return error.response.status_code >= 500
+    return isinstance(error, (OSError, WebSocketException))
 
 
 class AudioLoop:
     """
     Main class for handling audio and video streaming loop with Gemini Live API.
     """
-    def __init__(self, video_mode=DEFAULT_MODE):
+    def __init__(self, video_mode=DEFAULT_MODE, tile_diff=False, encode_workers=0, vad=True, audio_io="callback", duplex="full", device_format="native", connect=None, text_input=True, capture=None, tool_batch=TOOL_BATCH_DEADLINE, tool_cache=True):
         self.video_mode = video_mode
+        # Without text input (headless runs) the loop runs until cancelled
+        self.text_input = text_input
+        self.audio_io = audio_io
+        self.device_format = device_format
 
         # Processing queues
-        self.audio_in_queue = None
-        self.out_queue = None
-        self.video_queue = None
+        self.playback = None
+        # Everything sent upstream goes through one priority scheduler
+        self.uplink = UplinkScheduler()
+        # Function calls run concurrently, off the receive loop, each in the
+        # thread pool of its execution class; repeated lookups are cached
+        self.tools = ToolDispatcher(
+            AVAILABLE_FUNCTIONS,
+            lambda responses: self.uplink.put("tool", "send_tool_response", function_responses=responses),
+            batch_deadline=tool_batch,
+            classes=TOOL_CLASSES,
+            cache=ToolCache(TOOL_CACHE_TTL) if tool_cache else None,
+        )
+        self.encoded_frames = None
         self.is_playing = False
 
         self.session = None
+        # Stand-in for client.aio.live.connect, e.g. a local fake server
+        self.connect = connect or client.aio.live.connect
+        self.resumption_handle = None
+        self.reconnects = 0
+        # Optional capture file of everything sent and received
+        self.capture = SessionRecorder(capture) if capture else None
+        if self.capture is not None:
+            self.uplink.tap = self._capture_uplink
+        self.mic = None
+        self.audio_stream = None
+        self.speaker = None
+        # Devices run at their own rates; these convert to and from the API's
+        self.mic_resampler = None
+        self.speaker_resampler = None
+        self.speaker_rate = RECEIVE_SAMPLE_RATE
+        self.speaker_channels = CHANNELS
+        self.screen_grabber = ScreenGrabber()
+        # Frames are downscaled to what the configured media_resolution consumes
+        self.frame_encoder = FrameEncoder(max_pixels=pixel_budget(CONFIG.media_resolution))
+        # Optionally moves encoding to worker processes to keep the GIL free for audio
+        self.process_encoder = None
+        if tile_diff and encode_workers:
+            raise ValueError("tile_diff needs the in-process encoder; use encode_workers=0")
+        if encode_workers:
+            self.process_encoder = ProcessFrameEncoder(
+                workers=encode_workers, max_pixels=self.frame_encoder.max_pixels
+            )
+        # Skips screenshots that did not change since the last one sent
+        self.frame_filter = FrameDeduplicator()
+        # Optionally sends only the changed part of the screen
+        self.region_tracker = DirtyRegionTracker(max_pixels=self.frame_encoder.max_pixels) if tile_diff else None
+        # Adapts the capture rate to motion and uplink backpressure
+        self.frame_rate = FrameRateScheduler()
+        self.uplink["video"].on_sent = self.frame_rate.record_send
+        # Drops microphone silence before it is uploaded
+        self.vad = VoiceActivityGate(sample_rate=SEND_SAMPLE_RATE) if vad else None
+        # Keeps the speaker's echo from being streamed back while the agent talks
+        self.duplex = DuplexPolicy(duplex)
 
         # Async tasks for handling communication streams
         self.send_text_task = None
         self.receive_audio_task = None
         self.play_audio_task = None
 
+    def _capture_uplink(self, kind, method, kwargs):
+        """
+        Records one message the uplink sent.
+        """
+        if media := kwargs.get("media"):
+            meta = {"mime_type": media["mime_type"]}
+            if kind == "audio":
+                meta["rate"] = SEND_SAMPLE_RATE
+            self.capture.record(f"uplink_{kind}", media["data"], meta)
+        elif kwargs.get("audio_stream_end"):
+            self.capture.record("event", meta={"event": "audio_stream_end"})
+        elif turns := kwargs.get("turns"):
+            text = "".join(part.text or "" for part in turns.parts)
+            self.capture.record("uplink_text", text.encode())
+        elif method == "send_tool_response":
+            for tool_response in kwargs["function_responses"]:
+                self.capture.record(
+                    "tool_result",
+                    json.dumps(tool_response.response).encode(),
+                    {"id": tool_response.id, "name": tool_response.name},
+                )
+
     async def send_text(self):
         """
         Reads text input from the user and sends it to the session.
@@ -110,116 +256,187 @@ class AudioLoop:
             )
             if text.lower() == "q":
                 break
-            await self.session.send_client_content(
+            self.uplink.put(
+                "text",
+                "send_client_content",
                 turns=types.Content(role="user", parts=[types.Part(text=text or ".")]),
                 turn_complete=True
             )
 
     def _get_frame(self, cap):
         """
-        Captures a single frame from the camera and processes it.
+        Takes the newest frame from the camera reader and processes it.
         """
         ret, frame = cap.read()
         if not ret:
             return None
+        if self.process_encoder is not None:
+            return self.process_encoder.submit((frame.shape[1], frame.shape[0]), frame, "BGR")
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         img = PIL.Image.fromarray(frame_rgb)
-        img.thumbnail([1920, 1080])
-
-        image_io = io.BytesIO()
-        img.save(image_io, format="jpeg")
-        image_io.seek(0)
-
-        mime_type = "image/jpeg"
-        image_bytes = image_io.read()
-        return {"mime_type": mime_type, "data": base64.b64encode(image_bytes).decode()}
+        self.frame_filter.observe(img)
+        return self.frame_encoder.chunk(img)
 
     async def get_frames(self):
         """
-        Continuously captures frames from the camera and puts them in the video queue.
+        Continuously captures frames from the camera and queues them on the uplink.
         """
-        cap = await asyncio.to_thread(cv2.VideoCapture, 0)
+        cap = CameraReader(0)
+        await asyncio.to_thread(cap.start)
+        print(f"[Camera] negotiated {cap.negotiated}")
 
-        while True:
-            frame = await asyncio.to_thread(self._get_frame, cap)
-            if frame is None:
-                break
-
-            await asyncio.sleep(1.0)
-            await self.video_queue.put(frame)
-
-        cap.release()
+        try:
+            while True:
+                started = time.monotonic()
+                frame = await asyncio.to_thread(self._get_frame, cap)
+                if frame is None:
+                    break
+
+                await self._queue_frame(frame)
+                await asyncio.sleep(self._frame_delay(started))
+        finally:
+            cap.release()
+            print(f"[Camera] {cap.stats()}")
 
     def _get_screen(self):
         """
         Captures a single screenshot of the primary monitor and processes it.
+        Returns None when the screen has not changed since the last sent frame.
         """
-        sct = mss.mss()
-        monitor = sct.monitors[0]
-
-        i = sct.grab(monitor)
-
-        mime_type = "image/jpeg"
-        image_bytes = mss.tools.to_png(i.rgb, i.size)
-        img = PIL.Image.open(io.BytesIO(image_bytes))
-
-        image_io = io.BytesIO()
-        img.save(image_io, format="jpeg")
-        image_io.seek(0)
-
-        image_bytes = image_io.read()
-        return {"mime_type": mime_type, "data": base64.b64encode(image_bytes).decode()}
+        if self.process_encoder is not None:
+            return self.process_encoder.submit(*self.screen_grabber.grab_raw())
+        img = self.screen_grabber.grab()
+        if not self.frame_filter.should_send(img):
+            return None
+        if self.region_tracker is not None:
+            img = self.region_tracker.select(img)
+        return self.frame_encoder.chunk(img)
 
     async def get_screen(self):
         """
-        Continuously captures screenshots and puts them in the video queue.
+        Continuously captures screenshots and queues them on the uplink.
         """
         while True:
+            started = time.monotonic()
             frame = await asyncio.to_thread(self._get_screen)
-            if frame is None:
-                break
+            if frame is not None:
+                await self._queue_frame(frame)
 
-            await asyncio.sleep(1.0)
-            await self.video_queue.put(frame)
+            await asyncio.sleep(self._frame_delay(started))
 
-    async def send_realtime(self):
+    async def _queue_frame(self, frame):
         """
-        Sends realtime audio/video data from the output queue to the session.
+        Queues a captured frame. Frames still being encoded in the process pool
+        go through collect_frames so they are sent in capture order.
         """
-        while True:
-            msg = await self.out_queue.get()
-            await self.session.send_realtime_input(media=msg)
+        if self.process_encoder is None:
+            self.uplink.put("video", "send_realtime_input", media=frame)
+        else:
+            await self.encoded_frames.put(asyncio.wrap_future(frame))
 
-    async def send_video(self):
+    async def collect_frames(self):
         """
-        Sends video frames from the video queue to the session.
+        Awaits process-pool encodes in capture order and forwards the frames worth sending.
         """
         while True:
-            frame = await self.video_queue.get()
-            await self.session.send_realtime_input(media=frame)
+            pending = await self.encoded_frames.get()
+            fingerprint, data = await pending
+            fingerprint = self.frame_filter.fingerprint_from_bytes(fingerprint)
+            if self.video_mode == "camera":
+                self.frame_filter.observe_fingerprint(fingerprint)
+            elif not self.frame_filter.should_send_fingerprint(fingerprint):
+                continue
+            self.uplink.put("video", "send_realtime_input", media=media_chunk(data))
+
+    def _frame_delay(self, started):
+        """
+        Returns how long to wait before the next capture, given when this one started.
+        """
+        queue_fill = self.uplink["video"].fill
+        interval = self.frame_rate.update(self.frame_filter.change_ratio, queue_fill)
+        return max(0.0, interval - (time.monotonic() - started))
 
     async def listen_audio(self):
         """
-        Captures audio from the microphone and puts it in the output queue.
+        Captures audio from the microphone and queues it on the uplink.
         """
         mic_info = pya.get_default_input_device_info()
-        self.audio_stream = await asyncio.to_thread(
-            pya.open,
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=SEND_SAMPLE_RATE,
-            input=True,
-            input_device_index=mic_info["index"],
-            frames_per_buffer=CHUNK_SIZE,
-        )
-        if __debug__:
-            kwargs = {"exception_on_overflow": False}
+        rate, channels = SEND_SAMPLE_RATE, CHANNELS
+        if self.device_format == "native":
+            rate, channels = native_format(pya, mic_info["index"], input=True, channels=CHANNELS, format=FORMAT)
+        if (rate, channels) != (SEND_SAMPLE_RATE, CHANNELS):
+            self.mic_resampler = Resampler(rate, SEND_SAMPLE_RATE, in_channels=channels, out_channels=CHANNELS)
+            print(f"[Audio] Microphone at {rate} Hz x{channels}, resampled to {SEND_SAMPLE_RATE} Hz")
+        # Same period length in time as at the API rate
+        chunk = CHUNK_SIZE * rate // SEND_SAMPLE_RATE
+
+        if self.audio_io == "callback":
+            # PortAudio's thread fills a ring buffer; no executor hop per chunk
+            self.mic = CallbackInput(
+                pya,
+                rate=rate,
+                chunk=chunk,
+                channels=channels,
+                format=FORMAT,
+                device_index=mic_info["index"],
+            )
+            self.audio_stream = self.mic.open()
+            read = self.mic.read
         else:
-            kwargs = {}
+            self.audio_stream = await asyncio.to_thread(
+                pya.open,
+                format=FORMAT,
+                channels=channels,
+                rate=rate,
+                input=True,
+                input_device_index=mic_info["index"],
+                frames_per_buffer=chunk,
+            )
+            if __debug__:
+                kwargs = {"exception_on_overflow": False}
+            else:
+                kwargs = {}
+
+            async def read():
+                return await asyncio.to_thread(self.audio_stream.read, chunk, **kwargs)
+
         # Continuously read audio data and put it in the queue for sending
         while True:
-            data = await asyncio.to_thread(self.audio_stream.read, CHUNK_SIZE, **kwargs)
-            await self.out_queue.put({"data": data, "mime_type": "audio/pcm"})
+            data = await read()
+            if self.mic_resampler is not None:
+                data = self.mic_resampler.process(data)
+            data = self.duplex.process(data, self.playback)
+            self.is_playing = self.duplex.playing
+            if data is None:
+                continue
+            chunks = [data] if self.vad is None else self.vad.process(data)
+            for item in chunks:
+                if item is AUDIO_STREAM_END:
+                    self.uplink.put("audio", "send_realtime_input", audio_stream_end=True)
+                else:
+                    self.uplink.put("audio", "send_realtime_input", media={"data": item, "mime_type": "audio/pcm"})
+
+    def _capture_downlink(self, response):
+        """
+        Records one message received from the server.
+        """
+        server_content = response.server_content
+        if server_content and server_content.model_turn:
+            for part in server_content.model_turn.parts or []:
+                if part.inline_data and part.inline_data.data:
+                    self.capture.record(
+                        "downlink_audio", part.inline_data.data, {"rate": RECEIVE_SAMPLE_RATE}
+                    )
+                elif part.text:
+                    self.capture.record("downlink_text", part.text.encode())
+        for event in ("interrupted", "turn_complete"):
+            if server_content and getattr(server_content, event):
+                self.capture.record("event", meta={"event": event})
+        if response.go_away:
+            self.capture.record("event", meta={"event": "go_away"})
+        if response.tool_call:
+            for call in response.tool_call.function_calls:
+                self.capture.record("tool_call", meta={"id": call.id, "name": call.name, "args": call.args})
 
     async def receive_audio(self):
         """
@@ -229,107 +446,190 @@ class AudioLoop:
         while True:
             turn = self.session.receive()
             async for response in turn:
+                if update := response.session_resumption_update:
+                    if update.resumable and update.new_handle:
+                        self.resumption_handle = update.new_handle
+                if self.capture is not None:
+                    self._capture_downlink(response)
+                if response.go_away:
+                    print(f"\n[Session] Server closing the connection in {response.go_away.time_left}")
+                    raise ReconnectNow()
+                server_content = response.server_content
+                if server_content and server_content.interrupted:
+                    # The user barged in: silence the speaker now, not at turn end
+                    self.playback.interrupt()
+                    if self.speaker_resampler is not None:
+                        self.speaker_resampler.reset()
                 if data := response.data:
-                    self.audio_in_queue.put_nowait(data)
+                    if self.speaker_resampler is not None:
+                        data = self.speaker_resampler.process(data)
+                    self.playback.feed(data)
                     continue
                 if text := response.text:
                     print(text, end="")
                 
-                # Handle tool calls
+                # Tool calls run on their own; results are sent as they complete
                 if response.tool_call:
-                    tool_responses = []
-                    # Iterate through all function calls requested by the model
-                    for function_call in response.tool_call.function_calls:
-                        func_name = function_call.name
-                        func_args = function_call.args
-                        print(f"\n[Tool Call] {func_name}({func_args})")
-                        
-                        # Execute the tool if it is registered
-                        if func_name in AVAILABLE_FUNCTIONS:
-                            func = AVAILABLE_FUNCTIONS[func_name]
-                            try:
-                                # Run the function in a thread to avoid blocking the asyncio loop
-                                result = await asyncio.to_thread(func, **func_args)
-                                print(f"[Tool Result] {result}")
-                                tool_responses.append(
-                                    types.FunctionResponse(
-                                        id=function_call.id,
-                                        name=func_name,
-                                        response={"result": json.dumps(result) if isinstance(result, dict) else str(result)}
-                                    )
-                                )
-                            except Exception as e:
-                                # Catch any errors during execution and report back to the model
-                                print(f"[Tool Error] {e}")
-                                tool_responses.append(
-                                    types.FunctionResponse(
-                                        id=function_call.id,
-                                        name=func_name,
-                                        response={"error": str(e)}
-                                    )
-                                )
-                        else:
-                            # Handle cases where the model hallucinates a non-existent tool
-                            print(f"[Tool Error] Unknown function: {func_name}")
-                            tool_responses.append(
-                                types.FunctionResponse(
-                                    id=function_call.id,
-                                    name=func_name,
-                                    response={"error": f"Unknown function: {func_name}"}
-                                )
-                            )
-                    
-                    # Send all tool responses back to the model
-                    if tool_responses:
-                        await self.session.send_tool_response(function_responses=tool_responses)
-
-            # Clear audio queue on turn complete (interruption handling)
-            while not self.audio_in_queue.empty():
-                self.audio_in_queue.get_nowait()
+                    self.tools.dispatch(response.tool_call.function_calls)
+                if response.tool_call_cancellation:
+                    self.drop_tool_calls(response.tool_call_cancellation.ids or [])
+
+            # Let the tail of the turn play out without waiting for the prebuffer
+            self.playback.end_turn()
+
+    def setup_speaker_format(self):
+        """
+        Plays at the output device's native rate and channel count, converting
+        the received audio on arrival.
+        """
+        speaker_info = pya.get_default_output_device_info()
+        rate, channels = native_format(pya, speaker_info["index"], input=False, channels=CHANNELS, format=FORMAT)
+        if (rate, channels) != (RECEIVE_SAMPLE_RATE, CHANNELS):
+            self.speaker_resampler = Resampler(RECEIVE_SAMPLE_RATE, rate, in_channels=CHANNELS, out_channels=channels)
+            print(f"[Audio] Speaker at {rate} Hz x{channels}, resampled from {RECEIVE_SAMPLE_RATE} Hz")
+        self.speaker_rate = rate
+        self.speaker_channels = channels
 
     async def play_audio(self):
         """
-        Plays the received audio chunks from the audio input queue.
+        Plays the received audio from the playback buffer.
         """
+        chunk = CHUNK_SIZE * self.speaker_rate // RECEIVE_SAMPLE_RATE
+        if self.audio_io == "callback":
+            # PortAudio's thread pulls straight from the playback buffer
+            self.speaker = CallbackOutput(
+                pya, self.playback, rate=self.speaker_rate, chunk=chunk, channels=self.speaker_channels, format=FORMAT
+            )
+            self.speaker.open()
+            return
+
         stream = await asyncio.to_thread(
             pya.open,
             format=FORMAT,
-            channels=CHANNELS,
-            rate=RECEIVE_SAMPLE_RATE,
+            channels=self.speaker_channels,
+            rate=self.speaker_rate,
             output=True,
         )
+        period_bytes = chunk * self.speaker_channels * pya.get_sample_size(FORMAT)
         while True:
-            bytestream = await self.audio_in_queue.get()
-            await asyncio.to_thread(stream.write, bytestream)
+            # Contiguous audio is written in larger blocks, one thread hop each
+            block = await self.playback.next_block()
+            await asyncio.to_thread(self.playback.play_block, stream, block, period_bytes)
+
+    def drop_tool_calls(self, ids=None):
+        """
+        Abandons the given tool calls (all of them if None): running calls are
+        cancelled and their queued responses removed from the uplink.
+        """
+        if ids is None:
+            self.tools.cancel(list(self.tools.running))
+            self.uplink["tool"].revise(lambda kwargs: None)
+            return
+        ids = set(ids)
+        self.tools.cancel(ids)
+
+        def revise(kwargs):
+            responses = [response for response in kwargs["function_responses"] if response.id not in ids]
+            return {**kwargs, "function_responses": responses} if responses else None
+
+        self.uplink["tool"].revise(revise)
+
+    async def stay_connected(self):
+        """
+        Keeps a session open for as long as the loop runs. Lost connections are
+        re-established with exponential backoff and resume the conversation
+        from the latest resumption handle; capture keeps running meanwhile
+        and the uplink holds what it produces. A session that starts fresh
+        abandons tool calls made on the old one, queued responses included.
+
+        Permanent failures end the loop: a client error or policy close is
+        re-raised, except that a connection resumed from a handle drops the
+        handle first and tries once more as a fresh session, since the
+        handle may have been rejected or expired. The last error is also
+        re-raised after RECONNECT_MAX_FAILURES failed connects in a row.
+        """
+        delay = RECONNECT_INITIAL_DELAY
+        failures = 0
+        while True:
+            config = CONFIG
+            resuming = self.resumption_handle
+            if resuming:
+                config = CONFIG.model_copy(
+                    update={"session_resumption": types.SessionResumptionConfig(handle=self.resumption_handle)}
+                )
+            try:
+                async with (
+                    self.connect(model=MODEL, config=config) as session,
+                    asyncio.TaskGroup() as tg,
+                ):
+                    delay = RECONNECT_INITIAL_DELAY
+                    failures = 0
+                    self.session = session
+                    print(f"[Session] Connected{' (resumed)' if self.resumption_handle else ''}")
+                    if not resuming:
+                        # A new session never made the earlier calls
+                        self.drop_tool_calls()
+                    tg.create_task(self.uplink.run(session))
+                    tg.create_task(self.receive_audio())
+            except* CONNECTION_ERRORS as group:
+                error = group.exceptions[0]
+                reason = "Connection lost" if self.session is not None else "Could not connect"
+                print(f"\n[Session] {reason}: {type(error).__name__}: {error}")
+                if self.session is None:
+                    failures += 1
+                if isinstance(error, ReconnectNow):
+                    delay = 0.0
+                elif not is_transient(error):
+                    if not resuming:
+                        raise
+                    # Most likely the handle was rejected or has expired
+                    print("[Session] Dropping the resumption handle and starting a new session")
+                    self.resumption_handle = None
+                    delay = 0.0
+                elif failures >= RECONNECT_MAX_FAILURES:
+                    print(f"[Session] Giving up after {failures} failed attempts")
+                    raise
+
+            self.session = None
+            self.uplink.disconnected()
+            if self.playback is not None:
+                # The rest of the interrupted turn is not coming
+                self.playback.end_turn()
+            print(f"[Session] Reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            self.reconnects += 1
+            delay = min(RECONNECT_MAX_DELAY, max(delay * 2, RECONNECT_INITIAL_DELAY))
 
     async def run(self):
         """
         Main execution loop. Sets up the session and manages async tasks.
         """
         try:
-            # Connect to Gemini Live API and manage the session context
-            async with (
-                client.aio.live.connect(model=MODEL, config=CONFIG) as session,
-                asyncio.TaskGroup() as tg,
-            ):
-                self.session = session
-
-                self.audio_in_queue = asyncio.Queue()
-                self.out_queue = asyncio.Queue(maxsize=5)
-                self.video_queue = asyncio.Queue(maxsize=2)
-
-                send_text_task = tg.create_task(self.send_text())
-                tg.create_task(self.send_realtime())
+            # Capture and playback live as long as the loop; the session is
+            # (re)connected underneath them
+            async with asyncio.TaskGroup() as tg:
+                if self.device_format == "native":
+                    self.setup_speaker_format()
+                self.playback = PlaybackBuffer(
+                    rate=self.speaker_rate, frame_bytes=self.speaker_channels * pya.get_sample_size(FORMAT)
+                )
+                if self.process_encoder is not None:
+                    self.encoded_frames = asyncio.Queue(maxsize=self.process_encoder.depth)
+
+                if self.text_input:
+                    send_text_task = tg.create_task(self.send_text())
+                else:
+                    send_text_task = tg.create_task(asyncio.Event().wait())
+                tg.create_task(self.stay_connected())
                 tg.create_task(self.listen_audio())
                 if self.video_mode == "camera":
                     tg.create_task(self.get_frames())
-                    tg.create_task(self.send_video())
                 elif self.video_mode == "screen":
                     tg.create_task(self.get_screen())
-                    tg.create_task(self.send_video())
+                if self.video_mode != "none" and self.process_encoder is not None:
+                    tg.create_task(self.collect_frames())
 
-                # Start receiving and playing audio
-                tg.create_task(self.receive_audio())
+                # Start playing audio; receiving is part of each connection
                 tg.create_task(self.play_audio())
 
                 await send_text_task
@@ -338,8 +638,41 @@ class AudioLoop:
         except asyncio.CancelledError:
             pass
         except ExceptionGroup as EG:
-            self.audio_stream.close()
+            if self.mic is None and self.audio_stream is not None:
+                self.audio_stream.close()
             traceback.print_exception(EG)
+        finally:
+            # Callback streams keep firing until closed, so always stop them
+            for stream in (self.mic, self.speaker):
+                if stream is not None:
+                    stream.close()
+            self.screen_grabber.close()
+            if self.vad is not None:
+                print(f"[Audio] {self.vad.stats()}")
+            if self.playback is not None:
+                print(f"[Audio] {self.playback.stats()}")
+            print(f"[Audio] {self.duplex.stats()}")
+            for kind, stats in self.uplink.stats().items():
+                print(f"[Uplink] {kind}: {stats}")
+            print(f"[Session] reconnects: {self.reconnects}")
+            self.tools.close()
+            print(f"[Tool Call] {self.tools.stats()}")
+            for name, executor in self.tools.executors.items():
+                print(f"[Tool Call] {name} executor: {executor.stats()}")
+            if self.tools.cache is not None:
+                print(f"[Tool Call] cache: {self.tools.cache.stats()}")
+            print(f"[Tool Call] http: {http_stats()}")
+            if self.capture is not None:
+                self.capture.close()
+                print(f"[Capture] {self.capture.records} records written to {self.capture.path}")
+            if self.process_encoder is not None:
+                self.process_encoder.close()
+            if self.video_mode != "none":
+                print(f"[Video] {self.frame_rate.stats()}")
+            if self.video_mode == "screen":
+                print(f"[Video] {self.frame_filter.stats()}")
+                if self.region_tracker is not None:
+                    print(f"[Video] {self.region_tracker.stats()}")
 
 
 if __name__ == "__main__":
@@ -362,6 +695,76 @@ if __name__ == "__main__":
         help="pixels to stream from",
         choices=["camera", "screen", "none"],
     )
+    parser.add_argument(
+        "--tile-diff",
+        action="store_true",
+        help="in screen mode, send only the changed region with a periodic full frame",
+    )
+    parser.add_argument(
+        "--encode-workers",
+        type=int,
+        default=0,
+        help="encode frames in this many worker processes (0 encodes in-process)",
+    )
+    parser.add_argument(
+        "--no-vad",
+        action="store_true",
+        help="stream the microphone continuously instead of dropping silence",
+    )
+    parser.add_argument(
+        "--audio-io",
+        default="callback",
+        choices=["callback", "blocking"],
+        help="PyAudio callback streams, or blocking reads/writes through worker threads",
+    )
+    parser.add_argument(
+        "--device-format",
+        default="native",
+        choices=["native", "fixed"],
+        help="open audio devices at their native rate and convert (native), or at the API's rates (fixed)",
+    )
+    parser.add_argument(
+        "--duplex",
+        default="full",
+        choices=DUPLEX_MODES,
+        help="microphone while the agent speaks: send all (full), mute (half), or drop its echo (echo)",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="append the server's messages to a JSON lines file that bench.py e2e can replay",
+    )
+    parser.add_argument(
+        "--capture",
+        metavar="PATH",
+        help="record every chunk, frame and tool call to a binary capture file (see recorder.py)",
+    )
+    parser.add_argument(
+        "--tool-batch",
+        type=float,
+        default=TOOL_BATCH_DEADLINE,
+        metavar="SECONDS",
+        help="send results of parallel tool calls that finish this close together in one response (0 sends each at once)",
+    )
+    parser.add_argument(
+        "--no-tool-cache",
+        action="store_true",
+        help="call network tools every time instead of reusing recent results",
+    )
     args = parser.parse_args()
-    main = AudioLoop(video_mode=args.mode)
+    if args.tile_diff and args.encode_workers:
+        parser.error("--tile-diff needs the in-process encoder; drop --encode-workers")
+    main = AudioLoop(
+        video_mode=args.mode,
+        tile_diff=args.tile_diff,
+        encode_workers=args.encode_workers,
+        vad=not args.no_vad,
+        audio_io=args.audio_io,
+        duplex=args.duplex,
+        device_format=args.device_format,
+        connect=recording_connect(client.aio.live.connect, args.record) if args.record else None,
+        capture=args.capture,
+        tool_batch=args.tool_batch,
+        tool_cache=not args.no_tool_cache,
+    )
     asyncio.run(main.run())
\ No newline at end of file
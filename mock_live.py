@@ -0,0 +1,278 @@
+"""
+Scripted stand-ins for a Gemini Live session, for driving AudioLoop without
+an API key or the network, plus recording of real sessions for replay.
+"""
+import json
+import time
+import asyncio
+import contextlib
+
+from google.genai import types, errors
+from websockets.exceptions import ConnectionClosedError
+
+
+def audio_message(data, rate=24000):
+    return types.LiveServerMessage(
+        server_content=types.LiveServerContent(
+            model_turn=types.Content(
+                role="model",
+                parts=[types.Part(inline_data=types.Blob(data=data, mime_type=f"audio/pcm;rate={rate}"))],
+            )
+        )
+    )
+
+
+def text_message(text):
+    return types.LiveServerMessage(
+        server_content=types.LiveServerContent(
+            model_turn=types.Content(role="model", parts=[types.Part(text=text)])
+        )
+    )
+
+
+def interrupted_message():
+    return types.LiveServerMessage(server_content=types.LiveServerContent(interrupted=True))
+
+
+def turn_complete_message():
+    return types.LiveServerMessage(server_content=types.LiveServerContent(turn_complete=True))
+
+
+def resumption_message(handle):
+    return types.LiveServerMessage(
+        session_resumption_update=types.LiveServerSessionResumptionUpdate(new_handle=handle, resumable=True)
+    )
+
+
+def go_away_message(time_left="5s"):
+    return types.LiveServerMessage(go_away=types.LiveServerGoAway(time_left=time_left))
+
+
+def tool_call_message(*calls):
+    """
+    Builds a tool call from (id, name, args) tuples.
+    """
+    return types.LiveServerMessage(
+        tool_call=types.LiveServerToolCall(
+            function_calls=[types.FunctionCall(id=id, name=name, args=args) for id, name, args in calls]
+        )
+    )
+
+
+class ScriptedSession:
+    """
+    Plays a script of (delay_seconds, LiveServerMessage) pairs through
+    receive() and records everything the client sends.
+
+    turns are further scripts, each released when the client ends a turn:
+    audio_stream_end, client content with turn_complete, or a tool
+    response. Their first delay counts from that moment, so a turn models
+    the server's response to the user.
+
+    Like the real session, each receive() iterator ends after a message with
+    turn_complete. Once everything has been played receive() waits forever,
+    as an idle connection would. After drop(), receiving and sending fail the
+    way they do when the websocket goes away.
+    """
+    def __init__(self, script, turns=()):
+        self.script = list(script)
+        self.turns = [list(turn) for turn in turns]
+        self.started = None
+        # (monotonic time, method, kwargs) for every call made by the client
+        self.sent = []
+        # Monotonic time at which each script entry was delivered
+        self.delivered = []
+        # Monotonic time at which each client turn ended
+        self.turn_ends = []
+        # Monotonic time at which each entry of turns started playing
+        self.turn_starts = []
+        self._pending_turns = 0
+        self._turn_ended = asyncio.Event()
+        self._dropped = asyncio.Event()
+
+    def drop(self):
+        self._dropped.set()
+
+    async def _wait(self, delay=None, event=None):
+        """
+        Waits delay seconds (forever if None), or until event is set, unless
+        the connection drops first.
+        """
+        waiters = [asyncio.ensure_future(self._dropped.wait())]
+        if event is not None:
+            waiters.append(asyncio.ensure_future(event.wait()))
+        try:
+            await asyncio.wait(waiters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        if self._dropped.is_set():
+            # What the SDK raises when the socket closes mid-receive
+            raise errors.APIError(1006, {"message": "Abnormal closure."})
+
+    async def _next_turn(self):
+        while not self._pending_turns:
+            self._turn_ended.clear()
+            await self._wait(event=self._turn_ended)
+        self._pending_turns -= 1
+        self.turn_starts.append(time.monotonic())
+        self.script = self.turns.pop(0)
+
+    async def receive(self):
+        if self.started is None:
+            self.started = time.monotonic()
+        while True:
+            if not self.script:
+                if not self.turns:
+                    await self._wait()
+                await self._next_turn()
+                continue
+            delay, message = self.script.pop(0)
+            await self._wait(delay)
+            self.delivered.append(time.monotonic())
+            yield message
+            if message.server_content and message.server_content.turn_complete:
+                return
+
+    async def _record(self, method, kwargs):
+        if self._dropped.is_set():
+            raise ConnectionClosedError(None, None)
+        now = time.monotonic()
+        self.sent.append((now, method, kwargs))
+        if (
+            kwargs.get("audio_stream_end")
+            or (method == "send_client_content" and kwargs.get("turn_complete"))
+            or method == "send_tool_response"
+        ):
+            self.turn_ends.append(now)
+            self._pending_turns += 1
+            self._turn_ended.set()
+
+    async def send_realtime_input(self, **kwargs):
+        await self._record("send_realtime_input", kwargs)
+
+    async def send_client_content(self, **kwargs):
+        await self._record("send_client_content", kwargs)
+
+    async def send_tool_response(self, **kwargs):
+        await self._record("send_tool_response", kwargs)
+
+
+class FakeLiveServer:
+    """
+    In-process stand-in for client.aio.live.connect that can drop
+    connections on command.
+
+    Every connection is a ScriptedSession built from script(index), which
+    by default just hands out a resumption handle, and turns(index). The
+    handle each connect asked to resume is recorded, and refuse makes that
+    many connection attempts fail before one succeeds again.
+    """
+    def __init__(self, script=None, turns=None):
+        self.script = script or (lambda index: [(0.0, resumption_message(f"handle-{index}"))])
+        self.turns = turns or (lambda index: [])
+        self.sessions = []
+        # Resumption handle passed on each successful connect (None for a fresh session)
+        self.handles = []
+        # Monotonic time of each successful connect, and of each drop()
+        self.connected = []
+        self.dropped = []
+        self.refuse = 0
+        self.attempts = 0
+
+    @contextlib.asynccontextmanager
+    async def connect(self, model, config):
+        self.attempts += 1
+        if self.refuse:
+            self.refuse -= 1
+            raise ConnectionRefusedError("fake server refused the connection")
+        resumption = config.session_resumption
+        self.handles.append(resumption.handle if resumption else None)
+        self.connected.append(time.monotonic())
+        session = ScriptedSession(self.script(len(self.sessions)), self.turns(len(self.sessions)))
+        self.sessions.append(session)
+        yield session
+
+    def drop(self, refuse=0):
+        """
+        Breaks the current connection, and refuses the next refuse attempts.
+        """
+        self.refuse = refuse
+        self.dropped.append(time.monotonic())
+        self.sessions[-1].drop()
+
+    @property
+    def sent(self):
+        """Every call received, across all connections, in order."""
+        return [call for session in self.sessions for call in session.sent]
+
+
+class RecordingSession:
+    """
+    Wraps a live session and appends what the server sends, and when the
+    client ended its turns, to a JSON lines file that load_recording()
+    turns back into a script.
+    """
+    def __init__(self, session, file):
+        self.session = session
+        self.file = file
+        self.started = time.monotonic()
+
+    def _write(self, entry):
+        entry["t"] = round(time.monotonic() - self.started, 4)
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    async def receive(self):
+        async for message in self.session.receive():
+            self._write({"message": message.model_dump(mode="json", exclude_none=True)})
+            yield message
+
+    async def send_realtime_input(self, **kwargs):
+        await self.session.send_realtime_input(**kwargs)
+        if kwargs.get("audio_stream_end"):
+            self._write({"client_turn": "audio_stream_end"})
+
+    async def send_client_content(self, **kwargs):
+        await self.session.send_client_content(**kwargs)
+        if kwargs.get("turn_complete"):
+            self._write({"client_turn": "text"})
+
+    async def send_tool_response(self, **kwargs):
+        await self.session.send_tool_response(**kwargs)
+        self._write({"client_turn": "tool_response"})
+
+
+def recording_connect(connect, path):
+    """
+    Wraps a live.connect function so every session it opens is recorded to path.
+    """
+    @contextlib.asynccontextmanager
+    async def connect_and_record(**kwargs):
+        async with connect(**kwargs) as session:
+            with open(path, "a", encoding="utf-8") as file:
+                yield RecordingSession(session, file)
+
+    return connect_and_record
+
+
+def load_recording(path):
+    """
+    Reads a recording into (script, turns) for ScriptedSession. Messages
+    before the first client turn form the script; each client turn starts
+    a new turn, timed from the moment the client ended it.
+    """
+    script, turns = [], []
+    current = script
+    last = 0.0
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            entry = json.loads(line)
+            if "client_turn" in entry:
+                current = []
+                turns.append(current)
+            else:
+                message = types.LiveServerMessage.model_validate(entry["message"])
+                current.append((max(0.0, entry["t"] - last), message))
+            last = entry["t"]
+    return script, turns
@@ -0,0 +1,197 @@
+"""
+Paged file reading for read_file: byte and line ranges, tail, and an
+output budget, over mmap so large files are never loaded whole.
+"""
+import os
+import mmap
+import codecs
+import threading
+import mimetypes
+from collections import OrderedDict
+
+import numpy as np
+
+READ_MAX_TOKENS = 4000        # default output budget
+BYTES_PER_TOKEN = 4           # rough size of a token of text
+READ_SNIFF_BYTES = 8192       # bytes inspected to tell text from binary
+LINE_INDEX_CHUNK = 16 * 1024 * 1024
+LINE_INDEX_FILES = 8          # files whose line index is kept
+
+# Bytes that do not occur in text: controls other than \t \n \f \r and ESC
+_NON_TEXT = bytes(range(0, 8)) + bytes(range(14, 27)) + bytes(range(28, 32)) + b"\x0b\x7f"
+
+
+def looks_binary(sample):
+    """
+    Cheap text/binary guess from the start of a file: any NUL, invalid
+    UTF-8, or more than 10% control bytes means binary.
+    """
+    if not sample:
+        return False
+    if b"\0" in sample:
+        return True
+    try:
+        # Not final, so a multi-byte character cut off at the end of the sample is fine
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return True
+    return len(sample.translate(None, _NON_TEXT)) < len(sample) * 0.9
+
+
+class LineIndex:
+    """
+    Start offsets of the lines of one version of a file, found lazily: the
+    file is scanned only as far as the furthest line asked for so far.
+    Concurrent readers of the same file share it, so scanning is serialized.
+    """
+    def __init__(self, size, mtime):
+        self.size = size
+        self.mtime = mtime
+        self.starts = np.zeros(1, dtype=np.int64)
+        self.scanned = 0
+        self._lock = threading.Lock()
+
+    @property
+    def complete(self):
+        return self.scanned >= self.size
+
+    def extend(self, data, line=None):
+        """
+        Scans data (the mmap) until line is known, or to the end if None.
+        """
+        with self._lock:
+            self._extend(data, line)
+
+    def _extend(self, data, line):
+        while not self.complete and (line is None or len(self.starts) <= line):
+            count = min(LINE_INDEX_CHUNK, self.size - self.scanned)
+            chunk = np.frombuffer(data, dtype=np.uint8, count=count, offset=self.scanned)
+            newlines = np.flatnonzero(chunk == 10) + self.scanned + 1
+            starts = np.concatenate((self.starts, newlines))
+            if self.scanned + count >= self.size and len(starts) > 1 and starts[-1] == self.size:
+                # A final newline does not start another line
+                starts = starts[:-1]
+            # Published before scanned, so a reader that sees the index
+            # complete also sees every line
+            self.starts = starts
+            self.scanned += count
+
+    def line_start(self, data, line):
+        """
+        Offset of a 0-based line, or the file size past the last line.
+        """
+        self.extend(data, line)
+        # starts is only ever replaced, never changed in place
+        starts = self.starts
+        return int(starts[line]) if line < len(starts) else self.size
+
+
+def _text_end(data, start, end):
+    """
+    Moves end back so [start, end) holds whole lines if it can, or at least
+    whole UTF-8 characters.
+    """
+    newline = data.rfind(b"\n", start, end)
+    if newline >= 0:
+        return newline + 1
+    while end > start and end < len(data) and data[end] & 0xC0 == 0x80:
+        end -= 1
+    return end
+
+
+class FilePager:
+    """
+    Reads pages of files through mmap. Line indexes are cached per file and
+    dropped when its size or mtime changes, so paging through a file costs
+    O(page) per request after the first pass over the part already read.
+    """
+    def __init__(self, cached_files=LINE_INDEX_FILES):
+        self.cached_files = cached_files
+        self.indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, path, stat):
+        with self._lock:
+            index = self.indexes.get(path)
+            if index is None or (index.size, index.mtime) != (stat.st_size, stat.st_mtime_ns):
+                index = LineIndex(stat.st_size, stat.st_mtime_ns)
+                self.indexes[path] = index
+            self.indexes.move_to_end(path)
+            while len(self.indexes) > self.cached_files:
+                self.indexes.popitem(last=False)
+            return index
+
+    def read(
+        self,
+        path,
+        start_line=None,
+        line_count=None,
+        offset=None,
+        length=None,
+        tail_lines=None,
+        max_tokens=READ_MAX_TOKENS,
+    ):
+        """
+        Returns one page of a text file as a dict with the content and where
+        it sits in the file. Lines are 1-based. With no range the file is read
+        from the start. Output stops at whole lines within max_tokens (about
+        BYTES_PER_TOKEN bytes each); "next" says where the following page
+        starts. Binary files are described instead of read.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        size = stat.st_size
+        budget = max(1, int(max_tokens)) * BYTES_PER_TOKEN
+        result = {"path": path, "size": size}
+        if size == 0:
+            return {**result, "content": "", "start_line": 1, "end_line": 0, "truncated": False}
+
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if looks_binary(data[:READ_SNIFF_BYTES]):
+                return {**result, "binary": True, "type": mimetypes.guess_type(path)[0] or "application/octet-stream"}
+            index = self._index(path, stat)
+            first_line = None
+
+            if tail_lines is not None:
+                # Walk back from the end; no index needed
+                cursor = size - 1 if data[size - 1] == 10 else size
+                start = size
+                for _ in range(max(0, int(tail_lines))):
+                    newline = data.rfind(b"\n", 0, cursor)
+                    start = newline + 1
+                    if newline < 0:
+                        break
+                    cursor = newline
+                if size - start > budget:
+                    # Keep the last lines that fit
+                    cut = data.find(b"\n", size - budget - 1, size - 1)
+                    start = cut + 1 if cut >= 0 else size - budget
+                    while start < size and data[start] & 0xC0 == 0x80:
+                        start += 1
+                end = size
+            elif offset is not None:
+                start = min(max(0, int(offset)), size)
+                end = size if length is None else min(size, start + max(0, int(length)))
+                if end - start > budget:
+                    end = _text_end(data, start, start + budget)
+            else:
+                first_line = max(1, int(start_line or 1))
+                start = index.line_start(data, first_line - 1)
+                end = size if line_count is None else index.line_start(data, first_line - 1 + max(0, int(line_count)))
+                if end - start > budget:
+                    end = _text_end(data, start, start + budget)
+
+            content = data[start:end].decode("utf-8", errors="replace")
+
+        result.update(offset=start, end_offset=end, content=content, truncated=end < size or start > 0)
+        if first_line is not None:
+            lines = content.count("\n") + (not content.endswith("\n"))
+            result.update(start_line=first_line, end_line=first_line + lines - 1 if content else first_line - 1)
+        if index.complete:
+            result["total_lines"] = len(index.starts)
+        if end < size:
+            result["next"] = (
+                {"start_line": result["end_line"] + 1} if first_line is not None and content.endswith("\n")
+                else {"offset": end}
+            )
+        return result
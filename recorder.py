@@ -0,0 +1,321 @@
+"""
+Compact session capture: every uplink and downlink chunk, frame, tool call
+and event, with monotonic timestamps, in an append-only binary file.
+
+File layout (little endian):
+  header    MAGIC, version (u16), wall clock start (f64), monotonic start (f64)
+  records   time (f64), kind (u8), pad, meta length (u16), payload length (u32),
+            meta (compact JSON), payload (raw bytes)
+  index     offset (u64) of every record, written on close
+  trailer   index offset (u64), record count (u64), INDEX_MAGIC
+
+A file without a trailer (the process died) is still readable: the reader
+rebuilds the index by walking the records.
+
+Usage:
+  python recorder.py summary session.rec
+  python recorder.py dump session.rec [--kind uplink_audio] [--limit 50]
+  python recorder.py audio session.rec out.wav [--kind downlink_audio]
+"""
+import json
+import mmap
+import time
+import wave
+import queue
+import base64
+import struct
+import argparse
+import threading
+from array import array
+from collections import namedtuple
+
+MAGIC = b"GLDAREC\0"
+INDEX_MAGIC = b"GLDAIDX\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHdd")
+RECORD = struct.Struct("<dBxHI")
+TRAILER = struct.Struct("<QQ8s")
+
+RECORD_KINDS = {
+    "uplink_audio": 1,
+    "uplink_video": 2,
+    "uplink_text": 3,
+    "downlink_audio": 4,
+    "downlink_text": 5,
+    "tool_call": 6,
+    "tool_result": 7,
+    "event": 8,
+}
+KIND_NAMES = {code: name for name, code in RECORD_KINDS.items()}
+
+# The writer flushes at least this often (seconds), so a crash loses little
+FLUSH_INTERVAL = 1.0
+
+Record = namedtuple("Record", "time kind meta payload")
+
+
+class SessionRecorder:
+    """
+    Appends records to a capture file from a background thread.
+
+    record() only enqueues, so the event loop never waits on the disk.
+    str payloads are taken to be base64 (as media is sent) and are stored
+    decoded.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, time.time(), time.monotonic()))
+        self.offsets = array("Q")
+        self.records = 0
+        self.bytes = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, kind, payload=b"", meta=None):
+        self._queue.put((time.monotonic(), RECORD_KINDS[kind], meta, payload))
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                self.file.flush()
+                continue
+            if item is None:
+                return
+            timestamp, kind, meta, payload = item
+            if isinstance(payload, str):
+                payload = base64.b64decode(payload)
+            meta = json.dumps(meta, separators=(",", ":")).encode() if meta else b""
+            self.offsets.append(self.file.tell())
+            self.file.write(RECORD.pack(timestamp, kind, len(meta), len(payload)))
+            self.file.write(meta)
+            self.file.write(payload)
+            self.records += 1
+            self.bytes += len(payload)
+
+    def close(self):
+        """
+        Writes everything still queued, then the index and trailer.
+        """
+        if self.file.closed:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        index_offset = self.file.tell()
+        self.file.write(self.offsets.tobytes())
+        self.file.write(TRAILER.pack(index_offset, len(self.offsets), INDEX_MAGIC))
+        self.file.close()
+
+
+class SessionRecording:
+    """
+    Memory-mapped reader for a capture file. Records are decoded on access
+    and payloads are memoryviews into the mapping, so long sessions are
+    never loaded into RAM.
+    """
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.wall_start, self.monotonic_start = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a session capture")
+        if version != VERSION:
+            raise ValueError(f"Unsupported capture version {version}")
+        self.complete = False
+        self.offsets = self._read_index()
+
+    def _read_index(self):
+        if len(self.map) >= HEADER.size + TRAILER.size:
+            index_offset, count, magic = TRAILER.unpack_from(self.map, len(self.map) - TRAILER.size)
+            if magic == INDEX_MAGIC:
+                self.complete = True
+                return memoryview(self.map)[index_offset:index_offset + count * 8].cast("Q")
+        # No trailer: walk the records, stopping at a torn last write
+        offsets = array("Q")
+        offset = HEADER.size
+        while offset + RECORD.size <= len(self.map):
+            _, _, meta_length, payload_length = RECORD.unpack_from(self.map, offset)
+            end = offset + RECORD.size + meta_length + payload_length
+            if end > len(self.map):
+                break
+            offsets.append(offset)
+            offset = end
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def time_at(self, index):
+        return RECORD.unpack_from(self.map, self.offsets[index])[0]
+
+    def __getitem__(self, index):
+        offset = self.offsets[index]
+        timestamp, kind, meta_length, payload_length = RECORD.unpack_from(self.map, offset)
+        start = offset + RECORD.size
+        meta = json.loads(self.map[start:start + meta_length]) if meta_length else {}
+        start += meta_length
+        payload = memoryview(self.map)[start:start + payload_length]
+        return Record(timestamp - self.monotonic_start, KIND_NAMES.get(kind, str(kind)), meta, payload)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def index_at(self, seconds):
+        """
+        Returns the index of the first record at or after the given time into
+        the session, by binary search over the index.
+        """
+        target = self.monotonic_start + seconds
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.time_at(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def between(self, start, end):
+        """
+        Yields the records from start to end seconds into the session.
+        """
+        for index in range(self.index_at(start), len(self)):
+            record = self[index]
+            if record.time > end:
+                return
+            yield record
+
+    def close(self):
+        """
+        Unmaps the file. If payloads handed out earlier are still referenced,
+        the mapping is instead freed along with the last of them.
+        """
+        if isinstance(self.offsets, memoryview):
+            self.offsets.release()
+        self.offsets = []
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else 0.0
+
+
+def summarize(recording):
+    """
+    Returns per-kind counts, bytes, bitrates and arrival gaps, and tool call
+    durations.
+    """
+    duration = recording[len(recording) - 1].time if len(recording) else 0.0
+    kinds = {}
+    tool_calls = {}
+    tool_times = []
+    for record in recording:
+        stats = kinds.setdefault(record.kind, {"count": 0, "bytes": 0, "last": None, "gaps": []})
+        stats["count"] += 1
+        stats["bytes"] += len(record.payload)
+        if stats["last"] is not None:
+            stats["gaps"].append(record.time - stats["last"])
+        stats["last"] = record.time
+        if record.kind == "tool_call":
+            tool_calls[record.meta.get("id")] = record
+        elif record.kind == "tool_result" and record.meta.get("id") in tool_calls:
+            call = tool_calls.pop(record.meta["id"])
+            tool_times.append((call.meta.get("name"), record.time - call.time))
+
+    summary = {"duration_s": duration, "records": len(recording), "complete": recording.complete, "kinds": {}}
+    for kind, stats in kinds.items():
+        gaps = stats["gaps"]
+        summary["kinds"][kind] = {
+            "count": stats["count"],
+            "bytes": stats["bytes"],
+            "kbps": stats["bytes"] * 8 / 1000 / duration if duration else 0.0,
+            "gap_p50_ms": _percentile(gaps, 0.5) * 1000,
+            "gap_p95_ms": _percentile(gaps, 0.95) * 1000,
+            "gap_max_ms": max(gaps) * 1000 if gaps else 0.0,
+        }
+    summary["tools"] = [{"name": name, "ms": seconds * 1000} for name, seconds in tool_times]
+    return summary
+
+
+def _summary_command(args):
+    recording = SessionRecording(args.path)
+    summary = summarize(recording)
+    print(
+        f"{args.path}: {summary['duration_s']:.1f}s, {summary['records']} records"
+        f"{'' if summary['complete'] else ' (no index, recovered by scanning)'}"
+    )
+    for kind, stats in summary["kinds"].items():
+        print(
+            f"  {kind:<15} {stats['count']:>7} records {stats['bytes'] / 1024:>10.1f} KB {stats['kbps']:>8.1f} kbit/s"
+            f"  gap p50 {stats['gap_p50_ms']:.0f} ms, p95 {stats['gap_p95_ms']:.0f} ms, max {stats['gap_max_ms']:.0f} ms"
+        )
+    for tool in summary["tools"]:
+        print(f"  tool {tool['name']}: {tool['ms']:.0f} ms")
+    recording.close()
+
+
+def _dump_command(args):
+    recording = SessionRecording(args.path)
+    shown = 0
+    for record in recording.between(args.start, float("inf")):
+        if args.kind and record.kind != args.kind:
+            continue
+        print(f"{record.time:10.3f}  {record.kind:<15} {len(record.payload):>8} B  {json.dumps(record.meta)}")
+        shown += 1
+        if shown >= args.limit:
+            break
+    recording.close()
+
+
+def _audio_command(args):
+    recording = SessionRecording(args.path)
+    records = (record for record in recording if record.kind == args.kind)
+    first = next(records, None)
+    default_rate = 16000 if args.kind == "uplink_audio" else 24000
+    with wave.open(args.out, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(int(first.meta.get("rate", default_rate)) if first else default_rate)
+        if first is not None:
+            out.writeframes(first.payload)
+        for record in records:
+            out.writeframes(record.payload)
+    recording.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect session capture files written with main.py --capture")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("summary", help="bandwidth and timing per record kind, and tool call durations")
+    p.add_argument("path")
+    p.set_defaults(func=_summary_command)
+
+    p = sub.add_parser("dump", help="list records")
+    p.add_argument("path")
+    p.add_argument("--kind", choices=list(RECORD_KINDS))
+    p.add_argument("--start", type=float, default=0.0, help="seconds into the session")
+    p.add_argument("--limit", type=int, default=100)
+    p.set_defaults(func=_dump_command)
+
+    p = sub.add_parser("audio", help="export recorded audio to a WAV file")
+    p.add_argument("path")
+    p.add_argument("out")
+    p.add_argument("--kind", default="downlink_audio", choices=["uplink_audio", "downlink_audio"])
+    p.set_defaults(func=_audio_command)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Persistent shell workers for run_command.
+
+Starting PowerShell costs hundreds of milliseconds, so commands are written
+to long-lived shell processes instead, each framed by a unique sentinel
+that carries the exit code back.
+"""
+import os
+import time
+import base64
+import uuid
+import queue
+import shutil
+import signal
+import threading
+import subprocess
+from collections import deque
+
+SHELL_TIMEOUT = 30.0          # seconds a command may run before its shell is killed
+SHELL_OUTPUT_LIMIT = 16384    # bytes of output kept per stream (head and tail)
+SHELL_POOL_SIZE = 2
+
+
+def platform_shell():
+    """
+    argv of a shell that reads commands from stdin.
+    """
+    if os.name == "nt":
+        return ["powershell", "-NoLogo", "-NoProfile", "-NonInteractive", "-Command", "-"]
+    return [shutil.which("bash") or "/bin/sh"]
+
+
+def _frame(argv, command, sentinel):
+    """
+    The text written to the shell for one command. The command is passed as
+    data, not spliced into the script, so unbalanced quotes or brackets in
+    it are a syntax error of that command alone. It runs in its own scope
+    (with stdin closed under bash), then the sentinel is printed on stdout
+    with the exit code, and alone on stderr. Output without a final newline
+    ends up on the sentinel's line.
+    """
+    if os.path.basename(argv[0]).lower().startswith("powershell"):
+        # One complete line, so no blank line in the command can end it early
+        encoded = base64.b64encode(command.encode("utf-8")).decode("ascii")
+        return (
+            f"$global:LASTEXITCODE = 0; "
+            f"try {{ & ([scriptblock]::Create([Text.Encoding]::UTF8.GetString("
+            f"[Convert]::FromBase64String('{encoded}')))); $__ok = $? }} "
+            f"catch {{ [Console]::Error.WriteLine($_); $__ok = $false }}; "
+            f"$__code = if ($__ok) {{ $global:LASTEXITCODE }} else {{ 1 }}; "
+            f"[Console]::Out.WriteLine(\"{sentinel} $__code\"); "
+            f"[Console]::Error.WriteLine(\"{sentinel}\")\n\n"
+        )
+    # A quoted heredoc hands the command to eval untouched; the subshell
+    # keeps cd, variables and exit from leaking into the worker. bash reads
+    # it with a builtin, saving the fork of cat.
+    if os.path.basename(argv[0]) == "bash":
+        load = f"IFS= read -r -d '' __command <<'{sentinel}'\n{command}\n{sentinel}\neval \"$__command\""
+    else:
+        load = f"eval \"$(cat <<'{sentinel}'\n{command}\n{sentinel}\n)\""
+    return (
+        f"(\n{load}\n) < /dev/null\n"
+        f"printf '{sentinel} %d\\n' $?\nprintf '{sentinel}\\n' >&2\n"
+    )
+
+
+class CappedOutput:
+    """
+    Keeps the first and last limit/2 bytes of a stream and counts the rest.
+    """
+    def __init__(self, limit=SHELL_OUTPUT_LIMIT):
+        self.half = limit // 2
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_bytes = 0
+        self.omitted = 0
+
+    def write(self, data):
+        room = self.half - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail.append(data)
+        self.tail_bytes += len(data)
+        while self.tail_bytes - len(self.tail[0]) >= self.half:
+            self.tail_bytes -= len(self.tail[0])
+            self.omitted += len(self.tail.popleft())
+
+    def text(self):
+        head = bytes(self.head)
+        tail = b"".join(self.tail)
+        if self.omitted:
+            head += f"\n... [{self.omitted} bytes omitted] ...\n".encode()
+        return (head + tail).decode("utf-8", errors="replace")
+
+
+class ShellSession:
+    """
+    One long-lived shell process running one command at a time.
+    """
+    def __init__(self, argv=None, cwd=None):
+        self.argv = argv or platform_shell()
+        self.cwd = cwd
+        self.process = None
+        self.lines = None
+        self.spawns = 0
+
+    def _start(self):
+        # Its own process group, so a kill reaches everything the command started
+        if os.name == "nt":
+            group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group = {"start_new_session": True}
+        self.process = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            **group,
+        )
+        self.spawns += 1
+        # Both streams feed one queue so neither pipe can fill up and stall the shell
+        self.lines = queue.Queue()
+        for name, stream in (("stdout", self.process.stdout), ("stderr", self.process.stderr)):
+            threading.Thread(target=self._read, args=(name, stream, self.lines), daemon=True).start()
+
+    @staticmethod
+    def _read(name, stream, lines):
+        for line in iter(stream.readline, b""):
+            lines.put((name, line))
+        lines.put((name, None))
+
+    def kill(self):
+        """
+        Kills the shell and every process it started, background jobs
+        included.
+        """
+        if self.process is None:
+            return
+        try:
+            if os.name == "nt":
+                subprocess.run(
+                    ["taskkill", "/T", "/F", "/PID", str(self.process.pid)],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            else:
+                os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        # Already gone, or taskkill could not reach it
+        self.process.kill()
+        self.process.wait()
+        self.process = None
+
+    def run(self, command, timeout=SHELL_TIMEOUT, on_output=None, limit=SHELL_OUTPUT_LIMIT):
+        """
+        Runs one command and returns its exit code and capped output.
+        on_output, if given, is called with (stream, text) for every line as
+        it arrives. A command that outlives timeout is killed along with its
+        shell, which is restarted for the next command.
+        """
+        if self.process is None or self.process.poll() is not None:
+            self._start()
+        sentinel = f"__cmd_done_{uuid.uuid4().hex}__"
+        sentinel_bytes = sentinel.encode()
+        self.process.stdin.write(_frame(self.argv, command, sentinel).encode())
+        self.process.stdin.flush()
+
+        output = {"stdout": CappedOutput(limit), "stderr": CappedOutput(limit)}
+        open_streams = {"stdout", "stderr"}
+        exit_code = None
+        timed_out = False
+        deadline = time.monotonic() + timeout
+        while open_streams:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                self.kill()
+                break
+            try:
+                name, line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if line is None:
+                # The shell itself went away
+                self.kill()
+                break
+            end = line.find(sentinel_bytes)
+            if end >= 0:
+                open_streams.discard(name)
+                if name == "stdout":
+                    exit_code = int(line[end + len(sentinel_bytes):])
+                line = line[:end]
+                if not line:
+                    continue
+            output[name].write(line)
+            if on_output is not None:
+                on_output(name, line.decode("utf-8", errors="replace"))
+        return {
+            "exit_code": exit_code,
+            "stdout": output["stdout"].text(),
+            "stderr": output["stderr"].text(),
+            "timed_out": timed_out,
+            "truncated": bool(output["stdout"].omitted or output["stderr"].omitted),
+        }
+
+
+class ShellPool:
+    """
+    Up to size shell sessions, started on demand and reused. A command waits
+    if every session is busy.
+    """
+    def __init__(self, size=SHELL_POOL_SIZE, argv=None, cwd=None):
+        self.size = size
+        self.argv = argv
+        self.cwd = cwd
+        self.sessions = []
+        self.idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+        self.commands = 0
+        self.timeouts = 0
+        self.durations = deque(maxlen=200)
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self.sessions) < self.size:
+                session = ShellSession(self.argv, self.cwd)
+                self.sessions.append(session)
+                return session
+        return self.idle.get()
+
+    def run(self, command, timeout=SHELL_TIMEOUT, on_output=None, limit=SHELL_OUTPUT_LIMIT):
+        session = self._acquire()
+        started = time.monotonic()
+        try:
+            result = session.run(command, timeout=timeout, on_output=on_output, limit=limit)
+        finally:
+            self.idle.put(session)
+        self.commands += 1
+        self.timeouts += result["timed_out"]
+        self.durations.append(time.monotonic() - started)
+        return result
+
+    def close(self):
+        for session in self.sessions:
+            session.kill()
+
+    def stats(self):
+        durations = sorted(self.durations)
+        return {
+            "commands": self.commands,
+            "timeouts": self.timeouts,
+            "sessions": len(self.sessions),
+            "spawns": sum(session.spawns for session in self.sessions),
+            "p50_ms": durations[len(durations) // 2] * 1000 if durations else 0.0,
+        }
@@ -0,0 +1,28 @@
+import numpy as np
+
+from audio import Resampler
+
+
+def tone(rate, seconds=0.5):
+    t = np.arange(int(rate * seconds)) / rate
+    return (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+
+
+def test_resampler_empty_input():
+    resampler = Resampler(16000, 24000)
+    assert resampler.process(b"") == b""
+    assert resampler.process(tone(16000).tobytes())
+
+
+def test_resampler_short_chunks_match_one_block():
+    signal = tone(24000)
+    whole = Resampler(24000, 16000).process(signal.tobytes())
+
+    resampler = Resampler(24000, 16000)
+    sizes = [1, 0, 3, 2, 1, 50, 7, 0, 400]
+    chunks, start = [], 0
+    while start < len(signal):
+        size = sizes[len(chunks) % len(sizes)]
+        chunks.append(resampler.process(signal[start:start + size].tobytes()))
+        start += size
+    assert b"".join(chunks) == whole
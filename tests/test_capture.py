@@ -0,0 +1,56 @@
+import PIL.Image
+import PIL.ImageDraw
+
+from capture import FrameDeduplicator, FrameRateScheduler, KEEPALIVE_INTERVAL, MAX_FPS, SEND_BUDGET
+from bench import synthetic_desktop
+
+
+def test_dedup_drops_identical_frames():
+    dedup = FrameDeduplicator()
+    frame = synthetic_desktop(1280, 720)
+    assert dedup.should_send(frame, now=0.0)
+    assert not dedup.should_send(frame.copy(), now=1.0)
+    assert not dedup.should_send(frame.copy(), now=2.0)
+    assert dedup.stats()["suppressed"] == 2
+
+
+def test_dedup_sends_changed_frames():
+    dedup = FrameDeduplicator()
+    frame = synthetic_desktop(1280, 720)
+    assert dedup.should_send(frame, now=0.0)
+    changed = frame.copy()
+    PIL.ImageDraw.Draw(changed).rectangle((100, 100, 500, 400), fill=(255, 0, 0))
+    assert dedup.should_send(changed, now=1.0)
+
+
+def test_dedup_ignores_a_blinking_cursor():
+    dedup = FrameDeduplicator()
+    frame = synthetic_desktop(1280, 720)
+    assert dedup.should_send(frame, now=0.0)
+    blink = frame.copy()
+    PIL.ImageDraw.Draw(blink).rectangle((640, 360, 641, 378), fill=(0, 0, 0))
+    assert not dedup.should_send(blink, now=0.5)
+    assert not dedup.should_send(frame, now=1.0)
+
+
+def test_dedup_keepalive_resends_unchanged_frame():
+    dedup = FrameDeduplicator()
+    frame = synthetic_desktop(1280, 720)
+    assert dedup.should_send(frame, now=0.0)
+    assert not dedup.should_send(frame, now=KEEPALIVE_INTERVAL / 2)
+    assert dedup.should_send(frame, now=KEEPALIVE_INTERVAL)
+    assert dedup.stats()["keepalives"] == 1
+
+
+def test_rate_reacts_to_motion_within_the_idle_interval():
+    scheduler = FrameRateScheduler()
+    for _ in range(50):
+        interval = scheduler.update(0.0, 0.0)
+    assert interval <= 1.0
+    assert scheduler.update(0.2, 0.0) == 1.0 / MAX_FPS
+
+
+def test_rate_is_cut_when_sends_are_slow():
+    scheduler = FrameRateScheduler()
+    scheduler.record_send(1.0)
+    assert scheduler.update(0.2, 0.0) >= 1.0 / SEND_BUDGET
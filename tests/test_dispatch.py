@@ -0,0 +1,73 @@
+import json
+import asyncio
+
+import requests
+
+from dispatch import ToolDispatcher, ToolCache
+from mock_live import tool_call_message
+from bench import StubHTTPServer
+
+
+def run_calls(functions, messages, cache=None):
+    """
+    Dispatches each tool call message once the previous one is answered and
+    returns every FunctionResponse sent.
+    """
+    responses = []
+
+    async def run():
+        dispatcher = ToolDispatcher(functions, responses.extend, batch_deadline=0.0, cache=cache)
+        expected = 0
+        for message in messages:
+            expected += len(message.tool_call.function_calls)
+            dispatcher.dispatch(message.tool_call.function_calls)
+            while len(responses) < expected:
+                await asyncio.sleep(0.01)
+        dispatcher.close()
+
+    asyncio.run(run())
+    return responses
+
+
+def weather_server():
+    def route(query, headers):
+        body = {"location": {"name": query.get("q", "")}, "current": {"temp_c": 21.0}}
+        return 200, {"Content-Type": "application/json"}, json.dumps(body).encode()
+
+    server = StubHTTPServer({"/v1/current.json": route}, delay=0.0)
+
+    def get_weather(city: str) -> dict:
+        data = requests.get(f"{server.url}/v1/current.json", params={"q": city}, timeout=5).json()
+        return {"location": data["location"]["name"], "temperature_c": data["current"]["temp_c"]}
+
+    return server, get_weather
+
+
+def test_cache_hit_makes_no_second_request():
+    server, get_weather = weather_server()
+    try:
+        messages = [
+            tool_call_message(("call-1", "get_weather", {"city": "Paris"})),
+            tool_call_message(("call-2", "get_weather", {"city": " paris "})),
+        ]
+        cache = ToolCache({"get_weather": 60})
+        responses = run_calls({"get_weather": get_weather}, messages, cache)
+        assert server.requests == 1
+        assert [response.id for response in responses] == ["call-1", "call-2"]
+        assert responses[0].response == responses[1].response
+        assert cache.stats()["hits"] == 1
+    finally:
+        server.close()
+
+
+def test_without_cache_every_call_goes_out():
+    server, get_weather = weather_server()
+    try:
+        messages = [
+            tool_call_message(("call-1", "get_weather", {"city": "Paris"})),
+            tool_call_message(("call-2", "get_weather", {"city": "Paris"})),
+        ]
+        run_calls({"get_weather": get_weather}, messages)
+        assert server.requests == 2
+    finally:
+        server.close()
@@ -0,0 +1,47 @@
+import requests
+
+from feeds import FeedStore
+from bench import StubHTTPServer
+
+
+def rss(guids):
+    items = "".join(
+        f"<item><title>{guid}</title><link>http://example.com/{guid}</link><guid>{guid}</guid>"
+        f"<pubDate>Sun, 18 Oct 2026 12:00:00 +0000</pubDate></item>"
+        for guid in guids
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>news</title>{items}</channel></rss>'.encode()
+
+
+def test_refresh_skips_known_guids():
+    guids = [f"story-{index}" for index in range(5)]
+
+    def route(query, headers):
+        etag = f'"{len(guids)}"'
+        if headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag, "Content-Type": "application/rss+xml"}, rss(guids)
+
+    server = StubHTTPServer({"/news": route}, delay=0.0)
+    try:
+        store = FeedStore({"news": {"name": "news", "url": f"{server.url}/news"}}, get=requests.get)
+        assert store.refresh(["news"]) == []
+        assert store.stats()["news"]["new_entries"] == 5
+
+        # Unchanged: a 304, nothing downloaded or parsed
+        downloaded = server.bytes
+        store.refresh(["news"])
+        stats = store.stats()["news"]
+        assert stats["not_modified"] == 1
+        assert stats["new_entries"] == 5
+        assert server.bytes == downloaded
+
+        # One new story: only it is added
+        guids.append("story-new")
+        store.refresh(["news"])
+        stats = store.stats()["news"]
+        assert stats["new_entries"] == 6
+        assert stats["stored"] == 6
+        assert [entry["guid"] for entry in store.entries("news")].count("story-new") == 1
+    finally:
+        server.close()
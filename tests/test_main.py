@@ -0,0 +1,22 @@
+import os
+import runpy
+import sys
+
+import pytest
+
+import main as agent
+
+
+def test_tile_diff_rejects_encode_workers():
+    with pytest.raises(ValueError):
+        agent.AudioLoop(video_mode="none", tile_diff=True, encode_workers=2, connect=object())
+
+
+def test_spawned_workers_skip_the_client_and_pyaudio(monkeypatch):
+    created = []
+    monkeypatch.setattr(sys.modules["pyaudio"], "PyAudio", lambda: created.append("pyaudio"))
+    path = os.path.join(os.path.dirname(agent.__file__), "main.py")
+    namespace = runpy.run_path(path, run_name="__mp_main__")
+    assert "pya" not in namespace
+    assert "client" not in namespace
+    assert created == []
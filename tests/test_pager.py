@@ -0,0 +1,38 @@
+from pager import FilePager
+
+
+def read_all(pager, path, max_tokens):
+    """Follows "next" from the first page to the last."""
+    pages = []
+    page = pager.read(path, max_tokens=max_tokens)
+    pages.append(page)
+    while "next" in page:
+        page = pager.read(path, max_tokens=max_tokens, **page["next"])
+        pages.append(page)
+    return pages
+
+
+def test_next_covers_the_file_exactly(tmp_path):
+    path = tmp_path / "app.log"
+    lines = [f"line {index} données ✓\n" for index in range(500)]
+    # A line longer than a page forces a byte offset continuation
+    lines.insert(250, "é" * 3000 + "\n")
+    text = "".join(lines)
+    path.write_text(text, encoding="utf-8")
+
+    pages = read_all(FilePager(), str(path), max_tokens=64)
+    assert len(pages) > 1
+    assert "".join(page["content"] for page in pages) == text
+    for previous, page in zip(pages, pages[1:]):
+        assert page["offset"] == previous["end_offset"]
+    assert pages[-1]["end_offset"] == path.stat().st_size
+
+
+def test_line_pages_are_numbered(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("".join(f"{index}\n" for index in range(1, 101)))
+
+    page = FilePager().read(str(path), start_line=10, line_count=5)
+    assert page["content"] == "10\n11\n12\n13\n14\n"
+    assert (page["start_line"], page["end_line"]) == (10, 14)
+    assert page["next"] == {"start_line": 15}
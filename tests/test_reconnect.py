@@ -0,0 +1,94 @@
+import struct
+import asyncio
+
+import pytest
+from google.genai import types, errors
+from websockets.exceptions import ConnectionClosedError
+from websockets.frames import Close
+
+import main as agent
+from audio import PlaybackBuffer
+from mock_live import FakeLiveServer
+from uplink import UPLINK_REPLAY
+from bench import SimulatedAudioDevice
+
+
+def run_with_drops(monkeypatch, drops, interval=0.6):
+    """
+    Runs the reconnect supervisor against a FakeLiveServer that drops the
+    connection drops times, and returns the server and the loop.
+    """
+    monkeypatch.setattr(agent, "pya", SimulatedAudioDevice())
+    server = FakeLiveServer()
+    loop = agent.AudioLoop(video_mode="none", vad=False, duplex="full", device_format="fixed", connect=server.connect)
+    loop.playback = PlaybackBuffer(rate=agent.RECEIVE_SAMPLE_RATE)
+
+    async def run():
+        tasks = [asyncio.create_task(loop.stay_connected()), asyncio.create_task(loop.listen_audio())]
+        for _ in range(drops):
+            await asyncio.sleep(interval)
+            server.drop()
+        await asyncio.sleep(interval)
+        for task in tasks:
+            task.cancel()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if not isinstance(result, asyncio.CancelledError):
+                raise result
+        loop.mic.close()
+        # Lets the device thread deliver its last period before the loop closes
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    return server, loop
+
+
+def test_reconnect_resumes_with_handle_and_bounded_replay(monkeypatch):
+    drops = 2
+    server, loop = run_with_drops(monkeypatch, drops)
+
+    assert len(server.connected) == drops + 1
+    assert server.handles == [None, "handle-0", "handle-1"]
+
+    # Every simulated mic period carries its sequence number
+    seqs = [
+        struct.unpack_from("<q", kwargs["media"]["data"])[0]
+        for _, method, kwargs in server.sent
+        if "media" in kwargs
+    ]
+    assert set(seqs) == set(range(max(seqs) + 1))
+    chunk_seconds = agent.CHUNK_SIZE / agent.SEND_SAMPLE_RATE
+    replayed = loop.uplink["audio"].replayed
+    assert replayed <= drops * UPLINK_REPLAY / chunk_seconds + drops
+    assert len(seqs) - len(set(seqs)) == replayed
+
+
+def test_fresh_session_drops_queued_tool_responses(monkeypatch):
+    monkeypatch.setattr(agent, "pya", SimulatedAudioDevice())
+    loop = agent.AudioLoop(video_mode="none", vad=False, device_format="fixed", connect=FakeLiveServer().connect)
+    responses = [types.FunctionResponse(id=id, name="tool", response={}) for id in ("a", "b")]
+    loop.uplink.put("tool", "send_tool_response", function_responses=responses)
+
+    loop.drop_tool_calls(["a"])
+    [(_, _, kwargs)] = loop.uplink["tool"].items
+    assert [response.id for response in kwargs["function_responses"]] == ["b"]
+
+    loop.drop_tool_calls()
+    assert not loop.uplink["tool"].items
+
+
+@pytest.mark.parametrize(
+    "error, transient",
+    [
+        (ConnectionRefusedError("refused"), True),
+        (errors.APIError(1006, {"message": "Abnormal closure."}), True),
+        (errors.APIError(1011, {"message": "Internal error."}), True),
+        (errors.ServerError(503, {"message": "Unavailable."}), True),
+        (errors.ClientError(1008, {"message": "Policy violation."}), False),
+        (errors.APIError(1008, {"message": "Policy violation."}), False),
+        (ConnectionClosedError(Close(1011, ""), None), True),
+        (ConnectionClosedError(Close(1008, ""), None), False),
+        (ValueError("bug"), False),
+    ],
+)
+def test_is_transient(error, transient):
+    assert agent.is_transient(error) == transient
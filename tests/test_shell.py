@@ -0,0 +1,31 @@
+from shell import ShellPool
+
+
+def test_pool_survives_a_timeout():
+    pool = ShellPool(size=1)
+    try:
+        result = pool.run("sleep 5", timeout=0.5)
+        assert result["timed_out"]
+        assert result["exit_code"] is None
+
+        result = pool.run("echo ok")
+        assert not result["timed_out"]
+        assert result["exit_code"] == 0
+        assert result["stdout"].strip() == "ok"
+
+        stats = pool.stats()
+        assert stats["timeouts"] == 1
+        assert stats["sessions"] == 1
+        assert stats["spawns"] == 2
+    finally:
+        pool.close()
+
+
+def test_pool_reuses_its_shell():
+    pool = ShellPool(size=1)
+    try:
+        for _ in range(3):
+            assert pool.run("echo hello")["stdout"].strip() == "hello"
+        assert pool.stats()["spawns"] == 1
+    finally:
+        pool.close()
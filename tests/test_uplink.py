@@ -0,0 +1,52 @@
+import asyncio
+
+from google.genai import types
+
+from uplink import UplinkScheduler
+
+
+class RecordingSession:
+    def __init__(self):
+        self.sent = []
+
+    async def send_realtime_input(self, **kwargs):
+        self.sent.append(("send_realtime_input", kwargs))
+
+    async def send_tool_response(self, **kwargs):
+        self.sent.append(("send_tool_response", kwargs))
+
+
+def send_all(uplink):
+    session = RecordingSession()
+
+    async def run():
+        sender = asyncio.create_task(uplink.run(session))
+        while any(traffic.items for traffic in uplink.classes.values()):
+            await asyncio.sleep(0.01)
+        sender.cancel()
+
+    asyncio.run(run())
+    return session.sent
+
+
+def test_audio_goes_before_queued_video():
+    uplink = UplinkScheduler()
+    uplink.put("video", "send_realtime_input", media={"mime_type": "image/jpeg", "data": "frame"})
+    uplink.put("audio", "send_realtime_input", media={"mime_type": "audio/pcm", "data": b"mic"})
+    assert [kwargs["media"]["mime_type"] for _, kwargs in send_all(uplink)] == ["audio/pcm", "image/jpeg"]
+
+
+def test_revise_trims_and_drops_queued_items():
+    uplink = UplinkScheduler()
+    responses = [types.FunctionResponse(id=id, name="tool", response={}) for id in ("a", "b", "c")]
+    uplink.put("tool", "send_tool_response", function_responses=responses[:2])
+    uplink.put("tool", "send_tool_response", function_responses=responses[2:])
+
+    def without_b_or_c(kwargs):
+        kept = [response for response in kwargs["function_responses"] if response.id not in ("b", "c")]
+        return {**kwargs, "function_responses": kept} if kept else None
+
+    uplink["tool"].revise(without_b_or_c)
+    assert uplink["tool"].dropped == 1
+    sent = send_all(uplink)
+    assert [[response.id for response in kwargs["function_responses"]] for _, kwargs in sent] == [["a"]]
@@ -1,9 +1,9 @@
 import requests
-import subprocess
+from requests.adapters import HTTPAdapter
 import os
 import time
+import threading
 import shutil
-import glob
 import psutil
 import pyautogui
 import pyperclip
@@ -23,13 +23,74 @@ from google.genai import types
 from google import genai
 from newsapi import NewsApiClient
 import wikipediaapi
-import feedparser
 import json
+from feeds import FeedStore
+from shell import ShellPool
+from fileindex import FileIndexes
+from pager import FilePager, READ_MAX_TOKENS
 from datetime import datetime, timedelta
 
 # --- Global Variables ---
 driver_instance = None
 
+# --- Shared HTTP transport ---
+# Network tools share one pool of kept-alive connections, so a voice turn
+# does not pay for DNS, TCP and TLS setup on every call.
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 10
+HTTP_POOL_HOSTS = 16        # hosts whose connections are kept open
+HTTP_POOL_PER_HOST = 4      # connections per host; further requests wait for one
+
+WEATHER_API_URL = "http://api.weatherapi.com/v1/current.json"
+
+_http_lock = threading.Lock()
+_http_session = None
+_wikipedia_clients = {}
+
+def http_session() -> requests.Session:
+    """
+    Returns the shared requests session, creating it on first use.
+    """
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_PER_HOST, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+    return _http_session
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """
+    GET through the shared session, with the default timeouts unless given.
+    """
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return http_session().get(url, **kwargs)
+
+def http_stats() -> dict:
+    """
+    Requests made and connections opened per host, for the hosts currently
+    pooled by the shared session.
+    """
+    hosts = {}
+    if _http_session is not None:
+        pools = _http_session.get_adapter("https://").poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+            }
+    requests_made = sum(host["requests"] for host in hosts.values())
+    connections = sum(host["connections"] for host in hosts.values())
+    return {
+        "requests": requests_made,
+        "connections": connections,
+        "reused": requests_made - connections,
+        "hosts": hosts,
+    }
+
 # --- Existing Functions ---
 
 def getWeather(city: str) -> str:
@@ -40,7 +101,6 @@ def getWeather(city: str) -> str:
     if not API_KEY:
         return {"error": "WEATHER_API_KEY environment variable not found."}
 
-    base_url = "http://api.weatherapi.com/v1/current.json"
     params = {
         "key": API_KEY,
         "q": city,
@@ -48,7 +108,7 @@ def getWeather(city: str) -> str:
     }
 
     try:
-        response = requests.get(base_url, params=params)
+        response = http_get(WEATHER_API_URL, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -64,22 +124,24 @@ def getWeather(city: str) -> str:
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
 
-def runCommand(command: str) -> str:
+# Long-lived shells (PowerShell on Windows, bash elsewhere) run the commands
+_shell_pool = ShellPool()
+
+def runCommand(command: str) -> dict:
     """
-    Executes a PowerShell command.
+    Executes a shell command and returns its exit code and output.
     """
     try:
-        subprocess.run(["powershell", "-Command", command], capture_output=True)
-        return f"Command executed successfully: {command}"
+        return {"command": command, **_shell_pool.run(command)}
     except Exception as e:
-        return f"Error occurred: {str(e)}"
+        return {"error": f"Error occurred: {str(e)}"}
 
 def get_news(category: str, country: str) -> str:
     """
     Fetches top news headlines from NewsAPI.
     """
     try:
-        newsapi = NewsApiClient(api_key='Your Api Key')
+        newsapi = NewsApiClient(api_key='Your Api Key', session=http_session())
 
         # Call the NewsAPI to get top headlines for the specified category and country
         top_headlines = newsapi.get_top_headlines(
@@ -128,19 +190,25 @@ def get_local_time(format_type: str = "full") -> dict:
         "day_of_year": now.strftime("%j")
     }
 
+def _wikipedia_client(lang: str):
+    # One client per language, kept so its connections stay open between calls
+    with _http_lock:
+        if lang not in _wikipedia_clients:
+            _wikipedia_clients[lang] = wikipediaapi.Wikipedia(
+                language=lang,
+                extract_format=wikipediaapi.ExtractFormat.WIKI,
+                # User agent is required by Wikipedia API
+                user_agent="MyAIBot/1.0 (contact@example.com)",
+                timeout=HTTP_READ_TIMEOUT,
+            )
+        return _wikipedia_clients[lang]
+
 def wikipedia_search_simple(query: str, lang: str = "tr", sentences: int = 3) -> dict:
     """
     Searching Wikipedia using the wikipedia-api library
     """
     try:
-        user_agent = "MyAIBot/1.0 (contact@example.com)"
-        
-        wiki_wiki = wikipediaapi.Wikipedia(
-            language=lang,
-            extract_format=wikipediaapi.ExtractFormat.WIKI,
-            # User agent is required by Wikipedia API
-            user_agent=user_agent
-        )
+        wiki_wiki = _wikipedia_client(lang)
         
         page = wiki_wiki.page(query)
         
@@ -183,52 +251,49 @@ def wikipedia_search_simple(query: str, lang: str = "tr", sentences: int = 3) ->
             "error": str(e)
         }
 
+GAMING_FEEDS = {
+    "steam": {"name": "Steam", "url": "https://store.steampowered.com/feeds/news.xml", "type": "rss"},
+    "ign": {"name": "IGN", "url": "https://feeds.feedburner.com/ign/games-all", "type": "rss"},
+    "eurogamer": {"name": "Eurogamer", "url": "https://www.eurogamer.net/feed", "type": "rss"},
+    "gamerant": {"name": "Game Rant", "url": "https://gamerant.com/feed", "type": "rss"}
+}
+
+# Fetched concurrently with conditional requests; entries are kept between calls
+_gaming_feeds = FeedStore(GAMING_FEEDS, get=http_get)
+
 def get_gaming_news(source: str = "all", limit: int = 5) -> dict:
     """
     It brings game news and announcements.
     """
-    sources = {
-        "steam": {"name": "Steam", "url": "https://store.steampowered.com/feeds/news.xml", "type": "rss"},
-        "ign": {"name": "IGN", "url": "https://feeds.feedburner.com/ign/games-all", "type": "rss"},
-        "eurogamer": {"name": "Eurogamer", "url": "https://www.eurogamer.net/feed", "type": "rss"},
-        "gamerant": {"name": "Game Rant", "url": "https://gamerant.com/feed", "type": "rss"}
-    }
-    
-    results = []
-    
     if source == "all":
-        selected_sources = sources.keys()
+        selected_sources = list(GAMING_FEEDS)
     else:
         # Default to IGN if source is not found
-        selected_sources = [source] if source in sources else ["ign"]
+        selected_sources = [source] if source in GAMING_FEEDS else ["ign"]
+    
+    _gaming_feeds.refresh(selected_sources)
+    # Filter news to include only those from the last 7 days
+    since = (datetime.now() - timedelta(days=7)).timestamp()
     
+    results = []
     for src in selected_sources:
-        src_info = sources[src]
-        try:
-            feed = feedparser.parse(src_info["url"])
-            for entry in feed.entries[:limit]:
-                # Filter news to include only those from the last 7 days
-                published = entry.get('published_parsed', entry.get('updated_parsed'))
-                if published:
-                    pub_date = datetime(*published[:6])
-                    if datetime.now() - pub_date > timedelta(days=7):
-                        continue
-                
-                results.append({
-                    "source": src_info["name"],
-                    "title": entry.title,
-                    "summary": entry.get('summary', '')[:200],
-                    "link": entry.link,
-                    "published": entry.get('published', ''),
-                    "category": "news"
-                })
-        except Exception as e:
-            continue
+        for entry in _gaming_feeds.entries(src, since=since)[:limit]:
+            results.append({
+                "source": GAMING_FEEDS[src]["name"],
+                "title": entry["title"],
+                "summary": entry["summary"],
+                "link": entry["link"],
+                "published": entry["published"],
+                "timestamp": entry["timestamp"],
+                "category": "news"
+            })
     
-    results.sort(key=lambda x: x.get('published', ''), reverse=True)
+    results.sort(key=lambda x: x["timestamp"] or 0, reverse=True)
+    for result in results:
+        del result["timestamp"]
     return {
         "total_news": len(results),
-        "sources": list(selected_sources),
+        "sources": selected_sources,
         "news": results[:limit*2]
     }
 
@@ -423,18 +488,31 @@ def switch_window(window_title: str) -> str:
 
 # --- Cat 3: File System Ops ---
 
-def read_file(path: str) -> str:
+# Line offsets of recently read files, so paging through one costs O(page)
+_file_pager = FilePager()
+
+def read_file(
+    path: str,
+    start_line: int = None,
+    line_count: int = None,
+    offset: int = None,
+    length: int = None,
+    tail_lines: int = None,
+    max_tokens: int = READ_MAX_TOKENS,
+) -> dict:
     """
-    Reads and returns the content of a file.
+    Reads one page of a text file: from a 1-based line (start_line,
+    line_count), a byte range (offset, length), or the last tail_lines
+    lines. With no range it reads from the start. Output is capped at about
+    max_tokens; "next" gives the arguments of the following page. Binary
+    files are reported instead of decoded.
     """
     try:
         if not os.path.exists(path):
-            return "File not found."
-        # Read the file using utf-8 encoding to support various characters
-        with open(path, 'r', encoding='utf-8') as f:
-            return f.read()
+            return {"error": "File not found."}
+        return _file_pager.read(path, start_line, line_count, offset, length, tail_lines, max_tokens)
     except Exception as e:
-        return f"Error reading file: {e}"
+        return {"error": f"Error reading file: {e}"}
 
 def write_to_file(path: str, content: str, mode: str = "w") -> str:
     """
@@ -478,15 +556,20 @@ def manage_files(action: str, path: str, destination: str = None) -> str:
     except Exception as e:
         return f"Error managing files: {e}"
 
+# Name indexes of the trees searched so far, kept on disk between runs
+_file_indexes = FileIndexes()
+
 def search_files(query: str, path: str) -> str:
     """
-    Searches for files matching a query within a directory.
+    Searches for files whose name contains a query (or matches a glob such
+    as *.pdf) within a directory, case-insensitively.
     """
     try:
-        # Simple glob recursive search
-        search_pattern = os.path.join(path, f"**/*{query}*")
-        files = glob.glob(search_pattern, recursive=True)
-        return "\n".join(files[:20]) # Limit to 20
+        if not os.path.isdir(path):
+            return f"Error searching files: {path} is not a directory"
+        # Answered from the name index, or by walking until 20 matches if there is none yet
+        files = _file_indexes.search(query, path, limit=20)
+        return "\n".join(files)
     except Exception as e:
         return f"Error searching files: {e}"
 
@@ -719,6 +802,67 @@ AVAILABLE_FUNCTIONS = {
 }
 
 
+# --- Execution classes (see dispatch.py) ---
+# pyautogui, the clipboard and the Windows audio/display APIs act on one
+# shared desktop, and driver_instance is a single Selenium session, so each
+# group runs one call at a time. Everything else is I/O bound and runs in
+# parallel.
+TOOL_CLASSES = {
+    # Existing
+    "run_command": "io",
+    "get_weather": "io",
+    "get_news": "io",
+    "get_local_time": "io",
+    "wikipedia_search": "io",
+    "get_gaming_news": "io",
+
+    # Cat 1
+    "move_mouse": "hid",
+    "click_mouse": "hid",
+    "drag_mouse": "hid",
+    "scroll": "hid",
+    "type_text": "hid",
+    "press_hotkey": "hid",
+
+    # Cat 2
+    "open_application": "hid",
+    "close_application": "io",
+    "list_active_processes": "io",
+    "switch_window": "hid",
+
+    # Cat 3
+    "read_file": "io",
+    "write_to_file": "io",
+    "manage_files": "io",
+    "search_files": "io",
+
+    # Cat 4
+    "system_power": "hid",
+    "volume_control": "hid",
+    "brightness_control": "hid",
+    "get_clipboard": "hid",
+    "set_clipboard": "hid",
+
+    # Cat 5
+    "browser_open": "browser",
+    "browser_type": "browser",
+    "browser_click": "browser",
+    "browser_get_text": "browser",
+    "browser_scroll": "browser",
+    "browser_capture_full_page": "browser",
+}
+
+
+# --- Result cache TTLs in seconds (see dispatch.py) ---
+# Only remote lookups whose answers stay valid for a while are cached.
+TOOL_CACHE_TTL = {
+    "get_weather": 600,
+    "get_news": 300,
+    "wikipedia_search": 3600,
+    "get_gaming_news": 300,
+}
+
+
 # --- Gemini Tool Schemas ---
 tools_gemini = [
     types.Tool(
@@ -736,7 +880,7 @@ tools_gemini = [
             ),
             types.FunctionDeclaration(
                 name="run_command",
-                description="run as powershell command",
+                description="run a shell command (PowerShell on Windows) and get its exit code, stdout and stderr",
                 parameters=genai.types.Schema(
                     type = genai.types.Type.OBJECT,
                     properties = {
@@ -910,11 +1054,17 @@ tools_gemini = [
             # Cat 3: Files
             types.FunctionDeclaration(
                 name="read_file",
-                description="Reads content of a file",
+                description="Reads a page of a text file. Large files come back in pages; pass the returned 'next' arguments to continue",
                 parameters=genai.types.Schema(
                     type = genai.types.Type.OBJECT,
                     properties = {
                         "path": genai.types.Schema(type = genai.types.Type.STRING),
+                        "start_line": genai.types.Schema(type = genai.types.Type.INTEGER, description="first line, from 1"),
+                        "line_count": genai.types.Schema(type = genai.types.Type.INTEGER),
+                        "offset": genai.types.Schema(type = genai.types.Type.INTEGER, description="first byte, instead of start_line"),
+                        "length": genai.types.Schema(type = genai.types.Type.INTEGER, description="bytes to read from offset"),
+                        "tail_lines": genai.types.Schema(type = genai.types.Type.INTEGER, description="read the last lines instead"),
+                        "max_tokens": genai.types.Schema(type = genai.types.Type.INTEGER),
                     }
                 )
             ),
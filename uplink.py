@@ -0,0 +1,248 @@
+"""
+Priority scheduling of everything sent up to the Live session.
+"""
+import time
+import asyncio
+import bisect
+from collections import deque
+
+# Traffic classes in priority order: (name, capacity, drop policy, link
+# share). A capacity of 0 means unbounded. When a bounded class is full,
+# "oldest" drops the longest-waiting item to make room and "newest" drops
+# the incoming one; "never" classes are unbounded so producers never block.
+# A class with a link share below 1 is paced so its sends occupy at most
+# that fraction of the time: a send in flight cannot be preempted, so on a
+# slow link every large frame holds up the audio behind it.
+UPLINK_CLASSES = (
+    ("audio", 0, "never", 1.0),
+    ("tool", 0, "never", 1.0),
+    ("text", 0, "never", 1.0),
+    ("video", 2, "oldest", 0.25),
+)
+UPLINK_DROP_POLICIES = ("never", "oldest", "newest")
+
+# Upper bounds (ms) of the queueing delay histogram buckets
+UPLINK_DELAY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf"))
+UPLINK_HISTORY = 1000         # recent delays kept per class for percentiles
+
+# Reconnects: sent audio captured this recently may have been lost with the
+# old connection and is sent again; audio captured while offline is kept
+# for this long at most
+UPLINK_REPLAY = 1.0
+UPLINK_OFFLINE_AUDIO = 3.0
+
+
+class UplinkClass:
+    """
+    Queue and counters for one traffic class.
+    """
+    def __init__(self, name, capacity=0, drop="never", share=1.0):
+        if drop not in UPLINK_DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop}")
+        self.name = name
+        self.capacity = capacity
+        self.drop = drop
+        self.share = share
+        self.items = deque()
+        # Monotonic time before which a paced class sends nothing
+        self.ready_at = 0.0
+
+        self.sent = 0
+        self.dropped = 0
+        self.replayed = 0
+        self.max_depth = 0
+        self.histogram = [0] * len(UPLINK_DELAY_BUCKETS)
+        self.delays = deque(maxlen=UPLINK_HISTORY)
+        self.send_times = deque(maxlen=UPLINK_HISTORY)
+        self.on_sent = None
+
+    @property
+    def fill(self):
+        """Fraction of the capacity in use; 0 for unbounded classes."""
+        return len(self.items) / self.capacity if self.capacity else 0.0
+
+    def put(self, item):
+        """
+        Queues an item, applying the drop policy. Returns False if the item
+        itself was dropped.
+        """
+        if self.capacity and self.drop != "never" and len(self.items) >= self.capacity:
+            self.dropped += 1
+            if self.drop == "newest":
+                return False
+            self.items.popleft()
+        self.items.append(item)
+        self.max_depth = max(self.max_depth, len(self.items))
+        return True
+
+    def expire(self, before):
+        """
+        Drops items queued before the given monotonic time.
+        """
+        while self.items and self.items[0][0] < before:
+            self.items.popleft()
+            self.dropped += 1
+
+    def revise(self, revise):
+        """
+        Passes the kwargs of every queued item through revise, which returns
+        them (changed or not) or None to drop the item.
+        """
+        kept = deque()
+        for queued_at, method, kwargs in self.items:
+            kwargs = revise(kwargs)
+            if kwargs is None:
+                self.dropped += 1
+            else:
+                kept.append((queued_at, method, kwargs))
+        self.items = kept
+
+    def record(self, delay, send_time):
+        self.sent += 1
+        self.delays.append(delay)
+        self.send_times.append(send_time)
+        self.histogram[bisect.bisect_left(UPLINK_DELAY_BUCKETS, delay * 1000)] += 1
+        if self.share < 1.0:
+            # Leave the link to other classes for the rest of this send's share
+            self.ready_at = time.monotonic() + send_time * (1 / self.share - 1)
+        if self.on_sent is not None:
+            self.on_sent(send_time)
+
+    def stats(self):
+        delays = sorted(self.delays)
+
+        def percentile(pct):
+            return delays[min(len(delays) - 1, int(len(delays) * pct))] * 1000 if delays else 0.0
+
+        return {
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "replayed": self.replayed,
+            "depth": len(self.items),
+            "max_depth": self.max_depth,
+            "delay_p50_ms": percentile(0.5),
+            "delay_p95_ms": percentile(0.95),
+            "delay_max_ms": delays[-1] * 1000 if delays else 0.0,
+            "histogram_ms": {
+                (f"<={bound:g}" if bound != float("inf") else "more"): count
+                for bound, count in zip(UPLINK_DELAY_BUCKETS, self.histogram)
+                if count
+            },
+        }
+
+
+class UplinkScheduler:
+    """
+    Single sender for all upstream traffic.
+
+    Producers call put() without ever blocking. One task sends items one at a
+    time, always taking the highest-priority class that has anything
+    waiting, so a backlog of frames or text never holds up microphone audio.
+    A send already in flight is not preempted, so audio waits at most for one
+    lower-priority message, and classes with a link share below 1 (video)
+    are paced so such waits stay rare on a slow link.
+
+    Queues outlive connections. Sent audio from the last UPLINK_REPLAY
+    seconds of capture is kept in a ring, and when the connection is lost it
+    goes back to the front of the queue along with the message that was in
+    flight. While offline, audio older than UPLINK_OFFLINE_AUDIO is dropped.
+    """
+    def __init__(
+        self,
+        classes=UPLINK_CLASSES,
+        replay_kind="audio",
+        replay_window=UPLINK_REPLAY,
+        offline_window=UPLINK_OFFLINE_AUDIO,
+    ):
+        self.classes = {
+            name: UplinkClass(name, capacity, drop, share) for name, capacity, drop, share in classes
+        }
+        self.replay_kind = replay_kind
+        self.replay_window = replay_window
+        self.offline_window = offline_window
+        # Recently sent replay_kind items, oldest first
+        self.replay = deque()
+        self.online = False
+        # Called with (kind, method, kwargs) after every successful send
+        self.tap = None
+        self._ready = asyncio.Event()
+
+    def __getitem__(self, name):
+        return self.classes[name]
+
+    def put(self, kind, method, **kwargs):
+        """
+        Queues a call to session.<method>(**kwargs) in the given class.
+        """
+        now = time.monotonic()
+        traffic = self.classes[kind]
+        queued = traffic.put((now, method, kwargs))
+        if not self.online and kind == self.replay_kind:
+            traffic.expire(now - self.offline_window)
+        self._ready.set()
+        return queued
+
+    def _next(self):
+        """
+        The class to send from next, or None, and how long until a paced
+        class with items waiting may send (None if there is none).
+        """
+        now = time.monotonic()
+        wait = None
+        for traffic in self.classes.values():
+            if not traffic.items:
+                continue
+            if traffic.ready_at <= now:
+                return traffic, None
+            wait = min(wait, traffic.ready_at - now) if wait is not None else traffic.ready_at - now
+        return None, wait
+
+    async def run(self, session):
+        """
+        Sends queued items to the session in priority order until the
+        connection fails or the task is cancelled.
+        """
+        self.online = True
+        while True:
+            traffic, wait = self._next()
+            if traffic is None:
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            item = traffic.items.popleft()
+            queued_at, method, kwargs = item
+            started = time.monotonic()
+            try:
+                await getattr(session, method)(**kwargs)
+            except BaseException:
+                # Not known to have arrived; keep it for the next connection
+                traffic.items.appendleft(item)
+                raise
+            finished = time.monotonic()
+            traffic.record(started - queued_at, finished - started)
+            if self.tap is not None:
+                self.tap(traffic.name, method, kwargs)
+            if traffic.name == self.replay_kind:
+                self.replay.append(item)
+                while self.replay and self.replay[0][0] < finished - self.replay_window:
+                    self.replay.popleft()
+
+    def disconnected(self):
+        """
+        Called when the connection is lost: puts recently sent audio back in
+        front of its queue so it is sent again after reconnecting.
+        """
+        self.online = False
+        now = time.monotonic()
+        traffic = self.classes[self.replay_kind]
+        recent = [item for item in self.replay if item[0] >= now - self.replay_window]
+        self.replay.clear()
+        traffic.items.extendleft(reversed(recent))
+        traffic.replayed += len(recent)
+        traffic.expire(now - self.offline_window)
+
+    def stats(self):
+        return {name: traffic.stats() for name, traffic in self.classes.items()}